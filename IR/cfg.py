@@ -0,0 +1,323 @@
+from IR.ir import Opcode, Instr, Label, JUMP_OPS, split_procs
+
+
+class BasicBlock:
+    """Straight-line run of a proc's IR
+
+    labels are the labels that lead into the block, items its instructions
+    (and any comments between them); only the last instruction can jump.
+    fallthrough is the block control reaches by running off the end, None
+    after `jmp` or `ret`.
+    """
+    __slots__ = ('index', 'labels', 'items', 'succs', 'preds', 'fallthrough')
+
+    def __init__(self, index):
+        self.index = index
+        self.labels = []
+        self.items = []
+        self.succs = []
+        self.preds = []
+        self.fallthrough = None
+
+    @property
+    def instrs(self):
+        return [item for item in self.items if item.__class__ is Instr]
+
+    @property
+    def phis(self):
+        """Phi instructions at the top of the block, while its proc is in SSA form"""
+        phis = []
+        for item in self.items:
+            if item.__class__ is Instr:
+                if item.op != Opcode.PHI:
+                    break
+                phis.append(item)
+        return phis
+
+    @property
+    def terminator(self):
+        """Last instruction if it is a jump or ret, None otherwise"""
+        for item in reversed(self.items):
+            if item.__class__ is Instr:
+                return item if item.op in JUMP_OPS or item.op == Opcode.RET else None
+        return None
+
+    @property
+    def name(self):
+        return self.labels[0] if self.labels else f"B{self.index}"
+
+    def append(self, instr):
+        """Add an instruction at the end, before the block's jump if it has one"""
+        position = len(self.items)
+        last = self.terminator
+        if last is not None:
+            position = max(i for i, item in enumerate(self.items) if item is last)
+        self.items.insert(position, instr)
+
+    def __repr__(self):
+        return f"BasicBlock({self.name}, succs={[b.name for b in self.succs]})"
+
+
+class Loop:
+    """A natural loop: its header, the blocks in it and where it nests"""
+    __slots__ = ('header', 'blocks', 'back_edges', 'parent', 'children', 'depth')
+
+    def __init__(self, header):
+        self.header = header
+        self.blocks = {header}
+        self.back_edges = []   # latch blocks that jump back to the header
+        self.parent = None
+        self.children = []
+        self.depth = 1
+
+    def __repr__(self):
+        return f"Loop({self.header.name}, blocks={len(self.blocks)}, depth={self.depth})"
+
+
+class CFG:
+    """Control-flow graph of one proc
+
+    Blocks keep source order, blocks[0] is the entry. Dominators use the
+    iterative algorithm of Cooper, Harvey and Kennedy over reverse
+    postorder; blocks the entry cannot reach have no dominator. Loops are
+    the natural loops of back edges (edges to a block that dominates their
+    source), one per header, nested by containment into a forest.
+    Retreating edges into irreducible regions are not loops here.
+    """
+
+    def __init__(self, proc, blocks):
+        self.proc = proc
+        self.blocks = blocks
+        self.entry = blocks[0] if blocks else None
+        self._idom = None
+        self._loops = None
+
+    @classmethod
+    def build(cls, proc, body):
+        """CFG of a proc from the IR items after its Proc"""
+        blocks = []
+        current = None
+        for item in body:
+            if item.__class__ is Label:
+                # A label starts a block unless the current one is still empty
+                if current is None or current.items:
+                    current = BasicBlock(len(blocks))
+                    blocks.append(current)
+                current.labels.append(item.name)
+                continue
+            if current is None:
+                current = BasicBlock(len(blocks))
+                blocks.append(current)
+            current.items.append(item)
+            if item.__class__ is Instr and (item.op in JUMP_OPS or item.op == Opcode.RET):
+                current = None
+        if not blocks:
+            blocks.append(BasicBlock(0))
+
+        by_label = {label: block for block in blocks for label in block.labels}
+        for i, block in enumerate(blocks):
+            last = block.terminator
+            following = blocks[i + 1] if i + 1 < len(blocks) else None
+            if last is None or last.op in (Opcode.JZ, Opcode.JNZ):
+                block.fallthrough = following
+            targets = []
+            if last is not None and last.op in JUMP_OPS and last.target in by_label:
+                targets.append(by_label[last.target])
+            if block.fallthrough is not None:
+                targets.append(block.fallthrough)
+            for target in targets:
+                if target not in block.succs:
+                    block.succs.append(target)
+                    target.preds.append(block)
+        return cls(proc, blocks)
+
+    def reverse_postorder(self):
+        """Blocks reachable from the entry, each before its successors where possible"""
+        order = []
+        seen = {self.entry}
+        stack = [(self.entry, iter(self.entry.succs))]
+        while stack:
+            block, succs = stack[-1]
+            for succ in succs:
+                if succ not in seen:
+                    seen.add(succ)
+                    stack.append((succ, iter(succ.succs)))
+                    break
+            else:
+                stack.pop()
+                order.append(block)
+        order.reverse()
+        return order
+
+    def reachable(self):
+        return set(self.reverse_postorder())
+
+    @property
+    def idom(self):
+        """Immediate dominator of each reachable block; the entry maps to itself"""
+        if self._idom is None:
+            self._idom = self._dominators()
+        return self._idom
+
+    def _dominators(self):
+        order = self.reverse_postorder()
+        number = {block: i for i, block in enumerate(order)}
+        idom = {self.entry: self.entry}
+        changed = True
+        while changed:
+            changed = False
+            for block in order[1:]:
+                new = None
+                for pred in block.preds:
+                    if pred not in idom:
+                        continue
+                    if new is None:
+                        new = pred
+                        continue
+                    a, b = pred, new
+                    while a is not b:
+                        while number[a] > number[b]:
+                            a = idom[a]
+                        while number[b] > number[a]:
+                            b = idom[b]
+                    new = a
+                if idom.get(block) is not new:
+                    idom[block] = new
+                    changed = True
+        return idom
+
+    def dominates(self, a, b):
+        """Whether every path from the entry to b goes through a"""
+        idom = self.idom
+        if b not in idom:
+            return False
+        while True:
+            if b is a:
+                return True
+            parent = idom[b]
+            if parent is b:
+                return False
+            b = parent
+
+    def dominator_tree(self):
+        """Block -> blocks it immediately dominates"""
+        children = {block: [] for block in self.idom}
+        for block, parent in self.idom.items():
+            if parent is not block:
+                children[parent].append(block)
+        return children
+
+    @property
+    def loops(self):
+        """All natural loops, outermost first"""
+        if self._loops is None:
+            self._loops = self._find_loops()
+        return self._loops
+
+    def _find_loops(self):
+        headers = {}
+        for block in self.reverse_postorder():
+            for succ in block.succs:
+                if self.dominates(succ, block):
+                    loop = headers.get(succ)
+                    if loop is None:
+                        loop = headers[succ] = Loop(succ)
+                    loop.back_edges.append(block)
+                    # Everything that reaches the latch without passing the header
+                    stack = [block]
+                    while stack:
+                        member = stack.pop()
+                        if member not in loop.blocks and member in self.idom:
+                            loop.blocks.add(member)
+                            stack.extend(member.preds)
+        loops = sorted(headers.values(), key=lambda loop: len(loop.blocks))
+        for i, loop in enumerate(loops):
+            for outer in loops[i + 1:]:
+                if loop.header in outer.blocks and loop.blocks <= outer.blocks:
+                    loop.parent = outer
+                    outer.children.append(loop)
+                    break
+        ordered = []
+        stack = [loop for loop in reversed(loops) if loop.parent is None]
+        while stack:
+            loop = stack.pop()
+            loop.depth = loop.parent.depth + 1 if loop.parent else 1
+            ordered.append(loop)
+            stack.extend(reversed(loop.children))
+        return ordered
+
+    def loop_forest(self):
+        """Outermost loops; the rest hang off their children"""
+        return [loop for loop in self.loops if loop.parent is None]
+
+    def loop_of(self, block):
+        """Innermost loop containing block, None outside loops"""
+        innermost = None
+        for loop in self.loops:
+            if block in loop.blocks and (innermost is None or loop.depth > innermost.depth):
+                innermost = loop
+        return innermost
+
+    def loop_depth(self, block):
+        loop = self.loop_of(block)
+        return loop.depth if loop else 0
+
+    def label_of(self, block):
+        """A label that leads into block, made up if it has none"""
+        if not block.labels:
+            prefix = f"{self.proc.name}_" if self.proc is not None else ''
+            block.labels.append(f"{prefix}B{block.index}")
+        return block.labels[0]
+
+    def insert_before(self, block, preds):
+        """New empty block laid out just before block; the edges from preds go through it
+
+        Jumps in preds to block are retargeted to the new block. If block
+        was the entry, the new block is. Cached dominators are kept up to
+        date, loops are not.
+        """
+        new = BasicBlock(1 + max(b.index for b in self.blocks))
+        for pred in preds:
+            last = pred.terminator
+            if last is not None and last.op in JUMP_OPS and last.target in block.labels:
+                last.target = self.label_of(new)
+            if pred.fallthrough is block:
+                pred.fallthrough = new
+            pred.succs[pred.succs.index(block)] = new
+            new.preds.append(pred)
+        block.preds = [new] + [pred for pred in block.preds if pred not in preds]
+        new.succs.append(block)
+        new.fallthrough = block
+        self.blocks.insert(self.blocks.index(block), new)
+        if self._idom is not None and block in self._idom:
+            self._idom[new] = new if block is self.entry else self._idom[block]
+            self._idom[block] = new
+        if block is self.entry:
+            self.entry = new
+        return new
+
+    def to_items(self, order=None):
+        """The proc's IR with the blocks laid out in order (default: as built)
+
+        order must start with the entry block. Where a block's fallthrough is not the next block in the new
+        layout, a jmp to it is added, and a label if it had none.
+        """
+        order = self.blocks if order is None else order
+        jumps = {}  # block -> block it now has to jump to
+        for i, block in enumerate(order):
+            target = block.fallthrough
+            if target is not None and (i + 1 >= len(order) or order[i + 1] is not target):
+                self.label_of(target)
+                jumps[block] = target
+        items = []
+        for block in order:
+            items.extend(Label(label) for label in block.labels)
+            items.extend(block.items)
+            if block in jumps:
+                items.append(Instr(Opcode.JMP, target=jumps[block].labels[0]))
+        return items
+
+
+def build_cfgs(items):
+    """(Proc, CFG) for every proc in a list of IR items"""
+    return [(proc, CFG.build(proc, body)) for proc, body in split_procs(items) if proc is not None]
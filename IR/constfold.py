@@ -0,0 +1,331 @@
+import copy
+
+from Parser.ast import *
+from SemanticAnalyzer.visitor import Visitor
+from SemanticAnalyzer.typetable import TypeTable
+
+# tsvm registers are C longs
+_MIN_INT = -(1 << 63)
+_MAX_INT = (1 << 63) - 1
+
+
+def c_div(a, b):
+    """a / b as C computes it: the quotient is truncated toward zero"""
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+def c_mod(a, b):
+    """a % b as C computes it: the remainder takes the sign of a"""
+    return a - b * c_div(a, b)
+
+
+_BINARY = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': c_div,
+    '%': c_mod,
+    '&&': lambda a, b: int(bool(a) and bool(b)),
+    '||': lambda a, b: int(bool(a) or bool(b)),
+    '==': lambda a, b: int(a == b),
+    '!=': lambda a, b: int(a != b),
+    '<': lambda a, b: int(a < b),
+    '>': lambda a, b: int(a > b),
+    '<=': lambda a, b: int(a <= b),
+    '>=': lambda a, b: int(a >= b),
+}
+
+_UNARY = {
+    '-': lambda a: -a,
+    '!': lambda a: int(not a),
+}
+
+
+def constant_value(node):
+    """Integer value of a literal node as tsvm sees it, None otherwise"""
+    if node.__class__ is NumberNode and node.num_value.__class__ is int:
+        return node.num_value
+    if node.__class__ is BooleanNode:
+        return 1 if node.value in (True, 'true') else 0
+    if node.__class__ is NullNode:
+        return 0
+    return None
+
+
+def assigned_bindings(node):
+    """Bindings of every variable a statement can write or declare"""
+    written = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            continue
+        if node.__class__ is list:
+            stack.extend(node)
+            continue
+        if node.__class__ is AssignmentNode:
+            if node.left.__class__ is IdentifierNode:
+                written.add(getattr(node.left, 'binding', None))
+        elif node.__class__ in (VariableDefinitionNode, ForStatementNode):
+            written.add(getattr(node, 'binding', None))
+        stack.extend(getattr(node, name) for name in ('stmt', 'else_choice', 'body')
+                     if hasattr(node, name))
+    written.discard(None)
+    return written
+
+
+class ConstantFolder(Visitor):
+    """Folds constant expressions and propagates constant locals on the AST
+
+    Runs after the Resolver, since variables are tracked by their binding.
+    Arithmetic, comparisons, `!`, unary `-` and `&&`/`||`
+    whose operands are known are evaluated the way tsvm would (C division
+    and remainder, results that fit a long); division by zero is left for
+    run time. A local whose last assignment was a constant is replaced by
+    that constant where it is read. Branches merge by keeping what both
+    sides agree on, and a loop first forgets every variable its body can
+    write. `if` with a constant condition becomes the branch it takes and
+    `while` with a false condition is removed.
+
+    Every handler returns the node that should replace the one visited
+    (None removes a statement). The tree folded is left as it was: a node
+    whose children change is copied, sharing the children that do not,
+    so the same analyzed tree can be generated again. types is a copy of
+    the TypeTable given that also describes the copies and new literals.
+    """
+
+    def __init__(self, types=None):
+        super().__init__()
+        self.types = None   # TypeTable of the folded tree
+        if types is not None:
+            self.types = TypeTable()
+            self.types.merge(types)
+        self.env = {}       # binding -> known integer value
+        self.folded = 0
+        self.propagated = 0
+        self.branches = 0
+
+    def fold(self, ast_root):
+        """Folded copy of ast_root, carrying self.types as its types"""
+        root = copy.copy(self.visit(ast_root))
+        if self.types is not None:
+            root.types = self.types
+        return root
+
+    def rebuilt(self, node, **children):
+        """node with the given children, copied if any of them changed"""
+        if all(same(getattr(node, name), child) for name, child in children.items()):
+            return node
+        result = copy.copy(node)
+        for name, child in children.items():
+            setattr(result, name, child)
+        if self.types is not None:
+            node_type = self.types.type_of(node)
+            if node_type is not None:
+                self.types.record_type(result, node_type)
+            symbol = self.types.symbol_of(node)
+            if symbol is not None:
+                self.types.record_symbol(result, symbol)
+        return result
+
+    def constant(self, value, original):
+        """Literal node standing for value where original was"""
+        node = NumberNode(num_value=value, lineno=original.lineno)
+        node.type = getattr(original, 'type', None)
+        if self.types is not None:
+            node_type = self.types.type_of(original)
+            if node_type is not None:
+                self.types.record_type(node, node_type)
+        return node
+
+    def visit_list(self, items):
+        result = []
+        for item in items:
+            item = self.visit(item)
+            if item is not None:
+                result.append(item)
+        return result
+
+    def generic_visit(self, node):
+        return node
+
+    def visit_ProgramNode(self, node):
+        return self.rebuilt(node, function=self.visit(node.function))
+
+    def visit_FunctionNode(self, node):
+        self.env = {}
+        return self.rebuilt(node, func_choice=self.visit(node.func_choice))
+
+    def visit_FunctionWithReturnNode(self, node):
+        self.env = {}
+        return self.rebuilt(node, expr=self.visit(node.expr))
+
+    def visit_BodyNode(self, node):
+        return self.rebuilt(node, body=self.visit(node.body))
+
+    def visit_FunctionBodyNode(self, node):
+        stmt = self.visit(node.stmt)
+        return self.rebuilt(node, stmt=stmt, body=self.visit(node.body))
+
+    # Statements
+
+    def visit_VariableDefinitionNode(self, node):
+        value = self.visit(node.defvar_choice)
+        self.record(getattr(node, 'binding', None), value)
+        return self.rebuilt(node, defvar_choice=value)
+
+    def visit_AssignmentNode(self, node):
+        right = self.visit(node.right)
+        left = node.left
+        if left.__class__ is IdentifierNode:
+            self.record(getattr(left, 'binding', None), right)
+        elif left.__class__ is ArrayIndexingNode:
+            left = self.visit_ArrayIndexingNode(left)
+        return self.rebuilt(node, right=right, left=left)
+
+    def record(self, binding, value_node):
+        if binding is None:
+            return
+        value = constant_value(value_node) if value_node is not None else None
+        if value is None:
+            self.env.pop(binding, None)
+        else:
+            self.env[binding] = value
+
+    def visit_ExpressionStatementNode(self, node):
+        return self.rebuilt(node, expr=self.visit(node.expr))
+
+    visit_PrintStatementNode = visit_ExpressionStatementNode
+    visit_ReturnStatementNode = visit_ExpressionStatementNode
+
+    def visit_IfStatementNode(self, node):
+        expr = self.visit(node.expr)
+        condition = constant_value(expr)
+        if condition is not None:
+            self.branches += 1
+            return self.visit(node.stmt if condition else node.else_choice)
+        before = self.env
+        self.env = dict(before)
+        stmt = self.visit(node.stmt)
+        taken = self.env
+        self.env = dict(before)
+        else_choice = self.visit(node.else_choice)
+        self.env = {binding: value for binding, value in self.env.items()
+                    if taken.get(binding) == value}
+        return self.rebuilt(node, expr=expr, stmt=stmt, else_choice=else_choice)
+
+    def enter_loop(self, node):
+        """Forget what the loop body can change; returns the bindings forgotten"""
+        written = assigned_bindings(node)
+        for binding in written:
+            self.env.pop(binding, None)
+        return written
+
+    def leave_loop(self, before, written):
+        self.env = {binding: value for binding, value in before.items()
+                    if binding not in written}
+
+    def visit_WhileStatementNode(self, node):
+        before = dict(self.env)
+        written = self.enter_loop(node)
+        expr = self.visit(node.expr)
+        if constant_value(expr) == 0:
+            self.branches += 1
+            self.env = before
+            return None
+        stmt = self.visit(node.stmt)
+        self.leave_loop(before, written)
+        return self.rebuilt(node, expr=expr, stmt=stmt)
+
+    def visit_DoWhileStatementNode(self, node):
+        before = dict(self.env)
+        written = self.enter_loop(node)
+        stmt = self.visit(node.stmt)
+        condition = self.visit(node.condition)
+        self.leave_loop(before, written)
+        return self.rebuilt(node, stmt=stmt, condition=condition)
+
+    def visit_ForStatementNode(self, node):
+        # Both bounds are evaluated once, before the loop starts
+        expr1 = self.visit(node.expr1)
+        expr2 = self.visit(node.expr2)
+        before = dict(self.env)
+        written = self.enter_loop(node)
+        stmt = self.visit(node.stmt)
+        self.leave_loop(before, written)
+        return self.rebuilt(node, expr1=expr1, expr2=expr2, stmt=stmt)
+
+    # Expressions
+
+    def visit_IdentifierNode(self, node):
+        value = self.env.get(getattr(node, 'binding', None))
+        if value is None:
+            return node
+        self.propagated += 1
+        return self.constant(value, node)
+
+    def visit_ParenthesisNode(self, node):
+        expr = self.visit(node.expr)
+        if constant_value(expr) is not None:
+            return expr
+        return self.rebuilt(node, expr=expr)
+
+    def visit_FunctionCallNode(self, node):
+        return self.rebuilt(node, clist=self.visit(node.clist))
+
+    def visit_ClistNode(self, node):
+        if node.expr.__class__ is list:
+            return self.rebuilt(node, expr=[self.visit(expr) for expr in node.expr])
+        return self.rebuilt(node, expr=self.visit(node.expr))
+
+    def visit_ArrayIndexingNode(self, node):
+        array_expr = self.visit(node.array_expr)
+        return self.rebuilt(node, array_expr=array_expr, index_expr=self.visit(node.index_expr))
+
+    def visit_TernaryOperationNode(self, node):
+        condition = self.visit(node.condition)
+        true_expr = self.visit(node.true_expr)
+        return self.rebuilt(node, condition=condition, true_expr=true_expr,
+                            false_expr=self.visit(node.false_expr))
+
+    def visit_BinaryOperationNode(self, node):
+        expr1 = self.visit(node.expr1)
+        node = self.rebuilt(node, expr1=expr1, expr2=self.visit(node.expr2))
+        left = constant_value(node.expr1)
+        right = constant_value(node.expr2)
+        operation = _BINARY.get(node.operator)
+        if left is None or right is None or operation is None:
+            return node
+        if node.operator in ('/', '%') and right == 0:
+            return node
+        return self.result(operation(left, right), node)
+
+    visit_ComparisonOperationNode = visit_BinaryOperationNode
+
+    def visit_UnaryOperationNode(self, node):
+        node = self.rebuilt(node, expr=self.visit(node.expr))
+        value = constant_value(node.expr)
+        operation = _UNARY.get(node.operator)
+        if value is None or operation is None:
+            return node
+        return self.result(operation(value), node)
+
+    def result(self, value, node):
+        if not _MIN_INT <= value <= _MAX_INT:
+            return node
+        self.folded += 1
+        return self.constant(value, node)
+
+
+def same(old, new):
+    """Whether a child the folder returned is the one it was given"""
+    if old is new:
+        return True
+    return old.__class__ is list and new.__class__ is list and len(old) == len(new) \
+        and all(a is b for a, b in zip(old, new))
+
+
+def fold_constants(ast_root, types=None):
+    """Folded copy of an analyzed, resolved AST; ast_root is not changed"""
+    return ConstantFolder(types).fold(ast_root)
@@ -0,0 +1,102 @@
+from IR.ir import Opcode, RETURN_REGISTER, BINARY_OPS, UNARY_OPS, is_register
+
+# Operand order does not matter
+_COMMUTATIVE_OPS = frozenset({Opcode.ADD, Opcode.MUL, Opcode.EQ, Opcode.NE})
+# a > b is b < a, and a >= b is b <= a
+_SWAPPED = {Opcode.GT: Opcode.LT, Opcode.GE: Opcode.LE}
+
+
+class ValueNumbering:
+    """Common subexpression elimination on a proc in SSA form
+
+    Blocks are walked down the dominator tree. Every register gets a value
+    number: a copy has its source's, and an instruction computing an
+    expression already computed by a block that dominates it (a
+    literal, an arithmetic or compare op, or `len`) gets the number of
+    that earlier result and becomes `mov d, earlier`, which copy
+    propagation then removes. Two expressions are the same when their
+    opcode and operand values are, with the operands of commutative ops
+    put in order and `a > b` read as `b < a`.
+
+    Memory is only followed inside a block: a load from a base and index
+    already loaded is reused, and a store makes its value the result of
+    the next load from the same place. Any other store and every call
+    forget what is known about memory, since two vector registers can
+    name the same vector. Registers phis merge are not reused, so the
+    versions of one variable still never overlap.
+
+    reused counts the instructions replaced.
+    """
+
+    def __init__(self, ssa):
+        self.ssa = ssa
+        self.cfg = ssa.cfg
+        self.reused = 0
+
+    def run(self):
+        """Number every block; returns how many instructions were replaced"""
+        merged = self.ssa.phi_registers()
+        children = self.cfg.dominator_tree()
+        numbers = {}          # register -> register first holding its value
+        available = {}        # expression -> register holding it
+        before = self.reused
+
+        def number(operand):
+            return numbers.get(operand, operand) if is_register(operand) else operand
+
+        work = [(self.cfg.entry, None)]
+        while work:
+            block, added = work.pop()
+            if added is not None:
+                for key in added:
+                    del available[key]
+                continue
+            added = []
+            memory = {}       # (base, index) -> register holding that element
+            for instr in block.instrs:
+                if instr.op in (Opcode.STORE, Opcode.CALL):
+                    memory.clear()
+                    if instr.op == Opcode.STORE:
+                        base, index, value = (number(arg) for arg in instr.args)
+                        if is_register(value) and value != RETURN_REGISTER \
+                                and value not in merged:
+                            memory[base, index] = value
+                    continue
+                dest = instr.dest
+                if dest is None or dest == RETURN_REGISTER or RETURN_REGISTER in instr.args:
+                    continue
+                key = self.expression(instr, number)
+                if key is None:
+                    continue
+                if key[0] == Opcode.MOV and is_register(key[1]):
+                    numbers[dest] = key[1]
+                    continue
+                table = memory if instr.op == Opcode.LOAD else available
+                if instr.op == Opcode.LOAD:
+                    key = key[1:]
+                earlier = table.get(key)
+                if earlier is not None:
+                    instr.op, instr.args = Opcode.MOV, (earlier,)
+                    numbers[dest] = numbers.get(earlier, earlier)
+                    self.reused += 1
+                elif dest not in merged:
+                    table[key] = dest
+                    if table is available:
+                        added.append(key)
+            work.append((block, added))
+            work.extend((child, None) for child in children.get(block, ()))
+        return self.reused - before
+
+    @staticmethod
+    def expression(instr, number):
+        """(op, operand values) for an instruction that only computes its dest, else None"""
+        op = instr.op
+        if op not in BINARY_OPS and op not in UNARY_OPS and op not in (Opcode.MOV, Opcode.LOAD):
+            return None
+        args = [number(arg) for arg in instr.args]
+        if op in _SWAPPED:
+            op = _SWAPPED[op]
+            args.reverse()
+        elif op in _COMMUTATIVE_OPS:
+            args.sort(key=lambda arg: (arg.__class__.__name__, str(arg)))
+        return (op, *args)
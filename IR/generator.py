@@ -1,18 +1,94 @@
 from Parser.ast import *
+from Parser.typesys import Type, base_type, type_name
 from SemanticAnalyzer.visitor import Visitor
+from SemanticAnalyzer.resolver import Resolver
+from SemanticAnalyzer.callgraph import call_graph, program_functions
+from IR.ir import Opcode, Instr, Label, Comment, Proc, split_procs, join_procs
+from IR.printer import format_lines, format_program
+from IR.regalloc import allocate_registers
+from IR.constfold import constant_value, fold_constants
+from IR.peephole import PEEPHOLE_PASSES, Peephole
+from IR.tailcall import TailCallEliminator
+from IR.inline import Inliner, proc_calls
+from IR.ssa import SSAOptimizer
+from IR.isel import InstructionSelector
+from IR.passes import OPTIMIZATION_LEVELS, PassManager, format_pass_report
 from abc import ABC, abstractmethod
+from functools import partial
 
 class CodeGenerator(Visitor):
-    """Code generator for TesLang that produces intermediate code for tsvm"""
-    
-    def __init__(self):
-        self.code = []  # Generated code lines
+    """Code generator for TesLang that produces intermediate code for tsvm
+
+    With prune_unreachable set, functions main can never call are left out
+    of the output. With constant_folding set (the default) constant
+    expressions and variables are folded on a copy of the AST first. With
+    jumping_code set (the default) the conditions of if and while jump
+    straight to their targets instead of going through a 0/1 register
+    (see emit_branch). With tail_calls set (the default) `return f(...)`
+    inside f jumps back to the start of f instead of calling it (see
+    IR/tailcall.py). With inlining set (the default) calls to small
+    procs are replaced by their bodies (see IR/inline.py); with
+    prune_unreachable as well, procs nothing calls any more are left out.
+    With ssa set (the default) each proc is put in SSA form for copy
+    propagation and dead-code elimination and taken out of it again;
+    cse (also the default) adds common subexpression elimination and
+    loop_optimization (the default too) loop-invariant code motion and
+    strength reduction while it is in SSA form. With
+    instruction_selection set (the default) literals become immediate
+    operands where tsvm takes them (see IR/isel.py). The emitted code
+    then goes through the peephole passes named in peephole (all of them
+    by default, () for none; see IR/peephole.py), and with
+    register_allocation set (the default) through linear-scan register
+    allocation. at_level() sets these flags from an -O level instead.
+
+    The passes run under a PassManager (IR/passes.py): pass_report holds
+    the wall time and instruction counts of each, and with verify set the
+    IR is checked after every pass (IR/verify.py). register_report lists
+    (function, registers before, registers after); tail_call_report,
+    inline_report, ssa_report, selection_report and peephole_report what
+    each pass changed.
+    """
+    
+    def __init__(self, prune_unreachable=False, register_allocation=True, constant_folding=True,
+                 peephole=PEEPHOLE_PASSES, ssa=True, loop_optimization=True, jumping_code=True,
+                 instruction_selection=True, inlining=True, tail_calls=True, cse=True,
+                 verify=False):
+        super().__init__()
+        self.code = []  # Generated IR items, see IR/ir.py
         self.register_counter = 0  # For temporary registers
         self.label_counter = 0  # For labels
         self.current_function = None
         self.function_params = {}  # Store function parameters
         self.local_vars = {}  # Store local variables for current function
+        self.slot_registers = {}  # (scope depth, slot) -> register of its latest declaration
         self.global_vars = {}  # Store global variables
+        self.types = None  # TypeTable from semantic analysis, if it ran
+        self.prune_unreachable = prune_unreachable
+        self.register_allocation = register_allocation
+        self.constant_folding = constant_folding
+        self.jumping_code = jumping_code
+        self.peephole = Peephole(peephole)
+        self.peephole_report = {}
+        self.tail_calls = tail_calls
+        self.tail_call_report = {}
+        self.inlining = inlining
+        self.inline_report = {}
+        self.ssa = ssa
+        self.loop_optimization = loop_optimization
+        self.cse = cse
+        self.ssa_report = {}
+        self.instruction_selection = instruction_selection
+        self.selection_report = {}
+        self.register_report = []
+        self.verify = verify
+        self.pass_report = []
+
+    @classmethod
+    def at_level(cls, level, **options):
+        """CodeGenerator with the passes of an -O level (see IR/passes.py); options override them"""
+        if level not in OPTIMIZATION_LEVELS:
+            raise ValueError(f"unknown optimization level {level!r}")
+        return cls(**{**OPTIMIZATION_LEVELS[level], **options})
         
     def new_register(self):
         """Generate a new temporary register"""
@@ -26,49 +102,43 @@ class CodeGenerator(Visitor):
         self.label_counter += 1
         return label
     
-    def emit(self, instruction):
-        """Emit an instruction"""
-        self.code.append(instruction)
+    def emit(self, item):
+        """Emit an IR item (Instr, Label, Comment or Proc)"""
+        self.code.append(item)
     
     def emit_comment(self, comment):
         """Emit a comment"""
-        self.code.append(f"# {comment}")
+        self.code.append(Comment(comment))
     
-    def visit(self, node):
-        """Main visit method that dispatches to specific visit methods"""
-        if node is None:
+    def type_of(self, node):
+        """Type the semantic analyzer inferred for a node, None if unknown"""
+        if self.types is None:
             return None
-            
-        method_name = f'visit_{type(node).__name__}'
-        visitor = getattr(self, method_name, self.generic_visit)
-        return visitor(node)
-    
-    def generic_visit(self, node):
-        """Generic visit for nodes without specific handlers"""
-        if hasattr(node, 'children'):
-            for child in node.children:
-                if child:
-                    self.visit(child)
-        return None
+        return self.types.type_of(node)
+    
+    def emit_print(self, expr, reg):
+        """Print a value; tsvm can only print integers"""
+        expr_type = self.type_of(expr)
+        if base_type(expr_type) in (Type.STR, Type.MSTR, Type.VECTOR):
+            self.emit_comment(f"print of a {type_name(expr_type)} value is not supported by tsvm")
+            return
+        self.emit(Instr(Opcode.CALL, args=[reg], target='iput'))
     
     def visit_ProgramNode(self, node):
         """Visit program node (root)"""
-        if node.function:
-            if isinstance(node.function, list):
-                for func in node.function:
-                    self.visit(func)
-            else:
-                self.visit(node.function)
+        for func in self.functions_of(node):
+            self.visit(func)
         return None
     
-    def visit_FunctionNode(self, node):
-        """Visit function definition node"""
+    def begin_function(self, node):
+        """Emit the proc header of a function and bind its parameters to r1..rk"""
         func_name = node.iden
         self.current_function = func_name
         
         # Reset register counter for each function
         self.register_counter = 1  # r0 is reserved for return value
         self.local_vars = {}
+        self.slot_registers = {}
         
         # Extract parameters
         params = []
@@ -80,19 +150,21 @@ class CodeGenerator(Visitor):
             param_name = current_param.iden
             param_regs[param_name] = f"r{reg_num}"
             params.append((param_name, f"r{reg_num}"))
+            self.bind(current_param, f"r{reg_num}")
             reg_num += 1
             current_param = getattr(current_param, 'next_param', None)
         
         self.function_params[func_name] = param_regs
         
         # Generate function header
-        param_comment = ", ".join([f"{name} => {reg}" for name, reg in params])
-        if param_comment:
-            param_comment += " & "
-        self.emit(f"proc {func_name} # {param_comment}return value => r0")
+        self.emit(Proc(func_name, params))
         
         # Update register counter to account for parameters
         self.register_counter = reg_num
+    
+    def visit_FunctionNode(self, node):
+        """Visit function definition node"""
+        self.begin_function(node)
         
         # Visit function body
         if node.func_choice:
@@ -100,8 +172,8 @@ class CodeGenerator(Visitor):
         
         # Ensure function ends with ret
         if not self.code or not any(self.code[-2:]):
-            self.emit("mov r0, 0")
-            self.emit("ret")
+            self.emit(Instr(Opcode.MOV, 'r0', [0]))
+            self.emit(Instr(Opcode.RET))
 
         
         self.current_function = None
@@ -109,11 +181,15 @@ class CodeGenerator(Visitor):
     
     def visit_FunctionWithReturnNode(self, node):
         """Visit function with return expression"""
+        self.begin_function(node)
+        
         # Generate code for the return expression
         result_reg = self.visit(node.expr)
         if result_reg:
-            self.emit(f"mov r0, {result_reg}")
-        self.emit("ret")
+            self.emit(Instr(Opcode.MOV, 'r0', [result_reg]))
+        self.emit(Instr(Opcode.RET))
+        
+        self.current_function = None
         return None
     
     def visit_BodyNode(self, node):
@@ -146,12 +222,13 @@ class CodeGenerator(Visitor):
         var_name = node.iden
         var_reg = self.new_register()
         self.local_vars[var_name] = var_reg
+        self.bind(node, var_reg)
         
         # If there's initialization
         if node.defvar_choice:
             init_reg = self.visit(node.defvar_choice)
             if init_reg:
-                self.emit(f"mov {var_reg}, {init_reg}")
+                self.emit(Instr(Opcode.MOV, var_reg, [init_reg]))
         
         return var_reg
     
@@ -162,25 +239,41 @@ class CodeGenerator(Visitor):
         
         # Handle left side assignment
         if isinstance(node.left, IdentifierNode):
-            var_name = node.left.iden_value
             # Get variable register
-            var_reg = self.get_variable_register(var_name)
+            var_reg = self.identifier_register(node.left)
             if var_reg and right_reg:
-                self.emit(f"mov {var_reg}, {right_reg}")
+                self.emit(Instr(Opcode.MOV, var_reg, [right_reg]))
         
         elif isinstance(node.left, ArrayIndexingNode):
             # Handle array assignment
             array_reg = self.visit(node.left.array_expr)
             index_reg = self.visit(node.left.index_expr)
             if array_reg and index_reg and right_reg:
-                self.emit(f"mov [{array_reg} + {index_reg}], {right_reg}")
+                self.emit(Instr(Opcode.STORE, args=[array_reg, index_reg, right_reg]))
         
         return right_reg
     
     def visit_IdentifierNode(self, node):
         """Visit identifier node"""
-        var_name = node.iden_value
-        return self.get_variable_register(var_name)
+        return self.identifier_register(node)
+    
+    def bind(self, node, reg):
+        """Record the register of a declaration bound by the Resolver
+
+        Sibling scopes reuse (depth, slot) pairs, so every declaration gets
+        a fresh register and rebinds its pair here; the uses that follow it
+        in source order then find that register.
+        """
+        binding = getattr(node, 'binding', None)
+        if binding:
+            self.slot_registers[binding] = reg
+    
+    def identifier_register(self, node):
+        """Get register for an identifier, by its resolved slot when it has one"""
+        reg = self.slot_registers.get(getattr(node, 'binding', None))
+        if reg:
+            return reg
+        return self.get_variable_register(node.iden_value)
     
     def get_variable_register(self, var_name):
         """Get register for a variable"""
@@ -204,30 +297,29 @@ class CodeGenerator(Visitor):
         # Handle built-in functions
         if func_name == "scan":
             result_reg = self.new_register()
-            self.emit(f"call iget, {result_reg}")
+            self.emit(Instr(Opcode.CALL, result_reg, target='iget'))
             return result_reg
         
         elif func_name == "print":
-            if node.clist:
-                arg_reg = self.visit(node.clist)
-                if arg_reg:
-                    self.emit(f"call iput, {arg_reg}")
+            args = self.collect_arguments(node.clist) if node.clist else []
+            if args:
+                self.emit_print(node.clist.expr[0], args[0])
             return None
         
         elif func_name == "length":
             if node.clist:
-                arg_reg = self.visit(node.clist)
+                args = self.collect_arguments(node.clist)
                 result_reg = self.new_register()
-                if arg_reg:
-                    self.emit(f"len {result_reg}, {arg_reg}")
+                if args:
+                    self.emit(Instr(Opcode.LEN, result_reg, [args[0]]))
                 return result_reg
         
         elif func_name == "list":
             if node.clist:
-                size_reg = self.visit(node.clist)
+                args = self.collect_arguments(node.clist)
                 result_reg = self.new_register()
-                if size_reg:
-                    self.emit(f"call mem, {result_reg}, {size_reg}")
+                if args:
+                    self.emit(Instr(Opcode.CALL, result_reg, [args[0]], 'mem'))
 
                 return result_reg
         
@@ -240,11 +332,7 @@ class CodeGenerator(Visitor):
             result_reg = self.new_register()
             
             # Generate call instruction
-            if args:
-                args_str = ", ".join(args)
-                self.emit(f"call {func_name}, {result_reg}, {args_str}")
-            else:
-                self.emit(f"call {func_name}, {result_reg}")
+            self.emit(Instr(Opcode.CALL, result_reg, args, func_name))
             
             return result_reg
     
@@ -283,7 +371,7 @@ class CodeGenerator(Visitor):
         
         if array_reg and index_reg:
             result_reg = self.new_register()
-            self.emit(f"mov {result_reg}, [{array_reg} + {index_reg}]")
+            self.emit(Instr(Opcode.LOAD, result_reg, [array_reg, index_reg]))
             return result_reg
         
         return None
@@ -293,16 +381,16 @@ class CodeGenerator(Visitor):
         if node.expr:
             result_reg = self.visit(node.expr)
             if result_reg:
-                self.emit(f"mov r0, {result_reg}")
+                self.emit(Instr(Opcode.MOV, 'r0', [result_reg]))
         else:
-            self.emit("mov r0, 0")
-        self.emit("ret")
+            self.emit(Instr(Opcode.MOV, 'r0', [0]))
+        self.emit(Instr(Opcode.RET))
         return None
     
     def visit_NumberNode(self, node):
         """Visit number literal"""
         result_reg = self.new_register()
-        self.emit(f"mov {result_reg}, {node.num_value}")
+        self.emit(Instr(Opcode.MOV, result_reg, [node.num_value]))
         return result_reg
     
     def visit_StringNode(self, node):
@@ -310,24 +398,27 @@ class CodeGenerator(Visitor):
         result_reg = self.new_register()
         # For strings, we might need to handle them differently
         # depending on the virtual machine's string handling
-        self.emit(f"mov {result_reg}, \"{node.str_value}\"")
+        self.emit(Instr(Opcode.MOV, result_reg, [f'"{node.str_value}"']))
         return result_reg
     
     def visit_BooleanNode(self, node):
         """Visit boolean literal"""
         result_reg = self.new_register()
-        value = 1 if node.value else 0
-        self.emit(f"mov {result_reg}, {value}")
+        value = constant_value(node)
+        self.emit(Instr(Opcode.MOV, result_reg, [value]))
         return result_reg
     
     def visit_NullNode(self, node):
         """Visit null literal"""
         result_reg = self.new_register()
-        self.emit(f"mov {result_reg}, 0")
+        self.emit(Instr(Opcode.MOV, result_reg, [0]))
         return result_reg
     
     def visit_BinaryOperationNode(self, node):
         """Visit binary operation"""
+        if node.operator in ('&&', '||'):
+            return self.emit_logical_value(node)
+        
         left_reg = self.visit(node.expr1)
         right_reg = self.visit(node.expr2)
         
@@ -337,48 +428,67 @@ class CodeGenerator(Visitor):
         result_reg = self.new_register()
         
         if node.operator == '+':
-            self.emit(f"add {result_reg}, {left_reg}, {right_reg}")
+            self.emit(Instr(Opcode.ADD, result_reg, [left_reg, right_reg]))
         elif node.operator == '-':
-            self.emit(f"sub {result_reg}, {left_reg}, {right_reg}")
+            self.emit(Instr(Opcode.SUB, result_reg, [left_reg, right_reg]))
         elif node.operator == '*':
-            self.emit(f"mul {result_reg}, {left_reg}, {right_reg}")
+            self.emit(Instr(Opcode.MUL, result_reg, [left_reg, right_reg]))
         elif node.operator == '/':
-            self.emit(f"div {result_reg}, {left_reg}, {right_reg}")
+            self.emit(Instr(Opcode.DIV, result_reg, [left_reg, right_reg]))
         elif node.operator == '%':
-            self.emit(f"mod {result_reg}, {left_reg}, {right_reg}")
-
-
-        elif node.operator == '&&':
-            false_label = self.new_label("and_false")
-            end_label = self.new_label("and_end")
-            
-            self.emit(f"jz {left_reg}, {false_label}")  # if left is 0 => jump
-            self.emit(f"jz {right_reg}, {false_label}") # if right is 0 => jump
-            self.emit(f"mov {result_reg}, 1")
-            self.emit(f"jmp {end_label}")
-            self.emit(f"{false_label}:")
-            self.emit(f"mov {result_reg}, 0")
-            self.emit(f"{end_label}:")
-
-        elif node.operator == '||':
-            true_label = self.new_label("or_true")
-            end_label = self.new_label("or_end")
-
-            self.emit(f"jnz {left_reg}, {true_label}")  # if left != 0 => jump
-            self.emit(f"jnz {right_reg}, {true_label}") # if right != 0 => jump
-            self.emit(f"mov {result_reg}, 0")
-            self.emit(f"jmp {end_label}")
-            self.emit(f"{true_label}:")
-            self.emit(f"mov {result_reg}, 1")
-            self.emit(f"{end_label}:")
-   
-
+            self.emit(Instr(Opcode.MOD, result_reg, [left_reg, right_reg]))
         else:
             # For other operations, just move left operand
-            self.emit(f"mov {result_reg}, {left_reg}")
+            self.emit(Instr(Opcode.MOV, result_reg, [left_reg]))
         
         return result_reg
     
+    def emit_logical_value(self, node):
+        """Value of && or || as 0/1; the right operand only runs if the left does not decide"""
+        name = 'and' if node.operator == '&&' else 'or'
+        result_reg = self.new_register()
+        false_label = self.new_label(f"{name}_false")
+        end_label = self.new_label(f"{name}_end")
+        self.emit_branch(node, false_label, False)
+        self.emit(Instr(Opcode.MOV, result_reg, [1]))
+        self.emit(Instr(Opcode.JMP, target=end_label))
+        self.emit(Label(false_label))
+        self.emit(Instr(Opcode.MOV, result_reg, [0]))
+        self.emit(Label(end_label))
+        return result_reg
+    
+    def emit_branch(self, node, label, when):
+        """Jump to label if the condition node is true (when=True) or false (when=False)
+        
+        Control falls through otherwise. && and || short-circuit and ! swaps
+        the sense of the jump, so none of them computes a 0/1 register.
+        tsvm has no compare-and-branch, so a comparison still sets one for
+        jz/jnz to test. A constant condition becomes a jmp or nothing.
+        """
+        value = constant_value(node)
+        if value is not None:
+            if bool(value) == when:
+                self.emit(Instr(Opcode.JMP, target=label))
+            return
+        if isinstance(node, ParenthesisNode):
+            self.emit_branch(node.expr, label, when)
+        elif isinstance(node, UnaryOperationNode) and node.operator == '!':
+            self.emit_branch(node.expr, label, not when)
+        elif isinstance(node, BinaryOperationNode) and node.operator in ('&&', '||'):
+            # The left operand alone decides a && b when false, a || b when true
+            if when == (node.operator == '||'):
+                self.emit_branch(node.expr1, label, when)
+                self.emit_branch(node.expr2, label, when)
+            else:
+                skip_label = self.new_label("skip")
+                self.emit_branch(node.expr1, skip_label, not when)
+                self.emit_branch(node.expr2, label, when)
+                self.emit(Label(skip_label))
+        else:
+            condition_reg = self.visit(node)
+            if condition_reg:
+                self.emit(Instr(Opcode.JNZ if when else Opcode.JZ, args=[condition_reg], target=label))
+    
     def visit_ComparisonOperationNode(self, node):
         """Visit comparison operation"""
         left_reg = self.visit(node.expr1)
@@ -390,17 +500,17 @@ class CodeGenerator(Visitor):
         result_reg = self.new_register()
         
         if node.operator == '==':
-            self.emit(f"eq {result_reg}, {left_reg}, {right_reg}")
+            self.emit(Instr(Opcode.EQ, result_reg, [left_reg, right_reg]))
         elif node.operator == '!=':
-            self.emit(f"ne {result_reg}, {left_reg}, {right_reg}")
+            self.emit(Instr(Opcode.NE, result_reg, [left_reg, right_reg]))
         elif node.operator == '<':
-            self.emit(f"lt {result_reg}, {left_reg}, {right_reg}")
+            self.emit(Instr(Opcode.LT, result_reg, [left_reg, right_reg]))
         elif node.operator == '>':
-            self.emit(f"gt {result_reg}, {left_reg}, {right_reg}")
+            self.emit(Instr(Opcode.GT, result_reg, [left_reg, right_reg]))
         elif node.operator == '<=':
-            self.emit(f"le {result_reg}, {left_reg}, {right_reg}")
+            self.emit(Instr(Opcode.LE, result_reg, [left_reg, right_reg]))
         elif node.operator == '>=':
-            self.emit(f"ge {result_reg}, {left_reg}, {right_reg}")
+            self.emit(Instr(Opcode.GE, result_reg, [left_reg, right_reg]))
         
         return result_reg
     
@@ -414,42 +524,47 @@ class CodeGenerator(Visitor):
         result_reg = self.new_register()
         
         if node.operator == '-':
-            self.emit(f"neg {result_reg}, {expr_reg}")
+            self.emit(Instr(Opcode.NEG, result_reg, [expr_reg]))
         elif node.operator == '!':
-            self.emit(f"not {result_reg}, {expr_reg}")
+            self.emit(Instr(Opcode.NOT, result_reg, [expr_reg]))
         else:
-            self.emit(f"mov {result_reg}, {expr_reg}")
+            self.emit(Instr(Opcode.MOV, result_reg, [expr_reg]))
         
         return result_reg
     
     def visit_IfStatementNode(self, node):
         """Visit if statement"""
-        condition_reg = self.visit(node.expr)
-        
-        if not condition_reg:
-            return None
-        
-        else_label = self.new_label("else")
-        end_label = self.new_label("endif")
-        
-        # Jump to else if condition is false
-        self.emit(f"jz {condition_reg}, {else_label}")
+        if self.jumping_code:
+            else_label = self.new_label("else")
+            end_label = self.new_label("endif")
+            self.emit_branch(node.expr, else_label, False)
+        else:
+            condition_reg = self.visit(node.expr)
+            
+            if not condition_reg:
+                return None
+            
+            else_label = self.new_label("else")
+            end_label = self.new_label("endif")
+            
+            # Jump to else if condition is false
+            self.emit(Instr(Opcode.JZ, args=[condition_reg], target=else_label))
         
         # Generate if body
         self.visit(node.stmt)
         
         # Jump to end
-        self.emit(f"jmp {end_label}")
+        self.emit(Instr(Opcode.JMP, target=end_label))
         
         # Else label
-        self.emit(f"{else_label}:")
+        self.emit(Label(else_label))
         
         # Generate else body if exists
         if hasattr(node, 'else_choice') and node.else_choice:
             self.visit(node.else_choice)
         
         # End label
-        self.emit(f"{end_label}:")
+        self.emit(Label(end_label))
         
         return None
     
@@ -459,21 +574,24 @@ class CodeGenerator(Visitor):
         end_label = self.new_label("endwhile")
         
         # Loop label
-        self.emit(f"{loop_label}:")
+        self.emit(Label(loop_label))
         
-        # Check condition
-        condition_reg = self.visit(node.expr)
-        if condition_reg:
-            self.emit(f"jz {condition_reg}, {end_label}")
+        # Check condition; a constant one (always true here) needs no test
+        if self.jumping_code:
+            self.emit_branch(node.expr, end_label, False)
+        elif constant_value(node.expr) is None:
+            condition_reg = self.visit(node.expr)
+            if condition_reg:
+                self.emit(Instr(Opcode.JZ, args=[condition_reg], target=end_label))
         
         # Generate body
         self.visit(node.stmt)
         
         # Jump back to loop
-        self.emit(f"jmp {loop_label}")
+        self.emit(Instr(Opcode.JMP, target=loop_label))
         
         # End label
-        self.emit(f"{end_label}:")
+        self.emit(Label(end_label))
         
         return None
     
@@ -482,11 +600,12 @@ class CodeGenerator(Visitor):
         loop_var = node.iden
         loop_var_reg = self.new_register()
         self.local_vars[loop_var] = loop_var_reg
+        self.bind(node, loop_var_reg)
         
         # Initialize loop variable
         start_reg = self.visit(node.expr1)
         if start_reg:
-            self.emit(f"mov {loop_var_reg}, {start_reg}")
+            self.emit(Instr(Opcode.MOV, loop_var_reg, [start_reg]))
         
         # Generate end value
         end_reg = self.visit(node.expr2)
@@ -495,25 +614,25 @@ class CodeGenerator(Visitor):
         end_label = self.new_label("endfor")
         
         # Loop label
-        self.emit(f"{loop_label}:")
+        self.emit(Label(loop_label))
         
         # Check condition (loop_var < end_value)
         if end_reg:
             condition_reg = self.new_register()
-            self.emit(f"lt {condition_reg}, {loop_var_reg}, {end_reg}")
-            self.emit(f"jz {condition_reg}, {end_label}")
+            self.emit(Instr(Opcode.LT, condition_reg, [loop_var_reg, end_reg]))
+            self.emit(Instr(Opcode.JZ, args=[condition_reg], target=end_label))
         
         # Generate body
         self.visit(node.stmt)
         
         # Increment loop variable
-        self.emit(f"add {loop_var_reg}, {loop_var_reg}, 1")
+        self.emit(Instr(Opcode.ADD, loop_var_reg, [loop_var_reg, 1]))
         
         # Jump back to loop
-        self.emit(f"jmp {loop_label}")
+        self.emit(Instr(Opcode.JMP, target=loop_label))
         
         # End label
-        self.emit(f"{end_label}:")
+        self.emit(Label(end_label))
         
         return None
     
@@ -525,20 +644,193 @@ class CodeGenerator(Visitor):
         """Visit print statement"""
         expr_reg = self.visit(node.expr)
         if expr_reg:
-            self.emit(f"call iput, {expr_reg}")
+            self.emit_print(node.expr, expr_reg)
         return None
     
-    def generate_code(self, ast_root):
-        """Main code generation method"""
-        self.visit(ast_root)
+    def generate_code(self, ast_root, sink=None):
+        """Main code generation method
+
+        Every pass works on one proc at a time, so each function is
+        generated and optimised before the next one starts. Without a sink
+        the procs are collected in self.code, which is returned. With one
+        (see IR/sink.py) each proc goes to the sink as soon as it is done
+        and self.code is left empty: besides the function at hand only the
+        bodies inlining may still copy are held. With inlining on, functions
+        are generated callees first, in call-graph order, so a callee is
+        finished before its callers look at it, and procs come out in that
+        order.
+        """
+        if not getattr(ast_root, 'resolved', False):
+            Resolver().resolve(ast_root)
+        self.types = getattr(ast_root, 'types', None)
+        functions = self.functions_of(ast_root)
+        names = [func.iden for func in functions]
+        manager = PassManager(verify=self.verify, procs=names)
+        if self.constant_folding:
+            folded = manager.time_step('folding', fold_constants, ast_root, self.types)
+            copies = dict(zip(program_functions(ast_root), program_functions(folded)))
+            functions = [copies[func] for func in functions]
+            ast_root, self.types = folded, getattr(folded, 'types', None)
+        if self.inlining:
+            graph = call_graph(ast_root)
+            order = {name: i for i, name in enumerate(name for component in graph.sccs()
+                                                      for name in component)}
+            functions = sorted(functions, key=lambda func: order[func.iden])
+            self.recursive = {name for component in graph.sccs() if len(component) > 1
+                              for name in component}
+        self.add_passes(manager)
+
+        program = []
+        called = set()      # procs the code handed on so far calls
+        deferred = {}       # proc name -> code held back until it is known to be called
+        defer = self.inlining and self.prune_unreachable and 'main' in names
+        for func in functions:
+            code = manager.run_pass('codegen', partial(self.emit_node, func), [])
+            code = manager.run(code)
+            if defer and func.iden != 'main' and self.inliner.callees.get(func.iden) is not None:
+                # Its callers may yet inline every call to it
+                deferred[func.iden] = code
+                continue
+            called.update(proc_calls(code))
+            self.hand_on(code, program, sink)
+        while called & deferred.keys():
+            for name in sorted(called & deferred.keys(), key=names.index):
+                code = deferred.pop(name)
+                called.update(proc_calls(code))
+                self.hand_on(code, program, sink)
+        self.code = program
+        self.pass_report = manager.stats
         return self.code
+
+    @staticmethod
+    def hand_on(code, program, sink):
+        if sink is None:
+            program.extend(code)
+        else:
+            sink.write(code)
+
+    def emit_node(self, node, items):
+        """Generate the code of node after items; returns it"""
+        self.code = items
+        self.visit(node)
+        return self.code
+
+    def functions_of(self, node):
+        """The functions of a program that get code, in order"""
+        functions = program_functions(node)
+        if self.prune_unreachable:
+            live = call_graph(node).reachable()
+            functions = [func for func in functions if func.iden in live]
+        return functions
+
+    def add_passes(self, manager):
+        """Add the passes the flags ask for to manager, each with a fresh pass object"""
+        self.register_report = []
+        if self.tail_calls:
+            self.eliminator = TailCallEliminator()
+            manager.add('tail-calls', self.eliminate_tail_calls)
+        if self.inlining:
+            self.inliner = Inliner()
+            manager.add('inlining', self.inline_calls)
+        if self.ssa:
+            self.optimizer = SSAOptimizer(loops=self.loop_optimization, cse=self.cse)
+            manager.add('ssa', self.optimize_ssa)
+        if self.instruction_selection:
+            self.selector = InstructionSelector()
+            manager.add('selection', self.select_instructions)
+        if self.peephole.passes:
+            manager.add('peephole', self.optimize_peephole)
+        if self.register_allocation:
+            manager.add('regalloc', self.allocate_registers)
+
+    def eliminate_tail_calls(self, items):
+        eliminator = self.eliminator
+        items = eliminator.eliminate(items)
+        self.tail_call_report = {
+            'before': eliminator.before,
+            'after': eliminator.after,
+            'eliminated': eliminator.eliminated,
+        }
+        return items
+
+    def inline_calls(self, items):
+        inliner = self.inliner
+        procs = split_procs(items)
+        for proc, body in procs:
+            if proc is not None:
+                inliner.inline_proc(proc, body)
+                inliner.keep(proc, body, recursive=proc.name in self.recursive)
+        items = join_procs(procs)
+        self.inline_report = {
+            'before': inliner.before,
+            'after': inliner.after,
+            'inlined': inliner.inlined,
+        }
+        return items
+
+    def optimize_ssa(self, items):
+        optimizer = self.optimizer
+        items = optimizer.optimize(items)
+        self.ssa_report = {
+            'before': optimizer.before,
+            'after': optimizer.after,
+            'dead': optimizer.removed,
+            'copies': optimizer.copies,
+            'reused': optimizer.reused,
+            'hoisted': optimizer.hoisted,
+            'reduced': optimizer.reduced,
+        }
+        return items
+
+    def select_instructions(self, items):
+        selector = self.selector
+        items = selector.select(items)
+        self.selection_report = {
+            'before': selector.before,
+            'after': selector.after,
+            'immediates': selector.immediates,
+            'folded': selector.folded,
+            'branches': selector.branches,
+        }
+        return items
+
+    def optimize_peephole(self, items):
+        items = self.peephole.optimize(items)
+        self.peephole_report = {
+            'before': self.peephole.before,
+            'after': self.peephole.after,
+            **self.peephole.counts,
+        }
+        return items
+
+    def allocate_registers(self, items):
+        items, report = allocate_registers(items)
+        self.register_report.extend(report)
+        return items
     
     def get_code_string(self):
-        """Get generated code as string"""
-        return '\n'.join(self.code)
+        """Get generated code as tsvm text"""
+        return format_program(self.code)
     
     def print_code(self):
         """Print generated code"""
-        for line in self.code:
+        for line in format_lines(self.code):
             print(line)
+    
+    def print_peephole_report(self):
+        """Print instruction counts before and after the peephole passes"""
+        if self.peephole_report:
+            report = self.peephole_report
+            passes = ", ".join(f"{name} {report[name]}" for name in PEEPHOLE_PASSES)
+            print(f"instructions: {report['before']} -> {report['after']} ({passes})")
+    
+    def print_pass_report(self):
+        """Print the time and instruction counts of each pass"""
+        for line in format_pass_report(self.pass_report):
+            print(line)
+
+    def print_register_report(self):
+        """Print registers per function before and after allocation"""
+        for name, before, after in self.register_report:
+            print(f"{name}: {before} -> {after} registers")
 
@@ -0,0 +1,175 @@
+from IR.ir import (Opcode, Instr, Label, Comment, JUMP_OPS, RETURN_REGISTER,
+                   register_index, split_procs, join_procs, count_instructions)
+from IR.cfg import CFG
+from IR.isel import reg_is_read
+from SemanticAnalyzer.callgraph import CallGraph
+
+# Largest callee, in instructions, inlined at a call outside any loop;
+# calls inside loops run often enough to take twice that
+INLINE_LIMIT = 10
+
+
+def proc_calls(items):
+    """Names the instructions in items call"""
+    return {item.target for item in items if item.__class__ is Instr and item.op == Opcode.CALL}
+
+
+def call_graph_of(procs):
+    """CallGraph over (Proc, body) pairs, with the Procs as definitions"""
+    graph = CallGraph()
+    for proc, body in procs:
+        if proc is not None:
+            graph.add_calls(proc.name, [item.target for item in body
+                                        if item.__class__ is Instr and item.op == Opcode.CALL],
+                            proc)
+    return graph
+
+
+class Inliner:
+    """Replaces calls to small procs by a copy of their body
+
+    Procs are handled callees first, so a callee has already had its own
+    calls inlined when its size is judged. inline() does that for a whole
+    program; a caller that produces procs one at a time in that order
+    calls inline_proc() on each and then keep(), which holds on to a copy
+    of the procs small enough to be inlined later and nothing else.
+
+    A call is inlined when the callee has at most limit instructions
+    (twice that for a call inside a loop), is defined once, takes as many
+    arguments as the call passes and cannot reach itself through the call
+    graph. The copy gets fresh registers above the caller's and its
+    labels a suffix of their own: arguments are moved into the copies of
+    r1..rk, and each `ret` jumps to the end of the copy, where the copy of
+    r0 is moved into the call's destination. The SSA passes later remove
+    most of those moves. A call gets a fresh tsvm frame with every
+    register 0, so the copies of the callee's locals that may be read
+    before they are set are zeroed first; otherwise a call in a loop
+    would see the last round's values.
+
+    With prune set, inline() drops the procs main no longer reaches
+    afterwards. inlined counts the call sites replaced; before and after
+    are instruction counts of the procs seen.
+    """
+
+    def __init__(self, limit=INLINE_LIMIT, prune=False):
+        self.limit = limit
+        self.prune = prune
+        self.inlined = 0
+        self.callees = {}  # proc name -> (Proc, body) it can be inlined from, None if it cannot
+        self.unset = {}    # proc name -> registers it may read before setting them
+        self.before = 0
+        self.after = 0
+
+    def inline(self, items):
+        """Inline calls in a list of IR items, in place; returns it"""
+        procs = split_procs(items)
+        graph = call_graph_of(procs)
+        names = [proc.name for proc, _ in procs if proc is not None]
+        defined = {proc.name: (proc, body) for proc, body in procs
+                   if proc is not None and names.count(proc.name) == 1}
+        for component in graph.sccs():
+            for name in component:
+                if name in defined:
+                    self.inline_proc(*defined[name])
+                    self.keep(*defined[name], recursive=len(component) > 1)
+        if self.prune:
+            live = call_graph_of(procs).reachable()
+            procs = [(proc, body) for proc, body in procs if proc is None or proc.name in live]
+        items[:] = join_procs(procs)
+        return items
+
+    def keep(self, proc, body, recursive=False):
+        """Offer a finished proc for inlining into the procs handled after it
+
+        recursive says whether the proc is part of a cycle of calls with
+        other procs; a call to itself in body is found here. A proc offered
+        twice is never inlined.
+        """
+        if proc.name in self.callees or recursive \
+                or count_instructions(body) > 2 * self.limit \
+                or any(item.__class__ is Instr and item.op == Opcode.CALL
+                       and item.target == proc.name for item in body):
+            self.callees[proc.name] = None
+            return
+        # Later passes rewrite body in place; the copy keeps what was inlinable
+        self.callees[proc.name] = (proc, [Instr(item.op, item.dest, item.args, item.target)
+                                          if item.__class__ is Instr else item
+                                          for item in body])
+
+    def inline_proc(self, proc, body):
+        """Inline the calls in one proc's body to the procs kept so far, in place"""
+        self.before += count_instructions(body)
+        cfg = CFG.build(proc, body)
+        depth = {}
+        for block in cfg.blocks:
+            block_depth = cfg.loop_depth(block)
+            for instr in block.instrs:
+                depth[instr] = block_depth
+        self.next_register = 1 + max(
+            [register_index(reg) for reg in proc.param_registers()]
+            + [register_index(reg) for item in body if item.__class__ is Instr
+               for reg in item.defs() + item.uses()],
+            default=0)
+        inlined = []
+        for item in body:
+            callee = self.callees.get(item.target) if item.__class__ is Instr \
+                and item.op == Opcode.CALL else None
+            if callee is not None and item.dest is not None and item.target != proc.name \
+                    and len(item.args) == len(callee[0].params) \
+                    and count_instructions(callee[1]) <= self.limit * (2 if depth[item] else 1):
+                inlined.extend(self.expand(item, *callee))
+                continue
+            inlined.append(item)
+        body[:] = inlined
+        self.after += count_instructions(body)
+
+    def fresh(self):
+        reg = f"r{self.next_register}"
+        self.next_register += 1
+        return reg
+
+    def read_before_set(self, proc, body):
+        """Registers of proc other than its parameters and r0 that may be read before they are set"""
+        if proc.name not in self.unset:
+            entry = CFG.build(proc, body).entry
+            candidates = {reg for item in body if item.__class__ is Instr for reg in item.uses()}
+            candidates -= set(proc.param_registers()) | {RETURN_REGISTER}
+            self.unset[proc.name] = sorted((reg for reg in candidates if reg_is_read(entry, reg)),
+                                           key=register_index)
+        return self.unset[proc.name]
+
+    def expand(self, call, callee, callee_body):
+        """Items that do what call does, with callee's body copied in"""
+        self.inlined += 1
+        suffix = f"_{self.inlined}"
+        end_label = f"inline_end{self.inlined}"
+        registers = {}
+        for item in callee_body:
+            if item.__class__ is Instr:
+                for reg in item.defs() + item.uses():
+                    if reg not in registers:
+                        registers[reg] = self.fresh()
+        for reg in callee.param_registers() + [RETURN_REGISTER]:
+            if reg not in registers:
+                registers[reg] = self.fresh()
+
+        items = [Comment(f"inlined {callee.name}")]
+        for param, arg in zip(callee.param_registers(), call.args):
+            items.append(Instr(Opcode.MOV, registers[param], [arg]))
+        for reg in self.read_before_set(callee, callee_body):
+            items.append(Instr(Opcode.MOV, registers[reg], [0]))
+        for item in callee_body:
+            if item.__class__ is Label:
+                items.append(Label(item.name + suffix))
+            elif item.__class__ is Comment:
+                items.append(Comment(item.text))
+            elif item.op == Opcode.RET:
+                items.append(Instr(Opcode.JMP, target=end_label))
+            else:
+                copy = Instr(item.op, item.dest, item.args,
+                             item.target + suffix if item.op in JUMP_OPS else item.target)
+                copy.rename(registers)
+                items.append(copy)
+        items.append(Label(end_label))
+        items.append(Instr(Opcode.MOV, call.dest, [registers[RETURN_REGISTER]]))
+        return items
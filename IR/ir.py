@@ -0,0 +1,154 @@
+class Opcode:
+    """tsvm opcodes
+
+    Plain string constants rather than an Enum, as with Type: comparing
+    them is cheap and the value is what the printer writes. LOAD and STORE are
+    tsvm's `mov` with a `[base + index]` operand on the right or left.
+    """
+    MOV = 'mov'
+    LOAD = 'load'
+    STORE = 'store'
+    ADD = 'add'
+    SUB = 'sub'
+    MUL = 'mul'
+    DIV = 'div'
+    MOD = 'mod'
+    LT = 'lt'
+    GT = 'gt'
+    LE = 'le'
+    GE = 'ge'
+    EQ = 'eq'
+    NE = 'ne'
+    NEG = 'neg'
+    NOT = 'not'
+    LEN = 'len'
+    JMP = 'jmp'
+    JZ = 'jz'
+    JNZ = 'jnz'
+    CALL = 'call'
+    RET = 'ret'
+    PHI = 'phi'    # only while a proc is in SSA form, never printed for tsvm
+
+
+BINARY_OPS = frozenset({
+    Opcode.ADD, Opcode.SUB, Opcode.MUL, Opcode.DIV, Opcode.MOD,
+    Opcode.LT, Opcode.GT, Opcode.LE, Opcode.GE, Opcode.EQ, Opcode.NE,
+})
+UNARY_OPS = frozenset({Opcode.NEG, Opcode.NOT, Opcode.LEN})
+JUMP_OPS = frozenset({Opcode.JMP, Opcode.JZ, Opcode.JNZ})
+# Instructions control never falls through
+TERMINATORS = frozenset({Opcode.JMP, Opcode.RET})
+
+RETURN_REGISTER = 'r0'
+
+
+def is_register(operand):
+    """Registers are strings 'r<n>'; immediates are ints, string literals start with a quote"""
+    return operand.__class__ is str and operand[:1] == 'r'
+
+
+def register_index(register):
+    return int(register[1:])
+
+
+class Instr:
+    """One three-address instruction
+
+    dest is the register written (None if nothing is), args the operands
+    read, in tsvm order, and target the label of a jump or the name a call
+    goes to. STORE has no dest: its args are (base, index, value).
+    """
+    __slots__ = ('op', 'dest', 'args', 'target')
+
+    def __init__(self, op, dest=None, args=(), target=None):
+        self.op = op
+        self.dest = dest
+        self.args = tuple(args)
+        self.target = target
+
+    def defs(self):
+        """Registers written"""
+        return (self.dest,) if self.dest is not None else ()
+
+    def uses(self):
+        """Registers read"""
+        if self.op == Opcode.RET:
+            return (RETURN_REGISTER,)
+        return tuple(arg for arg in self.args if is_register(arg))
+
+    def rename(self, mapping):
+        """Replace registers through mapping, in place"""
+        if self.dest is not None:
+            self.dest = mapping.get(self.dest, self.dest)
+        self.args = tuple(mapping.get(arg, arg) if is_register(arg) else arg for arg in self.args)
+
+    def __repr__(self):
+        return f"Instr({self.op!r}, dest={self.dest!r}, args={self.args!r}, target={self.target!r})"
+
+
+class Label:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Label({self.name!r})"
+
+
+class Comment:
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return f"Comment({self.text!r})"
+
+
+class Proc:
+    """Start of a procedure; params are (name, register) pairs"""
+    __slots__ = ('name', 'params')
+
+    def __init__(self, name, params=()):
+        self.name = name
+        self.params = list(params)
+
+    def param_registers(self):
+        return [reg for _, reg in self.params]
+
+    def __repr__(self):
+        return f"Proc({self.name!r}, params={self.params!r})"
+
+
+def split_procs(items):
+    """Split IR into (Proc, items after it) per procedure
+
+    Items before the first Proc come back with proc None.
+    """
+    procs = []
+    proc, body = None, []
+    for item in items:
+        if item.__class__ is Proc:
+            if proc is not None or body:
+                procs.append((proc, body))
+            proc, body = item, []
+        else:
+            body.append(item)
+    if proc is not None or body:
+        procs.append((proc, body))
+    return procs
+
+
+def join_procs(procs):
+    """Inverse of split_procs"""
+    items = []
+    for proc, body in procs:
+        if proc is not None:
+            items.append(proc)
+        items.extend(body)
+    return items
+
+
+def count_instructions(items):
+    return sum(1 for item in items if item.__class__ is Instr)
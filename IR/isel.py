@@ -0,0 +1,235 @@
+from IR.ir import (Opcode, Instr, RETURN_REGISTER, is_register,
+                   split_procs, join_procs, count_instructions)
+from IR.cfg import CFG
+from IR.constfold import c_div, c_mod
+
+# tsvm registers are C longs
+_MIN_INT = -(1 << 63)
+_MAX_INT = (1 << 63) - 1
+
+
+class Form:
+    """What tsvm accepts for one opcode
+
+    immediates are the positions in an instruction's args that may hold an
+    integer instead of a register. commuted is the opcode that gives the
+    same result with the two operands swapped (None if there is none),
+    evaluate computes the result from integer operands, and identity is
+    the right operand that leaves the left one unchanged.
+    """
+    __slots__ = ('immediates', 'commuted', 'evaluate', 'identity')
+
+    def __init__(self, immediates=(), commuted=None, evaluate=None, identity=None):
+        self.immediates = frozenset(immediates)
+        self.commuted = commuted
+        self.evaluate = evaluate
+        self.identity = identity
+
+
+# Describing a new tsvm opcode here is all instruction selection needs to
+# know about it. Like `add r, r, 1`, only the right operand of an ALU
+# instruction can be an immediate.
+TSVM_FORMS = {
+    Opcode.MOV: Form(immediates=(0,), evaluate=lambda a: a),
+    Opcode.ADD: Form(immediates=(1,), commuted=Opcode.ADD, evaluate=lambda a, b: a + b, identity=0),
+    Opcode.SUB: Form(immediates=(1,), evaluate=lambda a, b: a - b, identity=0),
+    Opcode.MUL: Form(immediates=(1,), commuted=Opcode.MUL, evaluate=lambda a, b: a * b, identity=1),
+    Opcode.DIV: Form(immediates=(1,), evaluate=c_div, identity=1),
+    Opcode.MOD: Form(immediates=(1,), evaluate=c_mod),
+    Opcode.LT: Form(immediates=(1,), commuted=Opcode.GT, evaluate=lambda a, b: int(a < b)),
+    Opcode.GT: Form(immediates=(1,), commuted=Opcode.LT, evaluate=lambda a, b: int(a > b)),
+    Opcode.LE: Form(immediates=(1,), commuted=Opcode.GE, evaluate=lambda a, b: int(a <= b)),
+    Opcode.GE: Form(immediates=(1,), commuted=Opcode.LE, evaluate=lambda a, b: int(a >= b)),
+    Opcode.EQ: Form(immediates=(1,), commuted=Opcode.EQ, evaluate=lambda a, b: int(a == b)),
+    Opcode.NE: Form(immediates=(1,), commuted=Opcode.NE, evaluate=lambda a, b: int(a != b)),
+    Opcode.NEG: Form(evaluate=lambda a: -a),
+    Opcode.NOT: Form(evaluate=lambda a: int(not a)),
+}
+
+# `eq t, x, 0`, `ne t, x, 0` or `not t, x` right before a jump on t is a
+# jump on x itself: (op, jump) -> the jump to use on x
+ZERO_TESTS = {
+    (Opcode.EQ, Opcode.JZ): Opcode.JNZ,
+    (Opcode.EQ, Opcode.JNZ): Opcode.JZ,
+    (Opcode.NE, Opcode.JZ): Opcode.JZ,
+    (Opcode.NE, Opcode.JNZ): Opcode.JNZ,
+    (Opcode.NOT, Opcode.JZ): Opcode.JNZ,
+    (Opcode.NOT, Opcode.JNZ): Opcode.JZ,
+}
+
+
+class InstructionSelector:
+    """Picks tsvm instruction forms for a program's IR, one proc at a time
+
+    The code generator loads every literal into a register of its own.
+    Where a register is only ever set by `mov r, N` and that definition
+    dominates a use, the use gets N as an immediate if the opcode's Form
+    allows it there, swapping the operands of a commutable opcode when
+    that makes it fit. Instructions whose operands are all known are
+    evaluated (never dividing by zero or leaving the range of a long),
+    `add x, y, 0` and the like become moves, and compares with zero that
+    only feed a jump become a jz/jnz on the compared register. Literal
+    moves nothing reads any more are dropped.
+
+    immediates, folded and branches count what was rewritten; before and
+    after are instruction counts of the whole program.
+    """
+
+    def __init__(self, forms=TSVM_FORMS, zero_tests=ZERO_TESTS):
+        self.forms = forms
+        self.zero_tests = zero_tests
+        self.immediates = 0
+        self.folded = 0
+        self.branches = 0
+        self.before = 0
+        self.after = 0
+
+    def select(self, items):
+        """Rewrite a list of IR items in place; returns it"""
+        self.before += count_instructions(items)
+        procs = split_procs(items)
+        for i, (proc, body) in enumerate(procs):
+            if proc is not None:
+                procs[i] = (proc, self.select_proc(proc, body))
+        items[:] = join_procs(procs)
+        self.after += count_instructions(items)
+        return items
+
+    def select_proc(self, proc, body):
+        cfg = CFG.build(proc, body)
+        writes = {}
+        for block in cfg.blocks:
+            for instr in block.instrs:
+                for reg in instr.defs():
+                    writes[reg] = writes.get(reg, 0) + 1
+        fixed = set(proc.param_registers()) | {RETURN_REGISTER}
+        single = {reg for reg, count in writes.items() if count == 1 and reg not in fixed}
+
+        constants = {}    # register -> (value, block that sets it)
+        for block in cfg.reverse_postorder():
+            known = {}    # constants set earlier in this block
+            for instr in block.instrs:
+                self.rewrite(instr, cfg, block, constants, known)
+                if instr.dest in single and instr.op == Opcode.MOV \
+                        and instr.args[0].__class__ is int:
+                    known[instr.dest] = instr.args[0]
+            constants.update((reg, (value, block)) for reg, value in known.items())
+        for block in cfg.blocks:
+            self.select_branch(block)
+
+        reads = {}
+        for block in cfg.blocks:
+            for instr in block.instrs:
+                for reg in instr.uses():
+                    reads[reg] = reads.get(reg, 0) + 1
+        for block in cfg.blocks:
+            block.items = [item for item in block.items
+                           if not (item.__class__ is Instr and item.op == Opcode.MOV
+                                   and item.dest in constants and item.dest not in reads)]
+        return cfg.to_items()
+
+    def rewrite(self, instr, cfg, block, constants, known):
+        form = self.forms.get(instr.op)
+        if form is None:
+            return
+
+        def value(operand):
+            if not is_register(operand):
+                return operand
+            if operand in known:
+                return known[operand]
+            constant = constants.get(operand)
+            if constant is not None and cfg.dominates(constant[1], block):
+                return constant[0]
+            return None
+
+        values = [value(arg) for arg in instr.args]
+        if instr.dest is not None and form.evaluate is not None and None not in values \
+                and all(v.__class__ is int for v in values):
+            result = self.evaluate(form, values)
+            if result is not None:
+                if instr.op != Opcode.MOV or instr.args[0] != result:
+                    self.folded += 1
+                instr.op, instr.args = Opcode.MOV, (result,)
+                return
+
+        args = list(instr.args)
+        if len(args) == 2 and values[0].__class__ is int and is_register(args[1]) \
+                and values[1] is None and form.commuted is not None \
+                and 1 in self.forms[form.commuted].immediates:
+            instr.op = form.commuted
+            args = [args[1], args[0]]
+            values = [values[1], values[0]]
+            form = self.forms[instr.op]
+        for position, v in enumerate(values):
+            if v.__class__ is int and is_register(args[position]) and position in form.immediates:
+                args[position] = v
+                self.immediates += 1
+        instr.args = tuple(args)
+
+        if len(args) == 2 and form.identity is not None and args[1] == form.identity \
+                and args[1].__class__ is int:
+            instr.op, instr.args = Opcode.MOV, (args[0],)
+            self.folded += 1
+
+    @staticmethod
+    def evaluate(form, values):
+        """Result of an instruction on known operands, None if tsvm must compute it"""
+        if len(values) == 2 and values[1] == 0 and form.evaluate in (c_div, c_mod):
+            return None
+        result = form.evaluate(*values)
+        return result if _MIN_INT <= result <= _MAX_INT else None
+
+    def select_branch(self, block):
+        jump = block.terminator
+        if jump is None or jump.op not in (Opcode.JZ, Opcode.JNZ):
+            return
+        instrs = block.instrs
+        if len(instrs) < 2:
+            return
+        test = instrs[-2]
+        new = self.zero_tests.get((test.op, jump.op))
+        if new is None or test.dest != jump.args[0] or not is_register(test.args[0]):
+            return
+        if test.op != Opcode.NOT and test.args[1:] != (0,):
+            return
+        if self.read_elsewhere(block, test.dest, jump):
+            return
+        jump.op, jump.args = new, (test.args[0],)
+        block.items = [item for item in block.items if item is not test]
+        self.branches += 1
+
+    @staticmethod
+    def read_elsewhere(block, reg, jump):
+        """Whether reg is live after the jump or read anywhere else in the block"""
+        for instr in block.instrs:
+            if instr is not jump and reg in instr.uses():
+                return True
+        return any(reg_is_read(succ, reg) for succ in block.succs)
+
+
+def reg_is_read(start, reg):
+    """Whether reg may be read, starting at block start, before it is written"""
+    seen = set()
+    stack = [start]
+    while stack:
+        block = stack.pop()
+        if block in seen:
+            continue
+        seen.add(block)
+        written = False
+        for instr in block.instrs:
+            if reg in instr.uses():
+                return True
+            if reg in instr.defs():
+                written = True
+                break
+        if not written:
+            stack.extend(block.succs)
+    return False
+
+
+def select_instructions(items):
+    """(rewritten items, selector) for a list of IR items"""
+    selector = InstructionSelector()
+    return selector.select(items), selector
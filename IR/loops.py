@@ -0,0 +1,218 @@
+from IR.ir import Opcode, Instr, RETURN_REGISTER, is_register
+
+# Instructions that only compute their destination from their operands and
+# cannot stop the VM, so running them once before the loop, even when the
+# loop body would not have run at all, changes nothing else. A vector's
+# length is fixed when it is allocated, so len belongs here too.
+_HOISTABLE_OPS = frozenset({
+    Opcode.MOV, Opcode.ADD, Opcode.SUB, Opcode.MUL,
+    Opcode.LT, Opcode.GT, Opcode.LE, Opcode.GE, Opcode.EQ, Opcode.NE,
+    Opcode.NEG, Opcode.NOT, Opcode.LEN,
+})
+
+
+class LoopOptimizer:
+    """Loop-invariant code motion and strength reduction on a proc in SSA form
+
+    Loops are handled innermost first, each getting a preheader: a block of
+    its own that every entry into the loop passes through. An instruction
+    in the loop whose operands are all defined outside it (or are
+    immediates) is moved to the end of the preheader, so literals, index
+    arithmetic and `len` of a vector the loop does not reassign are
+    computed once. Registers phis merge stay where they are; moving their
+    definitions would make versions of one variable overlap.
+
+    A basic induction variable is a header phi i = phi(i0, i') with
+    i' = i + c (or i - c) for an invariant c, like the counter of a `for`.
+    Each `t = i * k` with k invariant that runs on every iteration is
+    replaced by a new induction variable j = phi(i0 * k, j') with
+    j' = j + c * k updated next to i', so the multiplication goes and an
+    addition takes its place. tsvm counts every instruction the same, so
+    on the VM this is only a saving when c * k and i0 * k fold or hoist;
+    it keeps `A[i * k]` style indexing from multiplying on machines where
+    mul costs more.
+    """
+
+    def __init__(self, ssa):
+        self.ssa = ssa
+        self.cfg = ssa.cfg
+        self.hoisted = 0
+        self.reduced = 0
+
+    def optimize(self):
+        """Run both transformations on every loop; returns how many instructions changed"""
+        loops = list(reversed(self.cfg.loops))  # children before their parents
+        if not loops:
+            return 0
+        self.definitions = {}
+        self.moves = {}
+        for block in self.cfg.blocks:
+            for instr in block.instrs:
+                if instr.dest is not None:
+                    self.definitions[instr.dest] = block
+                    if instr.op == Opcode.MOV:
+                        self.moves[instr.dest] = instr.args[0]
+        for loop in loops:
+            preheader = self.preheader(loop)
+            if preheader is None:
+                continue
+            self.hoist(loop, preheader)
+            self.reduce(loop, preheader)
+        return self.hoisted + self.reduced
+
+    def preheader(self, loop):
+        """The block just outside loop that leads into its header, made if there is none"""
+        header = loop.header
+        outside = [pred for pred in header.preds if pred not in loop.blocks]
+        if not outside:
+            return None
+        if len(outside) == 1 and outside[0].succs == [header]:
+            return outside[0]
+        positions = [header.preds.index(pred) for pred in outside]
+        preheader = self.cfg.insert_before(header, outside)
+        for phi in header.phis:
+            incoming = [phi.args[i] for i in positions]
+            rest = [arg for i, arg in enumerate(phi.args) if i not in positions]
+            if len(set(incoming)) == 1:
+                value = incoming[0]
+            else:
+                value = self.ssa.fresh()
+                preheader.items.append(Instr(Opcode.PHI, value, incoming))
+                self.definitions[value] = preheader
+            phi.args = tuple([value] + rest)
+        parent = loop.parent
+        while parent is not None:
+            parent.blocks.add(preheader)
+            parent = parent.parent
+        return preheader
+
+    def invariant(self, loop, operand):
+        if not is_register(operand):
+            return True
+        if operand == RETURN_REGISTER:
+            return False
+        return self.definitions.get(operand) not in loop.blocks
+
+    def hoist(self, loop, preheader):
+        merged = self.ssa.phi_registers()
+        for block in self.cfg.reverse_postorder():
+            if block not in loop.blocks:
+                continue
+            kept = []
+            for item in block.items:
+                if item.__class__ is Instr and item.op in _HOISTABLE_OPS \
+                        and item.dest != RETURN_REGISTER and item.dest not in merged \
+                        and all(self.invariant(loop, arg) for arg in item.args):
+                    preheader.append(item)
+                    self.definitions[item.dest] = preheader
+                    self.hoisted += 1
+                    continue
+                kept.append(item)
+            block.items = kept
+
+    def induction_variables(self, loop, preheader):
+        """Basic induction variable -> (initial value, update instruction, op, step)"""
+        header = loop.header
+        variables = {}
+        for phi in header.phis:
+            initial = None
+            updates = set()
+            for pred, arg in zip(header.preds, phi.args):
+                if pred is preheader:
+                    initial = arg
+                else:
+                    updates.add(arg)
+            if initial is None or len(updates) != 1:
+                continue
+            update = updates.pop()
+            block = self.definitions.get(update)
+            if block not in loop.blocks:
+                continue
+            instr = next(instr for instr in block.instrs if instr.dest == update)
+            if instr.op == Opcode.ADD and phi.dest in instr.args:
+                step = instr.args[1] if instr.args[0] == phi.dest else instr.args[0]
+            elif instr.op == Opcode.SUB and instr.args[0] == phi.dest:
+                step = instr.args[1]
+            else:
+                continue
+            if step != phi.dest and self.invariant(loop, step):
+                variables[phi.dest] = (initial, instr, instr.op, step)
+        return variables
+
+    def reduce(self, loop, preheader):
+        variables = self.induction_variables(loop, preheader)
+        if not variables:
+            return
+        header = loop.header
+        merged = self.ssa.phi_registers()
+        every_iteration = [block for block in self.cfg.reverse_postorder() if block in loop.blocks
+                           and all(self.cfg.dominates(block, latch) for latch in loop.back_edges)]
+        reduced = {}   # (induction variable, factor) -> register holding their product
+        replaced = {}
+        for block in every_iteration:
+            kept = []
+            for item in block.items:
+                if item.__class__ is Instr and item.op == Opcode.MUL \
+                        and item.dest not in merged and item.dest != RETURN_REGISTER:
+                    a, b = item.args
+                    variable, factor = (a, b) if a in variables else (b, a)
+                    if variable in variables and self.invariant(loop, factor):
+                        key = (variable, factor)
+                        if key not in reduced:
+                            reduced[key] = self.new_variable(header, preheader,
+                                                             variables[variable], factor)
+                        replaced[item.dest] = reduced[key]
+                        self.reduced += 1
+                        continue
+                kept.append(item)
+            block.items = kept
+        if replaced:
+            for block in self.cfg.blocks:
+                for instr in block.instrs:
+                    instr.rename(replaced)
+
+    def known(self, operand):
+        """The integer a register is set to through `mov` alone, else the operand itself"""
+        value = operand
+        while is_register(value) and value in self.moves:
+            value = self.moves[value]
+        return value if value.__class__ is int else operand
+
+    def product(self, preheader, a, b, dest=None):
+        """a * b as an operand, with whatever it takes to compute it added to the preheader
+
+        With dest given the product always ends up in that register.
+        """
+        a, b = self.known(a), self.known(b)
+        if not is_register(a) and not is_register(b):
+            value = a * b
+        elif a == 0 or b == 0:
+            value = 0
+        elif a == 1 or b == 1:
+            value = b if a == 1 else a
+        else:
+            dest = dest or self.ssa.fresh()
+            # Immediates go last, as in `add r, r, 1`
+            preheader.append(Instr(Opcode.MUL, dest, (a, b) if is_register(a) else (b, a)))
+            return dest
+        if dest is None:
+            return value
+        preheader.append(Instr(Opcode.MOV, dest, (value,)))
+        return dest
+
+    def new_variable(self, header, preheader, variable, factor):
+        """j = phi(initial * factor, j + step * factor); returns j"""
+        initial, update, op, step = variable
+        start = self.product(preheader, initial, factor, self.ssa.fresh())
+        increment = self.product(preheader, step, factor)
+        current = self.ssa.fresh()
+        following = self.ssa.fresh()
+        header.items.insert(0, Instr(Opcode.PHI, current,
+                                     [start if pred is preheader else following
+                                      for pred in header.preds]))
+        block = self.definitions[update.dest]
+        block.items.insert(block.items.index(update) + 1,
+                           Instr(op, following, (current, increment)))
+        for reg, where in ((start, preheader), (current, header), (following, block)):
+            self.definitions[reg] = where
+        return current
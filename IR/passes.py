@@ -0,0 +1,110 @@
+import time
+
+from IR.ir import count_instructions
+from IR.peephole import PEEPHOLE_PASSES
+from IR.verify import IRError, verify
+
+# CodeGenerator keyword arguments for each -O level. Every level keeps
+# what the one below it does; 3 is what CodeGenerator() does by default.
+OPTIMIZATION_LEVELS = {
+    0: dict(constant_folding=False, jumping_code=False, tail_calls=False, inlining=False,
+            ssa=False, cse=False, loop_optimization=False, instruction_selection=False,
+            peephole=(), register_allocation=False),
+    1: dict(constant_folding=True, jumping_code=True, tail_calls=False, inlining=False,
+            ssa=False, cse=False, loop_optimization=False, instruction_selection=True,
+            peephole=PEEPHOLE_PASSES, register_allocation=True),
+    2: dict(constant_folding=True, jumping_code=True, tail_calls=True, inlining=False,
+            ssa=True, cse=True, loop_optimization=True, instruction_selection=True,
+            peephole=PEEPHOLE_PASSES, register_allocation=True),
+    3: dict(constant_folding=True, jumping_code=True, tail_calls=True, inlining=True,
+            ssa=True, cse=True, loop_optimization=True, instruction_selection=True,
+            peephole=PEEPHOLE_PASSES, register_allocation=True),
+}
+
+
+class PassStats:
+    """What one pass did: wall time in seconds and instructions before and after
+
+    before and after are None for a pass that works on the AST.
+    """
+    __slots__ = ('name', 'seconds', 'before', 'after')
+
+    def __init__(self, name, seconds, before=None, after=None):
+        self.name = name
+        self.seconds = seconds
+        self.before = before
+        self.after = after
+
+    def __repr__(self):
+        return f"PassStats({self.name!r}, {self.seconds:.6f}, {self.before!r}, {self.after!r})"
+
+
+class PassManager:
+    """Runs named passes over a program's IR and times each of them
+
+    A pass is a function from a list of IR items to the rewritten list.
+    stats holds a PassStats per pass, in the order they first ran; when
+    the passes run more than once, one proc at a time, each pass's time
+    and counts are summed. With verify set, the IR is checked
+    (IR/verify.py) after every pass, so an IRError names the pass that
+    broke it; procs names the procs calls may go to besides those in the
+    items checked.
+    """
+
+    def __init__(self, verify=False, procs=()):
+        self.verify = verify
+        self.procs = set(procs)
+        self.passes = []
+        self.stats = []
+        self.by_name = {}
+
+    def add(self, name, function):
+        self.passes.append((name, function))
+
+    def run(self, items):
+        """Run every pass added, in order; returns the final items"""
+        for name, function in self.passes:
+            items = self.run_pass(name, function, items)
+        return items
+
+    def run_pass(self, name, function, items):
+        before = count_instructions(items)
+        start = time.perf_counter()
+        items = function(items)
+        seconds = time.perf_counter() - start
+        self.record(name, seconds, before, count_instructions(items))
+        if self.verify:
+            try:
+                verify(items, self.procs)
+            except IRError as error:
+                raise IRError(f"after {name}: {error}") from error
+        return items
+
+    def time_step(self, name, function, *args):
+        """Run a step that does not work on IR items, recording only its time"""
+        start = time.perf_counter()
+        result = function(*args)
+        self.record(name, time.perf_counter() - start)
+        return result
+
+    def record(self, name, seconds, before=None, after=None):
+        stats = self.by_name.get(name)
+        if stats is None:
+            stats = self.by_name[name] = PassStats(name, seconds, before, after)
+            self.stats.append(stats)
+            return
+        stats.seconds += seconds
+        if before is not None:
+            stats.before += before
+            stats.after += after
+
+
+def format_pass_report(stats):
+    """Lines of a table of PassStats: pass, milliseconds, instructions before -> after"""
+    lines = []
+    for step in stats:
+        counts = "" if step.before is None else f"{step.before} -> {step.after}"
+        lines.append(f"{step.name:<12} {step.seconds * 1000:8.2f} ms  {counts}".rstrip())
+    total = sum(step.seconds for step in stats)
+    lines.append(f"{'total':<12} {total * 1000:8.2f} ms")
+    return lines
@@ -0,0 +1,146 @@
+from IR.ir import (Opcode, Instr, Label, JUMP_OPS, TERMINATORS, RETURN_REGISTER,
+                   is_register, split_procs, join_procs, count_instructions)
+
+PEEPHOLE_PASSES = ('threading', 'jumps', 'unreachable', 'moves')
+
+
+class Peephole:
+    """Local clean-ups over a program's IR, one proc at a time
+
+    Passes, each of which can be switched off by leaving it out of passes:
+
+    - threading: a jump to a label that is followed by `jmp M` goes to M
+    - jumps: a jump to the label right after it is dropped
+    - unreachable: code after `ret` or `jmp` up to the next label that is
+      still jumped to is dropped, along with labels nothing jumps to
+    - moves: `op rX, ...; mov rY, rX` becomes `op rY, ...` when that mov
+      is the only read of rX and the op its only write, and `mov rX, rX`
+      is dropped
+
+    The passes repeat until none of them changes anything. counts holds
+    how many instructions each pass removed or rewrote.
+    """
+
+    def __init__(self, passes=PEEPHOLE_PASSES):
+        unknown = set(passes) - set(PEEPHOLE_PASSES)
+        if unknown:
+            raise ValueError(f"unknown peephole passes: {', '.join(sorted(unknown))}")
+        self.passes = tuple(passes)
+        self.counts = dict.fromkeys(PEEPHOLE_PASSES, 0)
+        self.before = 0
+        self.after = 0
+
+    def optimize(self, items):
+        """Optimize a list of IR items in place; returns it"""
+        self.before += count_instructions(items)
+        procs = split_procs(items)
+        for proc, body in procs:
+            if proc is not None:
+                self.optimize_proc(body)
+        items[:] = join_procs(procs)
+        self.after += count_instructions(items)
+        return items
+
+    def optimize_proc(self, body):
+        changed = True
+        while changed:
+            changed = False
+            for name in self.passes:
+                body[:], done = getattr(self, 'pass_' + name)(body)
+                self.counts[name] += done
+                changed = changed or done > 0
+        return body
+
+    def pass_threading(self, items):
+        # label -> the first instruction after it
+        following = {}
+        pending = []
+        for item in items:
+            if item.__class__ is Label:
+                pending.append(item.name)
+            elif item.__class__ is Instr:
+                for label in pending:
+                    following[label] = item
+                pending = []
+        done = 0
+        for item in items:
+            if item.__class__ is Instr and item.op in JUMP_OPS:
+                target = item.target
+                seen = {target}
+                while True:
+                    nxt = following.get(target)
+                    if nxt is None or nxt.op != Opcode.JMP or nxt.target in seen:
+                        break
+                    target = nxt.target
+                    seen.add(target)
+                if target != item.target:
+                    item.target = target
+                    done += 1
+        return items, done
+
+    def pass_jumps(self, items):
+        done = 0
+        result = []
+        for i, item in enumerate(items):
+            if item.__class__ is Instr and item.op in JUMP_OPS:
+                # Only labels and comments between the jump and its target
+                j = i + 1
+                while j < len(items) and items[j].__class__ is not Instr:
+                    if items[j].__class__ is Label and items[j].name == item.target:
+                        break
+                    j += 1
+                if j < len(items) and items[j].__class__ is Label:
+                    done += 1
+                    continue
+            result.append(item)
+        return result, done
+
+    def pass_unreachable(self, items):
+        used = {item.target for item in items
+                if item.__class__ is Instr and item.op in JUMP_OPS}
+        done = 0
+        result = []
+        dead = False
+        for item in items:
+            if item.__class__ is Label:
+                if item.name not in used:
+                    continue
+                dead = False
+            elif item.__class__ is Instr:
+                if dead:
+                    done += 1
+                    continue
+                dead = item.op in TERMINATORS
+            result.append(item)
+        return result, done
+
+    def pass_moves(self, items):
+        writes = {}
+        reads = {}
+        for item in items:
+            if item.__class__ is Instr:
+                for reg in item.defs():
+                    writes[reg] = writes.get(reg, 0) + 1
+                for reg in item.uses():
+                    reads[reg] = reads.get(reg, 0) + 1
+        done = 0
+        result = []
+        for item in items:
+            if item.__class__ is Instr and item.op == Opcode.MOV:
+                source = item.args[0]
+                if source == item.dest:
+                    done += 1
+                    continue
+                if is_register(source) and source != RETURN_REGISTER \
+                        and writes.get(source) == 1 and reads.get(source) == 1:
+                    # The instruction writing source, if it comes right before
+                    last = len(result) - 1
+                    while last >= 0 and result[last].__class__ not in (Instr, Label):
+                        last -= 1
+                    if last >= 0 and result[last].__class__ is Instr and result[last].dest == source:
+                        result[last].dest = item.dest
+                        done += 1
+                        continue
+            result.append(item)
+        return result, done
+
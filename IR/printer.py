@@ -0,0 +1,46 @@
+from IR.ir import Opcode, Instr, Label, Comment, Proc
+
+
+def format_instr(instr):
+    """tsvm text of one instruction"""
+    op = instr.op
+    args = [str(arg) for arg in instr.args]
+    if op == Opcode.LOAD:
+        return f"mov {instr.dest}, [{args[0]} + {args[1]}]"
+    if op == Opcode.STORE:
+        return f"mov [{args[0]} + {args[1]}], {args[2]}"
+    if op == Opcode.CALL:
+        operands = [instr.target] + ([instr.dest] if instr.dest is not None else []) + args
+    elif op == Opcode.JMP:
+        operands = [instr.target]
+    elif op == Opcode.JZ or op == Opcode.JNZ:
+        operands = args + [instr.target]
+    else:
+        operands = ([instr.dest] if instr.dest is not None else []) + args
+    return f"{op} {', '.join(operands)}" if operands else op
+
+
+def format_item(item):
+    """tsvm text of one IR item"""
+    cls = item.__class__
+    if cls is Instr:
+        return format_instr(item)
+    if cls is Label:
+        return f"{item.name}:"
+    if cls is Comment:
+        return f"# {item.text}"
+    if cls is Proc:
+        params = ", ".join(f"{name} => {reg}" for name, reg in item.params)
+        if params:
+            params += " & "
+        return f"proc {item.name} # {params}return value => r0"
+    raise TypeError(f"not an IR item: {item!r}")
+
+
+def format_lines(items):
+    return [format_item(item) for item in items]
+
+
+def format_program(items):
+    """tsvm source text of a list of IR items"""
+    return '\n'.join(format_item(item) for item in items)
@@ -0,0 +1,164 @@
+from IR.ir import (Opcode, Instr, Label, RETURN_REGISTER, is_register, register_index,
+                   split_procs, join_procs)
+
+
+def frame_size(registers):
+    """Registers a frame needs to hold r0 .. the highest register used"""
+    return max((register_index(reg) for reg in registers), default=0) + 1
+
+
+class RegisterAllocator:
+    """Linear-scan register allocation over a program's IR
+
+    The code generator hands out a fresh register for every temporary, so
+    a function's frame grows with its size. This pass computes liveness on
+    the instruction sequence of each proc, turns it into one live interval
+    per register and reassigns registers by linear scan, reusing a register
+    as soon as its value is dead. tsvm has no fixed register file, so the
+    pool is unbounded and nothing is ever spilled; the lowest free register
+    is always taken, which keeps frames as small as the intervals allow.
+
+    r0 (return value) is never reassigned, and r1..rk keep the parameters
+    the proc header names; once a parameter is dead its register is reused.
+
+    Each instruction i has two points: 2i, where it reads, and 2i+1, where
+    it writes. A value whose last use is at i therefore does not interfere
+    with the value i defines, so `add r3, r3, r4` style reuse is allowed.
+    For `mov d, s` where s dies, d is given s's register when it is free,
+    which turns the move into `mov rX, rX` and drops it.
+    """
+
+    def __init__(self):
+        self.report = []  # (proc name, registers before, registers after)
+
+    def allocate(self, items):
+        """Allocate registers in a list of IR items, in place; returns it"""
+        procs = split_procs(items)
+        for proc, body in procs:
+            if proc is not None:
+                before, after = self.allocate_proc(proc, body)
+                self.report.append((proc.name, before, after))
+        items[:] = join_procs(procs)
+        return items
+
+    def allocate_proc(self, proc, body):
+        """Rewrite one proc's body in place; returns (registers before, after)"""
+        params = proc.param_registers()
+        instrs = []
+        labels = {}   # label -> index of the instruction after it
+        for item in body:
+            if item.__class__ is Label:
+                labels[item.name] = len(instrs)
+            elif item.__class__ is Instr:
+                instrs.append(item)
+        if not instrs:
+            return 0, 0
+
+        # Registers as bits of an int, so liveness sets are cheap to combine
+        bit = {}
+        def mask(regs):
+            m = 0
+            for reg in regs:
+                b = bit.get(reg)
+                if b is None:
+                    b = bit[reg] = len(bit)
+                m |= 1 << b
+            return m
+
+        count = len(instrs)
+        defs = []
+        uses = []
+        succs = []
+        hints = {}    # register -> register it is copied from
+        for i, instr in enumerate(instrs):
+            if instr.op == Opcode.MOV and is_register(instr.args[0]):
+                hints[instr.dest] = instr.args[0]
+            defs.append(mask(instr.defs()))
+            uses.append(mask(instr.uses()))
+            op = instr.op
+            following = [i + 1] if i + 1 < count else []
+            jump = [labels[instr.target]] if labels.get(instr.target, count) < count else []
+            if op == Opcode.RET:
+                succs.append([])
+            elif op == Opcode.JMP:
+                succs.append(jump)
+            elif op == Opcode.JZ or op == Opcode.JNZ:
+                succs.append(following + jump)
+            else:
+                succs.append(following)
+        registers = list(bit)
+        before = frame_size(registers)
+
+        live_in = [0] * count
+        live_out = [0] * count
+        changed = True
+        while changed:
+            changed = False
+            for i in range(count - 1, -1, -1):
+                out = 0
+                for s in succs[i]:
+                    out |= live_in[s]
+                new_in = uses[i] | (out & ~defs[i])
+                if new_in != live_in[i] or out != live_out[i]:
+                    live_in[i] = new_in
+                    live_out[i] = out
+                    changed = True
+
+        # Hull of the points each register is live or written at
+        start = {}
+        end = {}
+        for i in range(count):
+            for point, m in ((2 * i, live_in[i]), (2 * i + 1, live_out[i] | defs[i])):
+                while m:
+                    low = m & -m
+                    b = low.bit_length() - 1
+                    m ^= low
+                    if b not in start:
+                        start[b] = point
+                    end[b] = point
+
+        fixed = {RETURN_REGISTER: RETURN_REGISTER}
+        fixed.update((reg, reg) for reg in params)
+        mapping = dict(fixed)
+        active = []  # (end point, physical index)
+        taken = {0}
+        for reg in params:
+            # A parameter holds its value from entry, even if it is never read
+            b = bit.get(reg)
+            if b is not None:
+                start[b] = 0
+            active.append((end[b] if b is not None else 0, register_index(reg)))
+            taken.add(register_index(reg))
+
+        order = sorted((start[bit[reg]], reg) for reg in registers if reg not in fixed)
+        for point, reg in order:
+            still = []
+            for interval_end, physical in active:
+                if interval_end < point:
+                    taken.discard(physical)
+                else:
+                    still.append((interval_end, physical))
+            active = still
+            hint = mapping.get(hints.get(reg))
+            if hint is not None and register_index(hint) not in taken:
+                physical = register_index(hint)
+            else:
+                physical = 1
+                while physical in taken:
+                    physical += 1
+            taken.add(physical)
+            active.append((end[bit[reg]], physical))
+            mapping[reg] = f"r{physical}"
+
+        for instr in instrs:
+            instr.rename(mapping)
+        body[:] = [item for item in body
+                   if not (item.__class__ is Instr and item.op == Opcode.MOV
+                           and item.args[0] == item.dest)]
+        return before, frame_size(mapping[reg] for reg in registers)
+
+
+def allocate_registers(items):
+    """(allocated items, per-proc register report) for a list of IR items"""
+    allocator = RegisterAllocator()
+    return allocator.allocate(items), allocator.report
@@ -0,0 +1,90 @@
+import io
+from abc import ABC, abstractmethod
+
+from IR.printer import format_item
+
+
+class CodeSink(ABC):
+    """Where the tsvm text of a program goes, a proc or so at a time
+
+    write() takes a list of IR items and adds their lines, so the text is
+    the same as format_program() of everything written, in order. A sink
+    can be used as a context manager, which closes it at the end.
+    Subclasses say where the text goes by defining put().
+    """
+
+    def __init__(self):
+        self.started = False
+
+    def write(self, items):
+        for item in items:
+            self.write_line(format_item(item))
+
+    def write_line(self, line):
+        if self.started:
+            self.put('\n')
+        self.put(line)
+        self.started = True
+
+    @abstractmethod
+    def put(self, text):
+        """Add text to the output"""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class ListSink(CodeSink):
+    """Keeps the text in a list of the pieces put"""
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+
+    def put(self, text):
+        self.parts.append(text)
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+
+class StreamSink(CodeSink):
+    """Writes to a text stream, such as an open file or sys.stdout"""
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+
+    def put(self, text):
+        self.stream.write(text)
+
+
+class StringSink(StreamSink):
+    """Writes into an in-memory io.StringIO"""
+
+    def __init__(self):
+        super().__init__(io.StringIO())
+
+    def getvalue(self):
+        return self.stream.getvalue()
+
+
+class FileSink(StreamSink):
+    """Writes to a file through a buffer of buffer_size bytes
+
+    Only the buffer and the proc being written are held in memory; the
+    file is flushed as the buffer fills and closed by close().
+    """
+
+    def __init__(self, path, buffer_size=1 << 16):
+        super().__init__(open(path, 'w', buffering=buffer_size))
+
+    def close(self):
+        self.stream.close()
@@ -0,0 +1,468 @@
+from IR.ir import (Opcode, Instr, RETURN_REGISTER, is_register, register_index,
+                   split_procs, join_procs, count_instructions)
+from IR.cfg import CFG
+from IR.loops import LoopOptimizer
+from IR.cse import ValueNumbering
+
+# Instructions kept whether or not their result is used: they have effects
+# beyond their destination register, or (div, mod, load) can stop the VM
+_CRITICAL_OPS = frozenset({
+    Opcode.CALL, Opcode.STORE, Opcode.RET, Opcode.JMP, Opcode.JZ, Opcode.JNZ,
+    Opcode.DIV, Opcode.MOD, Opcode.LOAD,
+})
+
+
+class SSAProc:
+    """One proc in SSA form and the passes that run on it
+
+    to_ssa() places phis at the iterated dominance frontier of every
+    register that is live across blocks (semi-pruned SSA) and renames each
+    definition to a fresh register, walking the dominator tree. A phi's
+    args line up with its block's preds. r0 stays as it is: tsvm's `ret`
+    reads it implicitly. Values that reach a use without a definition
+    (parameters, variables read before they are set) keep their original
+    register, which nothing writes any more.
+
+    Copy propagation leaves alone moves into registers a phi merges, and
+    moves out of them unless the copy is only read further down the same
+    block before the register is written again. The versions of a
+    register tied together by phis therefore never overlap (conventional
+    SSA), and from_ssa() can give each such web one register and drop its
+    phis without any copies. The webs are still checked against an
+    interference graph; where they would overlap (trivial phis forwarded
+    across a redefinition) the phi `d = phi(a1, .., an)` is replaced the
+    safe way instead, by a fresh d' that every predecessor sets (`mov d',
+    ai` before its jump) and `mov d, d'` where the phi was. After the phis,
+    `mov d, s` joins the webs of d and s when they do not interfere either
+    and the move goes away.
+    """
+
+    def __init__(self, proc, body):
+        self.proc = proc
+        self.cfg = CFG.build(proc, body)
+        if self.cfg.entry.preds:
+            # A loop at the very start: phis there need an edge for the entry value
+            self.cfg.insert_before(self.cfg.entry, [])
+        self.next_register = 1 + max(
+            [register_index(reg) for reg in proc.param_registers()]
+            + [register_index(reg) for item in body if item.__class__ is Instr
+               for reg in item.defs() + item.uses()],
+            default=0)
+        self.first_fresh = self.next_register  # registers below are the original ones
+        self.removed = 0
+        self.copies = 0
+
+    def fresh(self):
+        reg = f"r{self.next_register}"
+        self.next_register += 1
+        return reg
+
+    def drop_unreachable(self):
+        live = self.cfg.reachable()
+        dead = [block for block in self.cfg.blocks if block not in live]
+        if not dead:
+            return
+        for block in dead:
+            self.removed += len(block.instrs)
+            for succ in block.succs:
+                if block in succ.preds:
+                    succ.preds.remove(block)
+        self.cfg.blocks = [block for block in self.cfg.blocks if block in live]
+        for block in self.cfg.blocks:
+            if block.fallthrough is not None and block.fallthrough not in live:
+                block.fallthrough = None
+
+    def to_ssa(self):
+        self.drop_unreachable()
+        cfg = self.cfg
+        idom = cfg.idom
+        blocks = cfg.blocks
+
+        frontier = {block: set() for block in blocks}
+        for block in blocks:
+            preds = [pred for pred in block.preds if pred in idom]
+            if len(preds) < 2:
+                continue
+            for pred in preds:
+                runner = pred
+                while runner is not idom[block]:
+                    frontier[runner].add(block)
+                    runner = idom[runner]
+
+        # Registers read in some block before that block writes them
+        crossing = set()
+        def_blocks = {}
+        for block in blocks:
+            written = set()
+            for instr in block.instrs:
+                for reg in instr.uses():
+                    if reg not in written:
+                        crossing.add(reg)
+                for reg in instr.defs():
+                    written.add(reg)
+                    def_blocks.setdefault(reg, set()).add(block)
+        crossing.discard(RETURN_REGISTER)
+
+        self.phi_vars = {}  # phi -> register it merges
+        self.origin = {}    # SSA register -> register it is a version of
+        for reg in crossing:
+            work = list(def_blocks.get(reg, ()))
+            placed = set()
+            while work:
+                block = work.pop()
+                for target in frontier[block]:
+                    if target in placed:
+                        continue
+                    placed.add(target)
+                    phi = Instr(Opcode.PHI, reg, (reg,) * len(target.preds))
+                    self.phi_vars[phi] = reg
+                    target.items.insert(0, phi)
+                    if target not in def_blocks[reg]:
+                        work.append(target)
+
+        children = cfg.dominator_tree()
+        stacks = {}
+
+        def current(reg):
+            stack = stacks.get(reg)
+            return stack[-1] if stack else reg
+
+        work = [(cfg.entry, None)]
+        while work:
+            block, pushed = work.pop()
+            if pushed is not None:
+                for reg in pushed:
+                    stacks[reg].pop()
+                continue
+            pushed = []
+            for instr in block.instrs:
+                if instr.op != Opcode.PHI:
+                    instr.args = tuple(current(arg) if is_register(arg) and arg != RETURN_REGISTER
+                                       else arg for arg in instr.args)
+                dest = instr.dest
+                if dest is not None and dest != RETURN_REGISTER:
+                    new = self.fresh()
+                    self.origin[new] = dest
+                    stacks.setdefault(dest, []).append(new)
+                    pushed.append(dest)
+                    instr.dest = new
+            for succ in block.succs:
+                j = succ.preds.index(block)
+                for phi in succ.phis:
+                    args = list(phi.args)
+                    args[j] = current(self.phi_vars[phi])
+                    phi.args = tuple(args)
+            work.append((block, pushed))
+            work.extend((child, None) for child in children.get(block, ()))
+
+    def phi_registers(self):
+        """Registers some phi defines or reads"""
+        regs = set()
+        for block in self.cfg.blocks:
+            for phi in block.phis:
+                regs.add(phi.dest)
+                regs.update(phi.args)
+        return regs
+
+    def propagate_copies(self):
+        """Forward `mov d, s` and phis whose args all agree; returns how many went"""
+        alias = {}
+        merged = self.phi_registers()
+        readers = {}
+        for block in self.cfg.blocks:
+            for instr in block.instrs:
+                for reg in instr.uses():
+                    readers.setdefault(reg, []).append(instr)
+        for block in self.cfg.blocks:
+            instrs = block.instrs
+            for i, instr in enumerate(instrs):
+                if instr.dest == RETURN_REGISTER or instr.dest in merged:
+                    continue
+                source = instr.args[0] if instr.op == Opcode.MOV else None
+                if not is_register(source) or source == RETURN_REGISTER:
+                    continue
+                if source not in merged or self.copy_is_local(instrs, i, readers.get(instr.dest, ())):
+                    alias[instr.dest] = source
+        changed = True
+        while changed:
+            changed = False
+            for block in self.cfg.blocks:
+                for phi in block.phis:
+                    if phi.dest in alias:
+                        continue
+                    sources = {self._resolve(alias, arg) for arg in phi.args} - {phi.dest}
+                    if len(sources) == 1:
+                        source = sources.pop()
+                        if is_register(source):
+                            alias[phi.dest] = source
+                            changed = True
+        if not alias:
+            return 0
+        removed = 0
+        for block in self.cfg.blocks:
+            kept = []
+            for item in block.items:
+                if item.__class__ is Instr:
+                    if item.dest in alias:
+                        removed += 1
+                        continue
+                    item.args = tuple(self._resolve(alias, arg) if is_register(arg) else arg
+                                      for arg in item.args)
+                kept.append(item)
+            block.items = kept
+        self.copies += removed
+        return removed
+
+    def copy_is_local(self, instrs, i, readers):
+        """Whether `mov d, s` at instrs[i] can be forwarded although phis merge s
+
+        It can when every read of d follows in the same block with no other
+        version of s's register written first, so s stays in one piece.
+        """
+        origin = self.origin.get(instrs[i].args[0], instrs[i].args[0])
+        pending = set(readers)
+        for instr in instrs[i + 1:]:
+            pending.discard(instr)
+            if not pending:
+                return True
+            if instr.dest is not None and self.origin.get(instr.dest, instr.dest) == origin:
+                return False
+        return not pending
+
+    @staticmethod
+    def _resolve(alias, reg):
+        seen = set()
+        while reg in alias and reg not in seen:
+            seen.add(reg)
+            reg = alias[reg]
+        return reg
+
+    def eliminate_dead_code(self):
+        """Remove instructions whose results nothing needs; returns how many"""
+        definition = {}
+        live = set()
+        work = []
+        for block in self.cfg.blocks:
+            for instr in block.instrs:
+                if instr.dest is not None:
+                    definition[instr.dest] = instr
+                if instr.op in _CRITICAL_OPS or instr.dest == RETURN_REGISTER:
+                    live.add(instr)
+                    work.append(instr)
+        while work:
+            instr = work.pop()
+            for reg in instr.uses():
+                source = definition.get(reg)
+                if source is not None and source not in live:
+                    live.add(source)
+                    work.append(source)
+        removed = 0
+        for block in self.cfg.blocks:
+            kept = []
+            for item in block.items:
+                if item.__class__ is Instr and item not in live:
+                    removed += 1
+                    continue
+                kept.append(item)
+            block.items = kept
+        self.removed += removed
+        return removed
+
+    def liveness(self):
+        """Registers live out of each block; a phi's args count as live out of its preds"""
+        blocks = self.cfg.blocks
+        gen = {}
+        kill = {}
+        phi_uses = {block: set() for block in blocks}
+        for block in blocks:
+            used = set()
+            written = set()
+            for instr in block.instrs:
+                if instr.op == Opcode.PHI:
+                    written.add(instr.dest)
+                    for pred, arg in zip(block.preds, instr.args):
+                        phi_uses[pred].add(arg)
+                    continue
+                used.update(reg for reg in instr.uses() if reg not in written)
+                written.update(instr.defs())
+            gen[block] = used
+            kill[block] = written
+        live_in = {block: set() for block in blocks}
+        live_out = {block: set() for block in blocks}
+        changed = True
+        while changed:
+            changed = False
+            for block in reversed(blocks):
+                out = set(phi_uses[block])
+                for succ in block.succs:
+                    out |= live_in[succ]
+                new_in = gen[block] | (out - kill[block])
+                if out != live_out[block] or new_in != live_in[block]:
+                    live_out[block] = out
+                    live_in[block] = new_in
+                    changed = True
+        return live_out
+
+    def interference(self):
+        """Register -> registers live where it is written
+
+        A move's source does not interfere with its destination: they hold
+        the same value. Phis of a block write together at its top, and what
+        is live into the entry block was set before the proc started.
+        """
+        graph = {}
+
+        def interfere(reg, others):
+            for other in others:
+                if other != reg:
+                    graph.setdefault(reg, set()).add(other)
+                    graph.setdefault(other, set()).add(reg)
+
+        for block, live in self.liveness().items():
+            phis = block.phis
+            for instr in reversed(block.instrs[len(phis):]):
+                for reg in instr.defs():
+                    if instr.op == Opcode.MOV:
+                        interfere(reg, live - {instr.args[0]})
+                    else:
+                        interfere(reg, live)
+                    live.discard(reg)
+                live.update(instr.uses())
+            live.update(phi.dest for phi in phis)
+            for phi in phis:
+                interfere(phi.dest, live)
+            if block is self.cfg.entry:
+                for reg in live:
+                    interfere(reg, live)
+        return graph
+
+    def from_ssa(self):
+        graph = self.interference()
+        parent = {}
+        members = {}
+        neighbours = {}
+        original = {}    # web -> whether it holds one of the original registers
+
+        def find(reg):
+            while parent.get(reg, reg) != reg:
+                reg = parent[reg]
+            return reg
+
+        def web(reg):
+            root = find(reg)
+            if root not in members:
+                members[root] = {root}
+                neighbours[root] = set(graph.get(root, ()))
+                original[root] = register_index(root) < self.first_fresh
+            return root
+
+        def join(a, d):
+            """Put a's web into d's unless they interfere; whether they are one now"""
+            if a == d:
+                return True
+            if members[a] & neighbours[d]:
+                return False
+            parent[a] = d
+            members[d] |= members.pop(a)
+            neighbours[d] |= neighbours.pop(a)
+            original[d] |= original.pop(a)
+            return True
+
+        unmerged = []
+        for block in self.cfg.blocks:
+            for phi in block.phis:
+                merged = True
+                for arg in phi.args:
+                    if not join(web(arg), web(phi.dest)):
+                        merged = False
+                if not merged:
+                    unmerged.append((block, phi))
+        # Then moves: a web and the value copied into it share a register
+        # when they never overlap, except two original registers
+        for block in self.cfg.blocks:
+            for instr in block.instrs:
+                if instr.op == Opcode.MOV and is_register(instr.args[0]) \
+                        and RETURN_REGISTER not in (instr.dest, instr.args[0]):
+                    a, d = web(instr.args[0]), web(instr.dest)
+                    if not (original[a] and original[d]):
+                        join(a, d)
+
+        # Each web is named after its original register if it has one, so
+        # parameters stay where the proc header says they are
+        mapping = {}
+        for root, regs in members.items():
+            name = min(regs, key=lambda reg: (register_index(reg) >= self.first_fresh,
+                                              register_index(reg)))
+            for reg in regs:
+                mapping[reg] = name
+
+        for block, phi in unmerged:
+            temp = self.fresh()
+            for pred, arg in zip(block.preds, phi.args):
+                pred.append(Instr(Opcode.MOV, temp, (arg,)))
+            block.items.insert(block.items.index(phi) + 1, Instr(Opcode.MOV, phi.dest, (temp,)))
+        for block in self.cfg.blocks:
+            block.items = [item for item in block.items
+                           if not (item.__class__ is Instr and item.op == Opcode.PHI)]
+            for instr in block.instrs:
+                instr.rename(mapping)
+            block.items = [item for item in block.items
+                           if not (item.__class__ is Instr and item.op == Opcode.MOV
+                                   and item.args == (item.dest,))]
+
+    def to_items(self):
+        return self.cfg.to_items()
+
+
+class SSAOptimizer:
+    """Copy propagation and dead-code elimination on each proc in SSA form
+
+    With cse set, common subexpressions (IR/cse.py) are replaced first.
+    With loops set, loop-invariant code motion and strength reduction
+    (IR/loops.py) run in between, followed by another round of the others.
+    removed counts instructions dead-code elimination dropped, copies the
+    moves copy propagation made unnecessary, reused the subexpressions
+    not computed again, hoisted and reduced what the loop passes moved or
+    replaced; before and after are instruction counts of the whole program.
+    """
+
+    def __init__(self, loops=True, cse=True):
+        self.loops = loops
+        self.cse = cse
+        self.removed = 0
+        self.copies = 0
+        self.reused = 0
+        self.hoisted = 0
+        self.reduced = 0
+        self.before = 0
+        self.after = 0
+
+    def optimize(self, items):
+        """Optimize a list of IR items in place; returns it"""
+        self.before += count_instructions(items)
+        procs = split_procs(items)
+        for i, (proc, body) in enumerate(procs):
+            if proc is None:
+                continue
+            ssa = SSAProc(proc, body)
+            ssa.to_ssa()
+            self.simplify(ssa)
+            if self.loops:
+                loops = LoopOptimizer(ssa)
+                if loops.optimize():
+                    self.simplify(ssa)
+                self.hoisted += loops.hoisted
+                self.reduced += loops.reduced
+            ssa.from_ssa()
+            self.removed += ssa.removed
+            self.copies += ssa.copies
+            procs[i] = (proc, ssa.to_items())
+        items[:] = join_procs(procs)
+        self.after += count_instructions(items)
+        return items
+
+    def simplify(self, ssa):
+        if self.cse:
+            self.reused += ValueNumbering(ssa).run()
+        while ssa.propagate_copies() + ssa.eliminate_dead_code():
+            pass
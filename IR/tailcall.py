@@ -0,0 +1,112 @@
+from IR.ir import (Opcode, Instr, Label, Comment, RETURN_REGISTER, register_index,
+                   split_procs, join_procs, count_instructions)
+from IR.cfg import CFG
+from IR.isel import reg_is_read
+
+
+class TailCallEliminator:
+    """Turns self tail calls into jumps back to the start of their proc
+
+    A tail call is `call f, rd, args` inside f itself followed, with only
+    comments in between, by `mov r0, rd` and `ret`: what `return f(...)`
+    compiles to. It is replaced by moves of the arguments into the
+    parameter registers r1..rk and a jump to a label at the start of the
+    proc, so the recursion runs as a loop in one tsvm frame. The moves
+    are ordered so no parameter is overwritten while another argument
+    still reads it; a cycle such as f(b, a) goes through a fresh register.
+    Locals that may be read before they are set are zeroed again, as tsvm
+    would have for the new frame.
+
+    eliminated counts the calls replaced; before and after are
+    instruction counts of the whole program.
+    """
+
+    def __init__(self):
+        self.eliminated = 0
+        self.before = 0
+        self.after = 0
+
+    def eliminate(self, items):
+        """Rewrite a list of IR items in place; returns it"""
+        self.before += count_instructions(items)
+        procs = split_procs(items)
+        for proc, body in procs:
+            if proc is not None:
+                self.eliminate_in(proc, body)
+        items[:] = join_procs(procs)
+        self.after += count_instructions(items)
+        return items
+
+    def eliminate_in(self, proc, body):
+        params = proc.param_registers()
+        start = f"{proc.name}_start"
+        self.next_register = 1 + max(
+            [register_index(reg) for reg in params]
+            + [register_index(reg) for item in body if item.__class__ is Instr
+               for reg in item.defs() + item.uses()],
+            default=0)
+        tails = {}
+        for i, item in enumerate(body):
+            if item.__class__ is Instr and item.op == Opcode.CALL and item.target == proc.name \
+                    and len(item.args) == len(params):
+                tail = self.tail_of(body, i)
+                if tail is not None:
+                    tails[i] = tail
+        if not tails:
+            return
+        # Registers are 0 when a proc starts; locals read before they are
+        # set must be 0 again on the next round
+        cfg = CFG.build(proc, body)
+        reset = sorted({reg for item in body if item.__class__ is Instr for reg in item.uses()}
+                       - set(params) - {RETURN_REGISTER}, key=register_index)
+        reset = [reg for reg in reset if reg_is_read(cfg.entry, reg)]
+
+        result = [Label(start)]
+        i = 0
+        while i < len(body):
+            if i in tails:
+                result.extend(self.parallel_move(params, body[i].args))
+                result.extend(Instr(Opcode.MOV, reg, [0]) for reg in reset)
+                result.append(Instr(Opcode.JMP, target=start))
+                self.eliminated += 1
+                i = tails[i]
+                continue
+            result.append(body[i])
+            i += 1
+        body[:] = result
+
+    @staticmethod
+    def tail_of(body, i):
+        """Index just past the `mov r0, rd` / `ret` ending the call at i, None if it is not a tail call"""
+        dest = body[i].dest
+        expected = [lambda instr: instr.op == Opcode.MOV and instr.dest == RETURN_REGISTER
+                    and instr.args == (dest,),
+                    lambda instr: instr.op == Opcode.RET]
+        if dest is None:
+            return None
+        j = i + 1
+        for matches in expected:
+            while j < len(body) and body[j].__class__ is Comment:
+                j += 1
+            if j == len(body) or body[j].__class__ is not Instr or not matches(body[j]):
+                return None
+            j += 1
+        return j
+
+    def parallel_move(self, params, args):
+        """Moves that set every param to its arg at once"""
+        pending = {param: arg for param, arg in zip(params, args) if param != arg}
+        moves = []
+        while pending:
+            read = set(pending.values())
+            ready = next((param for param in pending if param not in read), None)
+            if ready is not None:
+                moves.append(Instr(Opcode.MOV, ready, [pending.pop(ready)]))
+                continue
+            # Every remaining parameter is still read: save one and read the copy
+            param = next(iter(pending))
+            saved = f"r{self.next_register}"
+            self.next_register += 1
+            moves.append(Instr(Opcode.MOV, saved, [param]))
+            pending = {dest: saved if arg == param else arg for dest, arg in pending.items()}
+        return moves
@@ -0,0 +1,60 @@
+import re
+
+from IR.ir import Opcode, Instr, Label, Comment, Proc
+
+# One operand: a string literal, a memory operand or anything up to a comma
+_OPERAND = re.compile(r'"(?:[^"\\]|\\.)*"+|\[[^\]]*\]|[^,\s][^,]*')
+_HEADER_PARAM = re.compile(r'(\w+)\s*=>\s*(r\d+)')
+_INTEGER = re.compile(r'-?\d+')
+
+_OPCODES = {value: value for name, value in vars(Opcode).items() if not name.startswith('_')}
+
+
+def _operand(text):
+    return int(text) if _INTEGER.fullmatch(text) else text
+
+
+def _memory(text):
+    base, index = (part.strip() for part in text[1:-1].split('+'))
+    return _operand(base), _operand(index)
+
+
+def parse_line(line):
+    """IR item for one line of tsvm text, None for a blank line"""
+    text = line.strip()
+    if not text:
+        return None
+    if text.startswith('#'):
+        return Comment(text[1:].strip())
+    if text.startswith('proc '):
+        name = text.split()[1]
+        header = text.partition('#')[2]
+        return Proc(name, [(param, reg) for param, reg in _HEADER_PARAM.findall(header)
+                           if reg != 'r0'])
+    if text.endswith(':') and ' ' not in text:
+        return Label(text[:-1])
+    op, _, rest = text.partition(' ')
+    operands = [operand.strip() for operand in _OPERAND.findall(rest)]
+    op = _OPCODES.get(op, op)
+    if op == Opcode.MOV and operands[0].startswith('['):
+        return Instr(Opcode.STORE, args=_memory(operands[0]) + (_operand(operands[1]),))
+    if op == Opcode.MOV and operands[1].startswith('['):
+        return Instr(Opcode.LOAD, operands[0], _memory(operands[1]))
+    if op == Opcode.JMP:
+        return Instr(op, target=operands[0])
+    if op == Opcode.JZ or op == Opcode.JNZ:
+        return Instr(op, args=[_operand(operands[0])], target=operands[1])
+    if op == Opcode.RET:
+        return Instr(op)
+    if op == Opcode.CALL:
+        name, rest = operands[0], operands[1:]
+        if name == 'iput':
+            return Instr(op, args=[_operand(arg) for arg in rest], target=name)
+        return Instr(op, rest[0] if rest else None, [_operand(arg) for arg in rest[1:]], name)
+    return Instr(op, operands[0], [_operand(arg) for arg in operands[1:]])
+
+
+def parse(text):
+    """IR items of a tsvm program, the inverse of IR.printer.format_program"""
+    lines = text.splitlines() if isinstance(text, str) else text
+    return [item for item in map(parse_line, lines) if item is not None]
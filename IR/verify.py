@@ -0,0 +1,78 @@
+from IR.ir import (Opcode, Instr, Label, Comment, BINARY_OPS, UNARY_OPS, JUMP_OPS,
+                   is_register, split_procs)
+
+# Procs tsvm provides itself
+TSVM_BUILTINS = ('iget', 'iput', 'mem')
+
+# opcode -> (has a dest, number of args); calls take any number of args
+_SHAPES = {
+    Opcode.MOV: (True, 1),
+    Opcode.LOAD: (True, 2),
+    Opcode.STORE: (False, 3),
+    Opcode.JMP: (False, 0),
+    Opcode.JZ: (False, 1),
+    Opcode.JNZ: (False, 1),
+    Opcode.RET: (False, 0),
+    **{op: (True, 2) for op in BINARY_OPS},
+    **{op: (True, 1) for op in UNARY_OPS},
+}
+
+
+class IRError(Exception):
+    """Raised by verify() for IR tsvm could not run"""
+
+
+def verify(items, procs=()):
+    """Check that a program's IR is well formed; raises IRError at the first problem
+
+    Every instruction must have the operands its opcode takes, with a
+    register where one is written or read from memory, every jump must
+    go to a label of its own proc, no label may be defined twice in a
+    proc, calls must go to a proc in items, in procs or a tsvm builtin,
+    and no phi may be left over from SSA form.
+    """
+    chunks = split_procs(items)
+    names = {proc.name for proc, _ in chunks if proc is not None} | set(procs)
+    for proc, body in chunks:
+        where = f"proc {proc.name}" if proc is not None else "before the first proc"
+        if proc is None and any(item.__class__ is Instr for item in body):
+            raise IRError(f"instructions {where}")
+        labels = set()
+        for item in body:
+            if item.__class__ is Label:
+                if item.name in labels:
+                    raise IRError(f"label {item.name} defined twice in {where}")
+                labels.add(item.name)
+            elif item.__class__ is not Instr and item.__class__ is not Comment:
+                raise IRError(f"not an IR item in {where}: {item!r}")
+        for item in body:
+            if item.__class__ is Instr:
+                problem = instruction_problem(item, labels, names)
+                if problem:
+                    raise IRError(f"{problem} in {where}: {item!r}")
+
+
+def instruction_problem(instr, labels, procs):
+    """What is wrong with one instruction, None if nothing is"""
+    op = instr.op
+    if op == Opcode.PHI:
+        return "phi outside SSA form"
+    if op == Opcode.CALL:
+        if instr.target not in procs and instr.target not in TSVM_BUILTINS:
+            return f"call to unknown proc {instr.target}"
+        if instr.dest is not None and not is_register(instr.dest):
+            return "call result not a register"
+        return None
+    shape = _SHAPES.get(op)
+    if shape is None:
+        return f"unknown opcode {op}"
+    has_dest, arity = shape
+    if has_dest != (instr.dest is not None) or len(instr.args) != arity:
+        return "wrong operands"
+    if has_dest and not is_register(instr.dest):
+        return "destination not a register"
+    if op in (Opcode.LOAD, Opcode.STORE) and not is_register(instr.args[0]):
+        return "memory base not a register"
+    if op in JUMP_OPS and instr.target not in labels:
+        return f"jump to unknown label {instr.target}"
+    return None
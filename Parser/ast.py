@@ -46,13 +46,16 @@ class FunctionNode(Node):
 
 
 class FunctionWithReturnNode(Node):
-    def __init__(self, expr, lineno):
+    def __init__(self, type, iden, flist, expr, lineno):
         self.lineno = lineno
+        self.type = type
+        self.iden = iden
+        self.flist = flist
         self.expr = expr
-        self.children = (expr,)
+        self.children = (type, iden, flist, expr)
 
     def __repr__(self):
-        return f"{self.__class__.__name__}(expr={self.expr.__repr__()}, lineno={self.lineno})"
+        return f"{self.__class__.__name__}(type={self.type.__repr__()}, iden={self.iden.__repr__()}, flist={self.flist.__repr__()}, expr={self.expr.__repr__()}, lineno={self.lineno})"
 
 
 class FunctionBodyNode(Node):
@@ -0,0 +1,93 @@
+import json
+
+# Attributes that are bookkeeping rather than AST structure
+_SKIPPED_FIELDS = ('children', 'parent')
+_PRIMITIVES = (str, int, float, bool, type(None))
+
+
+def _is_node(value):
+    return not isinstance(value, _PRIMITIVES) and hasattr(value, '__dict__')
+
+
+def _split_fields(node):
+    """Split a node's attributes into primitive attrs and (label, child) pairs"""
+    attrs = {}
+    children = []
+    for field, value in vars(node).items():
+        if field in _SKIPPED_FIELDS:
+            continue
+        if isinstance(value, (list, tuple)):
+            nodes = [item for item in value if _is_node(item)]
+            if nodes:
+                for index, item in enumerate(value):
+                    if _is_node(item):
+                        children.append((f"{field}[{index}]", item))
+                continue
+            attrs[field] = list(value)
+        elif _is_node(value):
+            children.append((field, value))
+        else:
+            attrs[field] = value
+    return attrs, children
+
+
+def _make_filter(node_filter):
+    """Accept a predicate or a collection of node class names"""
+    if node_filter is None or callable(node_filter):
+        return node_filter
+    names = frozenset(node_filter)
+    return lambda node: type(node).__name__ in names
+
+
+def dump_ast(root, stream, fmt='text', max_depth=None, node_filter=None, indent='  '):
+    """Write the AST rooted at `root` to `stream` one node at a time
+
+    fmt is 'text' (indented outline) or 'jsonl' (one JSON object per node
+    carrying its id, parent id, depth and field). max_depth stops the walk
+    below that depth, and node_filter (a predicate or a set of class names)
+    picks which nodes are written; the walk still descends through nodes
+    that are filtered out. A written node's parent is its nearest written
+    ancestor, and text is indented by the number of those. The walk uses an
+    explicit stack so deep trees do not hit the recursion limit. Returns the number of nodes written.
+    """
+    if fmt not in ('text', 'jsonl'):
+        raise ValueError(f"unknown AST dump format '{fmt}'")
+    if not _is_node(root):
+        return 0
+    keep = _make_filter(node_filter)
+    written = 0
+    next_id = 0
+    # (label, node, depth, id of the nearest written ancestor, its written depth + 1)
+    stack = [(None, root, 0, None, 0)]
+    while stack:
+        label, node, depth, parent_id, level = stack.pop()
+        node_id = next_id
+        next_id += 1
+        attrs, children = _split_fields(node)
+        truncated = max_depth is not None and depth >= max_depth and bool(children)
+
+        if keep is None or keep(node):
+            if fmt == 'text':
+                fields = ', '.join(f"{key}={value!r}" for key, value in attrs.items())
+                prefix = f"{label}: " if label else ''
+                suffix = ' ...' if truncated else ''
+                stream.write(f"{indent * level}{prefix}{type(node).__name__}({fields}){suffix}\n")
+            else:
+                record = {
+                    'id': node_id,
+                    'parent': parent_id,
+                    'depth': depth,
+                    'field': label,
+                    'node': type(node).__name__,
+                    'attrs': attrs,
+                }
+                if truncated:
+                    record['truncated'] = True
+                stream.write(json.dumps(record, default=str) + '\n')
+            written += 1
+            parent_id, level = node_id, level + 1
+
+        if not truncated:
+            for child_label, child in reversed(children):
+                stack.append((child_label, child, depth + 1, parent_id, level))
+    return written
@@ -1,6 +1,7 @@
 
 from Lexer.tokens import tokens
 from .ast import *
+from .typesys import Type, parse_type
 from Lexer.tokens import lexer
 
 class Grammar:
@@ -26,6 +27,7 @@ class Grammar:
         self.brace_count = 0
         self.current_function = None 
         self.has_syntax_error = False
+        self.calls = {}  # names called so far in the function being parsed
         
 
 
@@ -62,24 +64,32 @@ class Grammar:
             param_list.append((current.iden, current.type.type_value))
             current = current.next_param if hasattr(current, 'next_param') else None
         p[0] = FunctionNode(type=p[7], iden=p[2], flist=p[4], func_choice=p[10], lineno=self.lexer.lineno)
+        p[0].calls = self.take_calls()
         self.current_function = None
         self.brace_count -= 1
 
     def p_func_without_body(self, p):
         '''funk : FUNK ID LPAREN flist RPAREN LESS_THAN type GREATER_THAN RETURN_ARROW expr SEMI_COLON'''
         self.current_function = p[2]
-        param_list = []
-        current = p[4]
-        while current and hasattr(current, 'iden'):
-            param_list.append((current.iden, current.type.type_value))
-            current = current.next_param if hasattr(current, 'next_param') else None
-        self.defined_functions[p[2]] = {'return_type': p[7].type_value, 'params': param_list}
-        p[0] = FunctionWithReturnNode(type=p[7], iden=p[2], flist=p[4], return_expr=p[10], lineno=self.lexer.lineno)
+        # Signatures are collected by SemanticAnalyzer.collect_signatures
+        p[0] = FunctionWithReturnNode(type=p[7], iden=p[2], flist=p[4], expr=p[10], lineno=self.lexer.lineno)
+        p[0].calls = self.take_calls()
         self.current_function = None
         return p[0]
 
+    def take_calls(self):
+        """Names called in the function just parsed, in source order
+
+        Function nodes keep them as `calls` so the call graph does not have
+        to walk every body to find its edges.
+        """
+        calls = list(self.calls)
+        self.calls = {}
+        return calls
+
     def p_func_error(self, p):
         '''funk : error'''
+        self.calls = {}
         if self.brace_count > 0:
             print(f"Error: Unmatched curly brace(s) at line {self.lexer.lineno}.")
         return None
@@ -145,14 +155,14 @@ class Grammar:
     def p_stmt_if_else(self, p):
         '''stmt : IF LPAREN expr RPAREN stmt ELSE stmt'''
         self.paren_count += 1
-        p[0] = IfStatementNode(expr=p[3], stmt=p[5], else_stmt=p[7], lineno=self.lexer.lineno)
+        p[0] = IfStatementNode(expr=p[3], stmt=p[5], else_choice=p[7], lineno=self.lexer.lineno)
         self.paren_count -= 1
         return p[0]
 
     def p_stmt_while(self, p):
         '''stmt : WHILE LPAREN expr RPAREN stmt'''
         self.paren_count += 1
-        p[0] = WhileStatementNode(condition=p[3], stmt=p[5], lineno=self.lexer.lineno)
+        p[0] = WhileStatementNode(expr=p[3], stmt=p[5], lineno=self.lexer.lineno)
         self.paren_count -= 1
         return p[0]
 
@@ -225,19 +235,20 @@ class Grammar:
                 | BOOL
                 | NULL'''
         p[0] = TypeNode(type_value=p[1], lineno=self.lexer.lineno)
+        p[0].type = parse_type(p[1])
         return p[0]
 
     # expr :=
     def p_expr_array_indexing(self, p):
         '''expr : expr LSQUAREBR expr RSQUAREBR'''
         p[0] = ArrayIndexingNode(array_expr=p[1], index_expr=p[3], lineno=self.lexer.lineno)
-        p[0].type = 'INT'  # Assuming array elements are integers
+        p[0].type = Type.INT  # Assuming array elements are integers
         return p[0]
 
     def p_expr_clist(self, p):
         '''expr : LSQUAREBR clist RSQUAREBR'''
         p[0] = ClistNode(exprs=p[2].exprs, lineno=self.lexer.lineno)
-        p[0].type = 'VECTOR'
+        p[0].type = Type.VECTOR
         return p[0]
 
     def p_expr_ternary(self, p):
@@ -266,30 +277,32 @@ class Grammar:
     def p_expr_not(self, p):
         '''expr : NOT expr'''
         p[0] = UnaryOperationNode(operator='!', expr=p[2], lineno=self.lexer.lineno)
-        p[0].type = 'BOOL'
+        p[0].type = Type.BOOL
         return p[0]
     
     def p_expr_unary_minus(self, p):
         '''expr : MINUS expr'''
         p[0] = UnaryOperationNode(operator='-', expr=p[2], lineno=self.lexer.lineno)
-        p[0].type = 'INT'  # Assuming the result is an integer
+        p[0].type = Type.INT  # Assuming the result is an integer
         return p[0]
     
-    def p_expr_logical_and(p):
+    def p_expr_logical_and(self, p):
         "expr : expr AND expr"
-        p[0] = BinaryOperationNode(p[1], '&&', p[3])
+        p[0] = BinaryOperationNode(expr1=p[1], expr2=p[3], operator='&&', lineno=self.lexer.lineno)
 
-    def p_expr_logical_or(p):
+    def p_expr_logical_or(self, p):
         "expr : expr OR expr"
-        p[0] = BinaryOperationNode(p[1], '||', p[3])
+        p[0] = BinaryOperationNode(expr1=p[1], expr2=p[3], operator='||', lineno=self.lexer.lineno)
 
 
     def p_expr_list(self, p):
         '''expr : ID LPAREN expr RPAREN'''
         if p[1] == 'list':
             p[0] = FunctionCallNode(iden='list', clist=ClistNode(expr=[p[3]], lineno=self.lexer.lineno), lineno=self.lexer.lineno)
+            self.calls['list'] = None
         elif p[1] == 'length':
             p[0] = FunctionCallNode(iden='length', clist=ClistNode(expr=[p[3]], lineno=self.lexer.lineno), lineno=self.lexer.lineno)
+            self.calls['length'] = None
         else:
             p[0] = self._handle_func_call(p[1], ClistNode(expr=[p[3]], lineno=self.lexer.lineno), p[4])
         return p[0]
@@ -303,6 +316,7 @@ class Grammar:
         if lineno is None:
             lineno = self.lexer.lineno
         node = FunctionCallNode(iden=iden, clist=args, lineno=lineno)
+        self.calls[iden] = None
         return node
 
     def p_expr_iden(self, p):
@@ -313,27 +327,27 @@ class Grammar:
     def p_expr_number(self, p):
         '''expr : NUMBER'''
         p[0] = NumberNode(num_value=p[1], lineno=self.lexer.lineno)
-        p[0].type = 'INT'
+        p[0].type = Type.INT
         return p[0]
 
     def p_expr_string(self, p):
         '''expr : STRING
                 | MSTRING'''
         p[0] = StringNode(str_value=p[1], lineno=self.lexer.lineno)
-        p[0].type = 'STR' if p[1][0] == '"' else 'MSTR'
+        p[0].type = Type.STR if p[1][0] == '"' else Type.MSTR
         return p[0]
 
     def p_expr_bool(self, p):
         '''expr : TRUE
                 | FALSE'''
         p[0] = BooleanNode(value=p[1], lineno=self.lexer.lineno)
-        p[0].type = 'BOOL'
+        p[0].type = Type.BOOL
         return p[0]
 
     def p_expr_null(self, p):
         '''expr : NULL'''
         p[0] = NullNode(lineno=self.lexer.lineno)
-        p[0].type = 'NULL'
+        p[0].type = Type.NULL
         return p[0]
 
     def p_expr_parens(self, p):
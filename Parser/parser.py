@@ -2,7 +2,13 @@ import ply.yacc as yacc
 
 class Parser(object):
     def __init__(self, grammar):
+        self.grammar = grammar
         self.parser = yacc.yacc(module=grammar, debug=True) 
 
     def build(self, data):
-        return self.parser.parse(data, debug=False)
+        # The lexer is shared, so line numbers must restart for every input;
+        # calls left over from a failed parse must not leak into this one
+        lexer = self.grammar.lexer
+        lexer.lineno = 1
+        self.grammar.calls = {}
+        return self.parser.parse(data, lexer=lexer, debug=False)
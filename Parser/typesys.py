@@ -0,0 +1,61 @@
+class Type:
+    """Type ids shared by the grammar, analyzer and symbol table
+
+    Types are small ints, so checks are integer compares and per-node type
+    tables can be plain int arrays. The constants here are the base types;
+    ids from 16 up are left free for vector and function types with
+    element/parameter information, which the language does not have yet.
+    ANY is only used for builtin parameters that take a value of any type.
+    No id is 0, so a type id is always truthy and None still means
+    "unknown". Plain class attributes rather than an Enum:
+    looking up an Enum member costs several times more than the compare.
+    """
+    INT = 1
+    VECTOR = 2
+    STR = 3
+    MSTR = 4
+    BOOL = 5
+    NULL = 6
+    ANY = 7
+    FUNCTION = 8
+
+
+_BASE_NAMES = {
+    Type.INT: 'int',
+    Type.VECTOR: 'vector',
+    Type.STR: 'str',
+    Type.MSTR: 'mstr',
+    Type.BOOL: 'bool',
+    Type.NULL: 'null',
+    Type.ANY: 'any',
+    Type.FUNCTION: 'function',
+}
+
+# Source spellings of the base types; 'string' is accepted for 'str' and
+# diagnostics call both 'str'
+TYPE_NAMES = {
+    'int': Type.INT,
+    'vector': Type.VECTOR,
+    'str': Type.STR,
+    'string': Type.STR,
+    'mstr': Type.MSTR,
+    'bool': Type.BOOL,
+    'null': Type.NULL,
+}
+
+
+def parse_type(name):
+    """Type id for a type name from the source, None if it is not a type"""
+    return TYPE_NAMES.get(name)
+
+
+def base_type(type_id):
+    """The base Type of a type id; every id is a base type for now"""
+    return type_id
+
+
+def type_name(type_id):
+    """Readable name of a type id, as used in diagnostics"""
+    if type_id is None:
+        return 'unknown'
+    return _BASE_NAMES[type_id]
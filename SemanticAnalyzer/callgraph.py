@@ -0,0 +1,201 @@
+from Parser.ast import *
+
+# Functions the language provides; they have no body and call nothing
+BUILTINS = ('list', 'length', 'scan', 'print', 'exit')
+
+# Attributes that never lead to a call
+_SKIPPED = ('lineno', 'binding', 'resolved', 'children', 'calls')
+_PRIMITIVES = (str, int, float, bool, type(None))
+
+
+def function_calls(func):
+    """Names called from a function's body, each once, in a stable order
+
+    Uses the `calls` list the grammar records on function nodes when it is
+    there, and walks the body otherwise.
+    """
+    recorded = getattr(func, 'calls', None)
+    if recorded is not None:
+        return list(recorded)
+    calls = {}
+    stack = [func]
+    while stack:
+        node = stack.pop()
+        if node.__class__ is list:
+            stack.extend(node)
+            continue
+        if node.__class__ is FunctionCallNode:
+            calls[node.iden] = None
+        stack.extend(value for field, value in node.__dict__.items()
+                     if field not in _SKIPPED and not isinstance(value, _PRIMITIVES))
+    return list(calls)
+
+
+def function_callees(func):
+    """Names of all functions called from a function's body"""
+    return set(function_calls(func))
+
+
+class CallGraph:
+    """Whole-program call graph built from FunctionCallNodes
+
+    Nodes are function names: every defined function plus the builtins,
+    which are leaves. A call to a name that is neither stays an edge, so
+    callers() still finds it, but it has no node of its own. A function
+    defined twice gets the union of both definitions' calls.
+    """
+
+    def __init__(self):
+        self.functions = {}  # name -> first FunctionNode defining it
+        self.calls = {}      # name -> [callee name, ...] for every node
+        self._callers = None
+        self._sccs = None
+        self._recursive = None
+
+    @classmethod
+    def build(cls, ast_root):
+        """Call graph of a program"""
+        graph = cls()
+        for name in BUILTINS:
+            graph.calls[name] = []
+        for func in program_functions(ast_root):
+            graph.add_function(func)
+        return graph
+
+    def add_function(self, func):
+        self.add_calls(func.iden, function_calls(func), func)
+
+    def add_calls(self, name, callees, definition=None):
+        """Add a function by name and the names it calls
+
+        definition is what functions maps the name to: the FunctionNode, or
+        anything else that defines it when the graph is not built from an AST.
+        """
+        if name in self.functions:
+            calls = self.calls[name]
+            calls.extend(callee for callee in callees if callee not in calls)
+        else:
+            self.functions[name] = definition
+            self.calls[name] = list(callees)
+        self._callers = self._sccs = self._recursive = None
+
+    def is_builtin(self, name):
+        return name in BUILTINS and name not in self.functions
+
+    def callees(self, name):
+        """Names a function calls directly"""
+        return list(self.calls.get(name, ()))
+
+    def callers(self, name):
+        """Functions that call `name` directly, in source order"""
+        if self._callers is None:
+            self._callers = {}
+            for caller, callees in self.calls.items():
+                for callee in callees:
+                    self._callers.setdefault(callee, []).append(caller)
+        return list(self._callers.get(name, ()))
+
+    def reachable(self, roots=None):
+        """Names reachable from roots (default: main), roots included
+
+        A program without main is treated as a library: every function
+        counts as reachable.
+        """
+        if roots is None:
+            if 'main' not in self.functions:
+                return set(self.calls)
+            roots = ('main',)
+        seen = set()
+        stack = [name for name in roots if name in self.calls]
+        while stack:
+            name = stack.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            stack.extend(callee for callee in self.calls[name]
+                         if callee in self.calls and callee not in seen)
+        return seen
+
+    def unreachable(self, roots=None):
+        """Defined functions that roots (default: main) can never call"""
+        live = self.reachable(roots)
+        return [name for name in self.functions if name not in live]
+
+    def sccs(self):
+        """Strongly connected components, callees before their callers
+
+        Iterative Tarjan over the defined functions and builtins; each
+        component is a list of names. A component with more than one name,
+        or a function calling itself, is recursion.
+        """
+        if self._sccs is not None:
+            return self._sccs
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        components = []
+        for root in self.calls:
+            if root in index:
+                continue
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.calls[root]))]
+            while work:
+                name, callees = work[-1]
+                for callee in callees:
+                    if callee not in self.calls:
+                        continue
+                    if callee not in index:
+                        index[callee] = low[callee] = len(index)
+                        stack.append(callee)
+                        on_stack.add(callee)
+                        work.append((callee, iter(self.calls[callee])))
+                        break
+                    if callee in on_stack:
+                        low[name] = min(low[name], index[callee])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[name])
+                    if low[name] == index[name]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == name:
+                                break
+                        components.append(component)
+        self._sccs = components
+        return components
+
+    def is_recursive(self, name):
+        """Whether a function can call itself, directly or through others"""
+        if self._recursive is None:
+            self._recursive = {member for component in self.sccs() if len(component) > 1
+                               for member in component}
+            self._recursive.update(caller for caller, callees in self.calls.items()
+                                   if caller in callees)
+        return name in self._recursive
+
+
+def program_functions(ast_root):
+    """Function definitions of a program, in source order"""
+    functions = getattr(ast_root, 'function', None)
+    if not functions:
+        return []
+    if isinstance(functions, list):
+        return [func for func in functions if func]
+    return [functions]
+
+
+def call_graph(ast_root):
+    """The program's call graph, built once and kept on the AST root"""
+    graph = getattr(ast_root, 'callgraph', None)
+    if graph is None:
+        graph = CallGraph.build(ast_root)
+        ast_root.callgraph = graph
+    return graph
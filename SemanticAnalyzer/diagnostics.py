@@ -0,0 +1,104 @@
+import json
+import sys
+from enum import Enum
+
+
+class Severity(Enum):
+    """How serious a diagnostic is"""
+    ERROR = 'error'
+    WARNING = 'warning'
+    NOTE = 'note'
+
+
+class SemanticError:
+    """Represents a semantic error"""
+    def __init__(self, message: str, lineno: int = None, function_name: str = None,
+                 severity: Severity = Severity.ERROR):
+        self.message = message
+        self.lineno = lineno
+        self.function_name = function_name
+        self.severity = severity
+
+    def __str__(self):
+        label = self.severity.value.capitalize()
+        if self.function_name:
+            return f"{label}: function '{self.function_name}': {self.message}"
+        return f"{label}: {self.message}"
+
+    def __eq__(self, other):
+        """Compare errors to avoid duplicates
+
+        The same message reported twice in one function is a duplicate
+        even when it comes from a different line.
+        """
+        if not isinstance(other, SemanticError):
+            return False
+        return (self.message == other.message and
+                self.function_name == other.function_name and
+                self.severity == other.severity)
+
+    def __hash__(self):
+        """Make errors hashable for set operations"""
+        return hash((self.message, self.function_name, self.severity))
+
+    def to_dict(self):
+        return {
+            'severity': self.severity.value,
+            'message': self.message,
+            'lineno': self.lineno,
+            'function': self.function_name,
+        }
+
+
+class TooManyErrors(Exception):
+    """Raised when the error cap is reached to stop analysis early"""
+
+
+class Diagnostics:
+    """Collects diagnostics, dropping duplicates in O(1) per report
+
+    max_errors caps the number of errors kept; reporting the last one
+    raises TooManyErrors so the caller can stop analysing.
+    """
+    def __init__(self, max_errors: int = None):
+        self.max_errors = max_errors
+        self.items = []
+        self._seen = set()
+        self.error_count = 0
+
+    def report(self, message: str, lineno: int = None, function_name: str = None,
+               severity: Severity = Severity.ERROR):
+        """Record a diagnostic unless an identical one was already seen"""
+        diagnostic = SemanticError(message, lineno, function_name, severity)
+        if diagnostic in self._seen:
+            return None
+        self._seen.add(diagnostic)
+        self.items.append(diagnostic)
+        if severity is Severity.ERROR:
+            self.error_count += 1
+            if self.max_errors and self.error_count >= self.max_errors:
+                raise TooManyErrors(self.error_count)
+        return diagnostic
+
+    def merge(self, diagnostics):
+        """Report diagnostics collected elsewhere, in their original order"""
+        for d in diagnostics:
+            self.report(d.message, d.lineno, d.function_name, d.severity)
+
+    @property
+    def errors(self):
+        return [d for d in self.items if d.severity is Severity.ERROR]
+
+    def format(self, fmt='text', header=None):
+        """Render every diagnostic as one text block or one JSON document"""
+        if fmt == 'json':
+            return json.dumps([d.to_dict() for d in self.items], indent=2) + '\n'
+        if fmt != 'text':
+            raise ValueError(f"unknown diagnostics format '{fmt}'")
+        lines = [header] if header else []
+        lines.extend(str(d) for d in self.items)
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def write(self, stream=None, fmt='text', header=None):
+        """Write all diagnostics to stream (stdout by default) in one call"""
+        (stream or sys.stdout).write(self.format(fmt, header))
@@ -0,0 +1,235 @@
+from Parser.ast import *
+from .callgraph import function_callees
+from .diagnostics import Diagnostics, SemanticError, Severity, TooManyErrors
+from .semantic_analyzer import SemanticAnalyzer
+from .typetable import TypeTable
+
+# Attributes that change without the function's meaning changing
+_FINGERPRINT_SKIPPED = ('lineno', 'binding', 'resolved', 'children', 'calls')
+_PRIMITIVES = (str, int, float, bool, type(None))
+_PRIMITIVE_CLASSES = frozenset(_PRIMITIVES)
+
+
+def function_fingerprint(func):
+    """Hash of a function's signature and body, ignoring line numbers
+
+    Every node contributes its class, its primitive field values and the
+    names of its child fields, and lists contribute their length, so any
+    edit to the tree changes the hash. Hashes are only compared within one
+    process, so the built-in hash is enough.
+    """
+    parts = []
+    append = parts.append
+    stack = [func]
+    while stack:
+        node = stack.pop()
+        if node.__class__ is list:
+            append(len(node))
+            stack.extend(node)
+            continue
+        append(node.__class__.__name__)
+        for field, value in node.__dict__.items():
+            if field in _FINGERPRINT_SKIPPED:
+                continue
+            if isinstance(value, _PRIMITIVES):
+                append(value)
+            else:
+                append(field)
+                stack.append(value)
+    return hash(tuple(parts))
+
+
+def function_nodes(func):
+    """Every node of a function, in an order that only depends on its shape
+
+    Two functions with the same fingerprint list their nodes in the same
+    order, so a node's index names it across parses. Fields are followed
+    as function_fingerprint() does; the AST holds no subclasses of the
+    primitive types, so their classes are enough to skip them.
+    """
+    nodes = []
+    append = nodes.append
+    stack = [func]
+    push = stack.append
+    while stack:
+        node = stack.pop()
+        if node.__class__ is list:
+            stack.extend(node)
+            continue
+        append(node)
+        for field, value in node.__dict__.items():
+            if value.__class__ not in _PRIMITIVE_CLASSES and field not in _FINGERPRINT_SKIPPED:
+                push(value)
+    return nodes
+
+
+def source_fingerprints(source, functions):
+    """Hash each function's slice of the source text, ignoring where it sits
+
+    A function's lineno is where the parser reduced it, which is its last
+    line or the line of the token after it, so the slice for a function runs
+    from the previous function's lineno to its own, both inclusive. The
+    slices overlap on boundary lines but cover the whole file, so any edit
+    changes the fingerprint of the function it touches. This is much cheaper
+    than walking the AST, at the cost of treating whitespace and comment
+    edits as changes.
+    """
+    lines = source.split('\n')
+    fingerprints = []
+    start = 0
+    for func in functions:
+        if func.lineno is None:
+            fingerprints.append(function_fingerprint(func))
+            continue
+        fingerprints.append(hash('\n'.join(lines[start:func.lineno])))
+        start = func.lineno - 1
+    return fingerprints
+
+
+class FunctionResult:
+    """Cached analysis of one function"""
+    __slots__ = ('fingerprint', 'signature', 'callees', 'diagnostics', 'scope',
+                 'types', 'bindings')
+
+    def __init__(self, fingerprint, signature, callees, diagnostics, scope, types, bindings):
+        self.fingerprint = fingerprint
+        self.signature = signature      # (return_type, params)
+        self.callees = callees          # names of called functions
+        self.diagnostics = diagnostics  # with linenos relative to the function
+        self.scope = scope              # function scope: local names and types
+        self.types = types              # TypeTable keyed by index in function_nodes()
+        self.bindings = bindings        # index in function_nodes() -> node.binding
+
+
+class IncrementalAnalyzer:
+    """Semantic analysis that only re-checks what an edit can affect
+
+    Each function's diagnostics and scope are cached under a fingerprint of
+    its AST. On the next analyze() a function is re-checked only if its own
+    fingerprint changed or the signature of a function it calls changed
+    (including the callee appearing or disappearing); everything else is
+    reused. Line numbers are cached relative to the function so edits
+    elsewhere in the file do not invalidate it.
+
+    Passing the source text the AST was parsed from lets analyze()
+    fingerprint functions by their text (see source_fingerprints) instead of
+    walking their ASTs. Stick to one mode per instance: the two kinds of
+    fingerprint never match each other.
+
+    Each function's part of the TypeTable and the bindings of its
+    identifiers are cached too, keyed by the node's index in
+    function_nodes(), and put back on the nodes of the new parse, so the
+    AST comes out typed and resolved as SemanticAnalyzer.analyze() leaves
+    it. Symbols of the global scope are looked up again by name.
+    """
+
+    def __init__(self, max_errors=None):
+        self.max_errors = max_errors
+        self.cache = {}
+        self.reanalyzed = []   # functions re-checked by the last analyze()
+        self.analyzer = None   # SemanticAnalyzer holding the last merged result
+
+    def analyze(self, ast_root, source=None):
+        analyzer = SemanticAnalyzer(self.max_errors)
+        functions = analyzer.collect_signatures(ast_root)
+
+        signatures = {}
+        keys = []
+        seen = {}
+        for func in functions:
+            signatures[func.iden] = analyzer.function_signature(func)
+            # Redefinitions get their own cache entries
+            seen[func.iden] = seen.get(func.iden, -1) + 1
+            keys.append((func.iden, seen[func.iden]))
+
+        old_signatures = {key[0]: result.signature for key, result in self.cache.items()}
+        changed = {name for name in signatures.keys() | old_signatures.keys()
+                   if signatures.get(name) != old_signatures.get(name)}
+
+        if source is not None:
+            fingerprints = source_fingerprints(source, functions)
+        else:
+            fingerprints = [function_fingerprint(func) for func in functions]
+
+        cache = {}
+        worker = None
+        reused = []
+        self.reanalyzed = []
+        for key, func, fingerprint in zip(keys, functions, fingerprints):
+            result = self.cache.get(key)
+            if result is None or result.fingerprint != fingerprint or result.callees & changed:
+                worker = worker or analyzer.fork()
+                result = self._analyze_function(worker, func, fingerprint, signatures[func.iden])
+                self.reanalyzed.append(func.iden)
+            else:
+                reused.append((func, result))
+            cache[key] = result
+        self.cache = cache
+
+        for key in keys:
+            result = cache[key]
+            result.scope.parent = analyzer.global_scope
+            analyzer.global_scope.children.append(result.scope)
+        # Functions checked just now annotated these very nodes
+        if worker is not None:
+            analyzer.types.merge(worker.types)
+        for func, result in reused:
+            self._restore(analyzer, func, result)
+        ast_root.resolved = True
+        ast_root.types = analyzer.types
+        try:
+            for key, func in zip(keys, functions):
+                diagnostics = [self._rebase(d, func.lineno) for d in cache[key].diagnostics]
+                if any(d.severity is Severity.ERROR for d in diagnostics):
+                    analyzer.has_sem_error = True
+                analyzer.diagnostics.merge(diagnostics)
+        except TooManyErrors:
+            analyzer.diagnostics.report(
+                f"too many errors ({self.max_errors}), analysis stopped.",
+                severity=Severity.NOTE)
+
+        self.analyzer = analyzer
+        return analyzer.errors
+
+    def _analyze_function(self, worker, func, fingerprint, signature):
+        worker.diagnostics = Diagnostics()
+        worker.visit(func)
+        scope = worker.current_scope.children.pop()
+        base = -func.lineno if func.lineno is not None else None
+        relative = [self._rebase(d, base) for d in worker.diagnostics.items]
+        types = TypeTable()
+        bindings = {}
+        for index, node in enumerate(function_nodes(func)):
+            node_type = worker.types.type_of(node)
+            if node_type is not None:
+                types.record_type(index, node_type)
+            symbol = worker.types.symbol_of(node)
+            if symbol is not None:
+                types.record_symbol(index, symbol)
+            if 'binding' in node.__dict__:
+                bindings[index] = node.binding
+        return FunctionResult(fingerprint, signature, function_callees(func), relative, scope,
+                              types, bindings)
+
+    @staticmethod
+    def _restore(analyzer, func, result):
+        """Put a function's cached types, symbols and bindings on its nodes"""
+        nodes = function_nodes(func)
+        global_scope = analyzer.global_scope
+        types = analyzer.types.types
+        for index, node_type in result.types.types.items():
+            types[nodes[index]] = node_type
+        symbols = analyzer.types.symbols
+        for index, symbol in result.types.symbols.items():
+            if symbol.depth == 0:
+                symbol = global_scope.lookup_current_scope(symbol.name) or symbol
+            symbols[nodes[index]] = symbol
+        for index, binding in result.bindings.items():
+            nodes[index].binding = binding
+
+    @staticmethod
+    def _rebase(diagnostic, offset):
+        if diagnostic.lineno is None or offset is None:
+            return diagnostic
+        return SemanticError(diagnostic.message, diagnostic.lineno + offset,
+                             diagnostic.function_name, diagnostic.severity)
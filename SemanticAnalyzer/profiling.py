@@ -0,0 +1,172 @@
+import json
+import marshal
+import sys
+from time import perf_counter
+
+# Handlers whose node is a whole source function, timed per function too
+_FUNCTION_HANDLERS = ('FunctionNode', 'FunctionWithReturnNode')
+
+
+class HandlerStats:
+    """Counters for one visit_* method"""
+    __slots__ = ('key', 'calls', 'primitive_calls', 'self_time', 'total_time',
+                 'active', 'callers')
+
+    def __init__(self, key):
+        self.key = key               # (file, line, name), as pstats keys functions
+        self.calls = 0
+        self.primitive_calls = 0     # calls that were not nested in themselves
+        self.self_time = 0.0
+        self.total_time = 0.0        # cumulative, counted once per outermost call
+        self.active = 0
+        self.callers = {}            # caller key -> [calls, self_time, total_time]
+
+
+class VisitProfiler:
+    """Opt-in timing of a visitor's visit_* methods
+
+    attach() wraps the handlers in a visitor's dispatch table, so a visitor
+    that is never attached runs exactly as before. For every handler it
+    records call counts, self time and cumulative time (recursive handlers
+    are counted once per outermost call, as cProfile does) and which
+    handler called it; handlers of whole functions also add up time per
+    source function. One profiler can be attached to several visitors,
+    e.g. the analyzer and the code generator. Pool workers started by
+    SemanticAnalyzer(jobs > 1) are separate visitors and are not timed.
+    """
+
+    def __init__(self, clock=perf_counter):
+        self.clock = clock
+        self.handlers = {}    # key -> HandlerStats
+        self.functions = {}   # (visitor class, function name) -> [visits, seconds]
+        self._stack = []      # [stats, child time] per running handler
+
+    def attach(self, visitor):
+        """Time every visit_* method of visitor from now on"""
+        prefix = type(visitor).__name__
+        for name, handler in list(visitor._handlers.items()):
+            visitor._handlers[name] = self._wrap(prefix, 'visit_' + name, handler,
+                                                 name in _FUNCTION_HANDLERS)
+        # Node classes without a handler fall back to generic_visit
+        visitor.generic_visit = self._wrap(prefix, 'generic_visit', visitor.generic_visit, False)
+        visitor._dispatch.clear()
+        return visitor
+
+    def _key(self, prefix, name, handler):
+        code = getattr(getattr(handler, '__func__', handler), '__code__', None)
+        if code is None:
+            return ('~', 0, f"{prefix}.{name}")
+        return (code.co_filename, code.co_firstlineno, f"{prefix}.{name}")
+
+    def _wrap(self, prefix, name, handler, per_function):
+        key = self._key(prefix, name, handler)
+        stats = self.handlers.get(key)
+        if stats is None:
+            stats = self.handlers[key] = HandlerStats(key)
+        clock = self.clock
+        stack = self._stack
+        functions = self.functions
+
+        def timed(node):
+            caller = stack[-1][0] if stack else None
+            frame = [stats, 0.0]
+            stack.append(frame)
+            stats.active += 1
+            start = clock()
+            try:
+                return handler(node)
+            finally:
+                elapsed = clock() - start
+                stack.pop()
+                stats.active -= 1
+                own = elapsed - frame[1]
+                stats.calls += 1
+                stats.self_time += own
+                outermost = stats.active == 0
+                if outermost:
+                    stats.primitive_calls += 1
+                    stats.total_time += elapsed
+                if stack:
+                    stack[-1][1] += elapsed
+                if caller is not None:
+                    edge = stats.callers.get(caller.key)
+                    if edge is None:
+                        edge = stats.callers[caller.key] = [0, 0.0, 0.0]
+                    edge[0] += 1
+                    edge[1] += own
+                    edge[2] += elapsed
+                if per_function:
+                    total = functions.get((prefix, node.iden))
+                    if total is None:
+                        total = functions[(prefix, node.iden)] = [0, 0.0]
+                    total[0] += 1
+                    total[1] += elapsed
+        return timed
+
+    def rows(self, sort='self'):
+        """Handler stats that were called, sorted by 'self', 'total' or 'calls'"""
+        order = {
+            'self': lambda s: s.self_time,
+            'total': lambda s: s.total_time,
+            'calls': lambda s: s.calls,
+        }[sort]
+        return sorted((s for s in self.handlers.values() if s.calls),
+                      key=order, reverse=True)
+
+    def table(self, sort='self', limit=None, functions=10):
+        """Sorted text table of the handlers, then the slowest source functions"""
+        rows = self.rows(sort)[:limit]
+        overall = sum(s.self_time for s in rows) or 1.0
+        width = max([len(s.key[2]) for s in rows] + [len('method')])
+        lines = [f"{'method':<{width}}  {'calls':>8}  {'self ms':>9}  {'total ms':>9}  {'self %':>6}"]
+        for s in rows:
+            lines.append(f"{s.key[2]:<{width}}  {s.calls:>8}  {s.self_time * 1e3:>9.2f}  "
+                         f"{s.total_time * 1e3:>9.2f}  {100 * s.self_time / overall:>6.1f}")
+        if functions and self.functions:
+            slowest = sorted(self.functions.items(), key=lambda item: item[1][1], reverse=True)
+            width = max(len(f"{owner}:{name}") for (owner, name), _ in slowest[:functions])
+            width = max(width, len('function'))
+            lines.append('')
+            lines.append(f"{'function':<{width}}  {'visits':>8}  {'total ms':>9}")
+            for (owner, name), (visits, seconds) in slowest[:functions]:
+                lines.append(f"{owner + ':' + name:<{width}}  {visits:>8}  {seconds * 1e3:>9.2f}")
+        return '\n'.join(lines) + '\n'
+
+    def print_table(self, stream=None, sort='self', limit=None, functions=10):
+        (stream or sys.stdout).write(self.table(sort, limit, functions))
+
+    def to_dict(self):
+        return {
+            'handlers': [
+                {
+                    'method': s.key[2],
+                    'file': s.key[0],
+                    'line': s.key[1],
+                    'calls': s.calls,
+                    'primitive_calls': s.primitive_calls,
+                    'self_seconds': s.self_time,
+                    'total_seconds': s.total_time,
+                }
+                for s in self.rows('self')
+            ],
+            'functions': [
+                {'visitor': owner, 'function': name, 'visits': visits, 'seconds': seconds}
+                for (owner, name), (visits, seconds) in self.functions.items()
+            ],
+        }
+
+    def dump_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def dump_stats(self, path):
+        """Write the stats in the marshal format pstats.Stats(path) loads"""
+        stats = {}
+        for s in self.handlers.values():
+            if not s.calls:
+                continue
+            callers = {key: (calls, calls, own, total)
+                       for key, (calls, own, total) in s.callers.items()}
+            stats[s.key] = (s.primitive_calls, s.calls, s.self_time, s.total_time, callers)
+        with open(path, 'wb') as f:
+            marshal.dump(stats, f)
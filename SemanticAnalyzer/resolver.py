@@ -0,0 +1,143 @@
+from Parser.ast import *
+from .symtab import *
+from .visitor import Visitor
+
+
+class Resolver(Visitor):
+    """Binds identifiers to the (scope depth, slot) of their declaration
+
+    Runs once over the AST, following the same scoping rules as the
+    semantic analyzer: a function's parameters and body share one scope and
+    a for loop opens a scope for its loop variable. Declarations
+    (FlistNode, VariableDefinitionNode, ForStatementNode) and every
+    IdentifierNode get a `binding` attribute; identifiers that do not
+    resolve to a variable get None. Slots are numbered per scope, so no two
+    variables in scope at the same point share a pair and later phases can
+    index by it instead of looking names up again. The pair is not one
+    storage location, though: sibling scopes, such as two for loops one
+    after the other, reuse the same pairs. Walking a function in source
+    order, a pair names the variable whose declaration was passed last.
+
+    SemanticAnalyzer records the same bindings while it checks the program,
+    so this pass only needs to run when the AST skipped analysis.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.current_scope = SymbolTable()
+        self.scopes = ScopeChain()
+        self.scopes.push()
+
+    def resolve(self, ast_root):
+        """Annotate the AST rooted at ast_root"""
+        self.visit(ast_root)
+        ast_root.resolved = True
+        return ast_root
+
+    def declare(self, name, lineno=None):
+        """Declare a variable in the current scope and return its binding"""
+        entry = self.current_scope.lookup_current_scope(name)
+        if entry is None:
+            entry = SymbolTableEntry(name=name, symbol_type='variable', lineno=lineno)
+            self.current_scope.define(entry)
+            self.scopes.define(entry)
+        return entry.binding
+
+    def enter_scope(self):
+        # Only the bindings are kept, so scopes can go once they are left
+        self.current_scope = self.current_scope.create_child_scope(retain=False)
+        self.scopes.push()
+
+    def exit_scope(self):
+        self.current_scope = self.current_scope.parent
+        self.scopes.pop()
+
+    def visit_list(self, items):
+        """Statement and argument lists are plain Python lists"""
+        for item in items:
+            self.visit(item)
+
+    def visit_ProgramNode(self, node):
+        self.visit(node.function)
+
+    def visit_FunctionNode(self, node):
+        self.enter_scope()
+        param = node.flist
+        while param:
+            param.binding = self.declare(param.iden, param.lineno)
+            param = getattr(param, 'next_param', None)
+        self.visit(getattr(node, 'func_choice', None))
+        self.visit(getattr(node, 'expr', None))
+        self.exit_scope()
+
+    visit_FunctionWithReturnNode = visit_FunctionNode
+
+    def visit_BodyNode(self, node):
+        self.visit(node.body)
+
+    def visit_FunctionBodyNode(self, node):
+        self.visit(node.stmt)
+        self.visit(node.body)
+
+    def visit_VariableDefinitionNode(self, node):
+        # The initializer is resolved before the name comes into scope
+        self.visit(node.defvar_choice)
+        node.binding = self.declare(node.iden, node.lineno)
+
+    def visit_ForStatementNode(self, node):
+        self.enter_scope()
+        node.binding = self.declare(node.iden, node.lineno)
+        self.visit(node.expr1)
+        self.visit(node.expr2)
+        self.visit(node.stmt)
+        self.exit_scope()
+
+    def visit_AssignmentNode(self, node):
+        self.visit(node.right)
+        self.visit(node.left)
+
+    def visit_IdentifierNode(self, node):
+        entry = self.scopes.lookup(node.iden_value)
+        node.binding = entry.binding if entry else None
+
+    def visit_FunctionCallNode(self, node):
+        self.visit(node.clist)
+
+    def visit_ClistNode(self, node):
+        self.visit(node.expr)
+
+    def visit_ArrayIndexingNode(self, node):
+        self.visit(node.array_expr)
+        self.visit(node.index_expr)
+
+    def visit_BinaryOperationNode(self, node):
+        self.visit(node.expr1)
+        self.visit(node.expr2)
+
+    visit_ComparisonOperationNode = visit_BinaryOperationNode
+
+    def visit_IfStatementNode(self, node):
+        self.visit(node.expr)
+        self.visit(node.stmt)
+        self.visit(node.else_choice)
+
+    def visit_WhileStatementNode(self, node):
+        self.visit(node.expr)
+        self.visit(node.stmt)
+
+    def visit_ReturnStatementNode(self, node):
+        self.visit(node.expr)
+
+    visit_ExpressionStatementNode = visit_ReturnStatementNode
+    visit_ParenthesisNode = visit_ReturnStatementNode
+    visit_UnaryOperationNode = visit_ReturnStatementNode
+    visit_PrintStatementNode = visit_ReturnStatementNode
+
+    def visit_NumberNode(self, node):
+        """Literals and type annotations hold no identifiers"""
+        pass
+
+    visit_StringNode = visit_NumberNode
+    visit_BooleanNode = visit_NumberNode
+    visit_NullNode = visit_NumberNode
+    visit_TypeNode = visit_NumberNode
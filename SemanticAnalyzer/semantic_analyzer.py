@@ -1,44 +1,56 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 from Parser.ast import *
+from Parser.typesys import Type, parse_type, type_name
 from .symtab import *
 from .visitor import Visitor
+from .diagnostics import Diagnostics, SemanticError, Severity, TooManyErrors
+from .typetable import TypeTable
+from .callgraph import call_graph, program_functions
 
-class SemanticError:
-    """Represents a semantic error"""
-    def __init__(self, message: str, lineno: int = None, function_name: str = None):
-        self.message = message
-        self.lineno = lineno
-        self.function_name = function_name
+# What happens to a scope when analysis leaves it
+RETAIN_SCOPES = (
+    'all',        # keep the whole scope tree under global_scope
+    'functions',  # keep each function's own scope, drop nested block scopes
+    'none',       # keep only the global scope
+)
 
-        
-    def __str__(self):
-        if self.function_name:
-            return f"Error: function '{self.function_name}': {self.message}"
-        return f"Error: {self.message}"
-    
-    def __eq__(self, other):
-        """Compare errors to avoid duplicates"""
-        if not isinstance(other, SemanticError):
-            return False
-        return (self.message == other.message and 
-                self.lineno == other.lineno and 
-                self.function_name == other.function_name)
-    
-    def __hash__(self):
-        """Make errors hashable for set operations"""
-        return hash((self.message, self.lineno, self.function_name))
 
+class SemanticAnalyzer(Visitor):
+    """Main semantic analyzer using visitor pattern
 
+    With jobs > 1, function bodies are checked in a pool of `jobs` workers
+    ('thread' or 'process' executor) after the signature pre-pass. With
+    prune_unreachable set, only functions main can reach (see CallGraph)
+    have their bodies checked; every signature is still defined.
+    retain_scopes (see RETAIN_SCOPES) decides which scopes stay reachable
+    from global_scope after analysis; the rest are freed as soon as they
+    are left, which bounds peak memory by the deepest nesting instead of
+    the program size.
 
-class SemanticAnalyzer(Visitor):
-    """Main semantic analyzer using visitor pattern"""
-    
-    def __init__(self):
-        self.global_scope = SymbolTable()
+    Every type the analyzer computes and every symbol a node resolves to is
+    kept in `types` (a TypeTable), which analyze() also attaches to the AST
+    root so code generation can use it without re-running inference.
+    """
+    
+    def __init__(self, max_errors=None, jobs=1, executor='thread', prune_unreachable=False,
+                 retain_scopes='all'):
+        super().__init__()
+        if retain_scopes not in RETAIN_SCOPES:
+            raise ValueError(f"unknown scope retention policy '{retain_scopes}'")
+        self.retain_scopes = retain_scopes
+        self.global_scope = SymbolTable(name='global')
         self.current_scope = self.global_scope
+        self.scopes = ScopeChain()  # O(1) name lookup over the active scopes
+        self.scopes.push()
         self.current_function = None
-        self.errors = []
-        self.valid_types = {'int', 'vector', 'str', 'string', 'mstr', 'bool', 'null'}
+        self.diagnostics = Diagnostics(max_errors)
+        self.types = TypeTable()
+        self._node_types = self.types.types  # written directly by visit()
         self.has_sem_error = False
+        self.jobs = jobs
+        self.executor = executor
+        self.prune_unreachable = prune_unreachable
         self._add_builtin_functions()
     
 
@@ -48,146 +60,185 @@ class SemanticAnalyzer(Visitor):
         list_func = SymbolTableEntry(
             name='list', 
             symbol_type='function',
-            params=[('size', 'int')],
-            return_type='vector'
+            params=[('size', Type.INT)],
+            return_type=Type.VECTOR
         )
-        self.global_scope.define(list_func)
+        self.define(list_func, self.global_scope)
         
         # length(vector) -> int
         length_func = SymbolTableEntry(
             name='length',
             symbol_type='function', 
-            params=[('array', 'vector')],
-            return_type='int'
+            params=[('array', Type.VECTOR)],
+            return_type=Type.INT
         )
-        self.global_scope.define(length_func)
+        self.define(length_func, self.global_scope)
         
         # print(any) -> null
         print_func = SymbolTableEntry(
             name='print',
             symbol_type='function',
-            params=[('value', 'any')],
-            return_type='null'
+            params=[('value', Type.ANY)],
+            return_type=Type.NULL
         )
-        self.global_scope.define(print_func)
+        self.define(print_func, self.global_scope)
 
          # scan() -> int
         scan_func = SymbolTableEntry(
             name='scan',
             symbol_type='function',
             params=[],
-            return_type='int'
+            return_type=Type.INT
         )
-        self.global_scope.define(scan_func)
+        self.define(scan_func, self.global_scope)
 
         # exit(n: int) -> null
         exit_func = SymbolTableEntry(
             name='exit',
             symbol_type='function',
-            params=[('n', 'int')],
-            return_type='null'
+            params=[('n', Type.INT)],
+            return_type=Type.NULL
         )
-        self.global_scope.define(exit_func)
+        self.define(exit_func, self.global_scope)
 
         # تعریف متغیر null
         null_var = SymbolTableEntry(
             name='null',
             symbol_type='variable',
             params=[],
-            return_type='null'
+            return_type=Type.NULL
         )
-        self.global_scope.define(null_var)
-    
-    def add_error(self, message: str, lineno: int = None):
-        """Add a semantic error (avoiding duplicates)"""
-        error = SemanticError(message, lineno, self.current_function)
-        self.has_sem_error = True
-        # Check for duplicates more thoroughly
-        for existing_error in self.errors:
-            if (existing_error.message == error.message and 
-                existing_error.function_name == error.function_name):
-                return  # Don't add duplicate
-        self.errors.append(error)
-    
-    def enter_scope(self):
-        """Enter a new scope"""
-        self.current_scope = self.current_scope.create_child_scope()
+        self.define(null_var, self.global_scope)
+    
+    def visit(self, node):
+        """Visit a node and record the type it evaluated to
+
+        Same dispatch as Visitor.visit, inlined together with the type
+        table update (TypeTable.record_type) since this runs once per node.
+        """
+        if node is None:
+            return None
+        try:
+            handler = self._dispatch[node.__class__]
+        except KeyError:
+            handler = self._resolve(node.__class__)
+        node_type = handler(node)
+        if node_type is not None:
+            self._node_types[node] = node_type
+        return node_type
+    
+    @property
+    def errors(self):
+        return self.diagnostics.errors
+    
+    def add_error(self, message: str, lineno: int = None, severity: Severity = Severity.ERROR):
+        """Add a semantic error (duplicates within a function are dropped)"""
+        if severity is Severity.ERROR:
+            self.has_sem_error = True
+        self.diagnostics.report(message, lineno, self.current_function, severity)
+    
+    def define(self, entry, scope=None, node=None):
+        """Define a symbol in a scope (the current one by default)
+
+        When the declaring node is given it is bound to the entry's
+        (scope depth, slot), as the Resolver would do.
+        """
+        (scope or self.current_scope).define(entry)
+        self.scopes.define(entry)
+        if node is not None:
+            node.binding = entry.binding
+            self.types.record_symbol(node, entry)
+    
+    def bind(self, node, entry):
+        """Bind an identifier to the slot of the variable it names"""
+        if entry and entry.symbol_type == 'variable':
+            node.binding = entry.binding
+        else:
+            node.binding = None
+        if entry:
+            self.types.record_symbol(node, entry)
+    
+    def enter_scope(self, name=None):
+        """Enter a new scope, kept afterwards if the retention policy says so"""
+        retain = (self.retain_scopes == 'all' or
+                  self.retain_scopes == 'functions' and self.current_scope.depth == 0)
+        self.current_scope = self.current_scope.create_child_scope(name, retain)
+        self.scopes.push()
     
     def exit_scope(self):
         """Exit current scope"""
         if self.current_scope.parent:
             self.current_scope = self.current_scope.parent
+            self.scopes.pop()
     
-    def visit(self, node):
-        """Main visit method that dispatches to specific visit methods"""
-        if node is None:
-            return None
-            
-        method_name = f'visit_{type(node).__name__}'
-        visitor = getattr(self, method_name, self.generic_visit)
-        return visitor(node)
-    
-    def generic_visit(self, node):
-        """Generic visit for nodes without specific handlers"""
-        if hasattr(node, 'children'):
-            for child in node.children:
-                if child:
-                    self.visit(child)
-        return None
+    def program_functions(self, node):
+        """Function definitions of a program node, in source order"""
+        return program_functions(node)
+    
+    def collect_signatures(self, node):
+        """Pre-pass: define every function signature in global scope up front
+
+        Bodies can then be checked in any order (or concurrently) since calls
+        no longer depend on the callee having been visited first.
+        """
+        functions = self.program_functions(node)
+        for func in functions:
+            return_type, params = self.function_signature(func)
+            func_entry = SymbolTableEntry(
+                name=func.iden,
+                symbol_type='function',
+                params=params,
+                return_type=return_type,
+                lineno=func.lineno
+            )
+            self.define(func_entry, self.global_scope)
+        return functions
+    
+    def live_functions(self, node, functions):
+        """The functions whose bodies get checked"""
+        if not self.prune_unreachable:
+            return functions
+        live = call_graph(node).reachable()
+        return [func for func in functions if func.iden in live]
     
     def visit_ProgramNode(self, node):
         """Visit program node (root)"""
-        if node.function:
-            if isinstance(node.function, list):
-                for func in node.function:
-                    self.visit(func)
-            else:
-                self.visit(node.function)
+        functions = self.collect_signatures(node)
+        for func in self.live_functions(node, functions):
+            self.visit(func)
         return None
     
-    def visit_FunctionNode(self, node):
-        """Visit function definition node"""
-        func_name = node.iden
-        old_function = self.current_function
-        self.current_function = func_name
-        
-        # Check return type validity
-        return_type = node.type.type_value if hasattr(node.type, 'type_value') else str(node.type)
-        if return_type not in self.valid_types:
-            # Create the proper error message format
-            valid_types_msg = ', '.join(["'int'", "'string'", "'vector'"])  # Based on expected output
-            self.add_error(f"wrong type '{return_type}' found. types must be one of the following {valid_types_msg}", node.lineno)
+    def function_signature(self, node, check=False):
+        """Extract (return_type, params) of a function node as type ids
+
+        With check set, unknown type names are reported.
+        """
+        return_type = self.declared_type(node.type, node.lineno, check)
         
         # Extract parameters
         params = []
         current_param = node.flist
         while current_param:
             param_name = current_param.iden
-            param_type = current_param.type.type_value if hasattr(current_param.type, 'type_value') else str(current_param.type)
-            
-            # Check parameter type validity
-            if param_type not in self.valid_types:
-                # Create the proper error message format
-                valid_types_msg = ', '.join(["'int'", "'string'", "'vector'"])  # Based on expected output
-                self.add_error(f"wrong type '{param_type}' found. types must be one of the following {valid_types_msg}", current_param.lineno)
-            
+            param_type = self.declared_type(current_param.type, current_param.lineno, check)
             params.append((param_name, param_type))
             current_param = getattr(current_param, 'next_param', None)
         
-        # Define function in global scope
-        func_entry = SymbolTableEntry(
-            name=func_name,
-            symbol_type='function',
-            params=params,
-            return_type=return_type,
-            lineno=node.lineno
-        )
-        self.global_scope.define(func_entry)
-        
-        # Enter function scope
-        self.enter_scope()
-        
-        # Add parameters to function scope
+        return return_type, params
+    
+    def declared_type(self, type_node, lineno=None, check=False):
+        """Type id of a type annotation (None for an unknown type name)"""
+        name = type_node.type_value if hasattr(type_node, 'type_value') else str(type_node)
+        type_id = parse_type(name)
+        if check and type_id is None:
+            valid_types_msg = ', '.join(["'int'", "'string'", "'vector'"])  # Based on expected output
+            self.add_error(f"wrong type '{name}' found. types must be one of the following {valid_types_msg}", lineno)
+        return type_id
+    
+    def enter_function(self, node, params):
+        """Enter a function's scope and define its parameters in it"""
+        self.enter_scope(node.iden)
+        param_node = node.flist
         for param_name, param_type in params:
             param_entry = SymbolTableEntry(
                 name=param_name,
@@ -196,7 +247,16 @@ class SemanticAnalyzer(Visitor):
                 is_initialized=True,  # Parameters are initialized
                 lineno=node.lineno
             )
-            self.current_scope.define(param_entry)
+            self.define(param_entry, node=param_node)
+            param_node = param_node.next_param
+    
+    def visit_FunctionNode(self, node):
+        """Visit function definition node (its signature is already defined)"""
+        old_function = self.current_function
+        self.current_function = node.iden
+        
+        return_type, params = self.function_signature(node, check=True)
+        self.enter_function(node, params)
         
         # Visit function body
         if node.func_choice:
@@ -210,60 +270,16 @@ class SemanticAnalyzer(Visitor):
     
     def visit_FunctionWithReturnNode(self, node):
         """Visit function with return expression"""
-        func_name = node.iden
         old_function = self.current_function
-        self.current_function = func_name
-        
-        # Check return type validity
-        return_type = node.type.type_value if hasattr(node.type, 'type_value') else str(node.type)
-        if return_type not in self.valid_types:
-            # Create the proper error message format
-            valid_types_msg = ', '.join(["'int'", "'string'", "'vector'"])  # Based on expected output
-            self.add_error(f"wrong type '{return_type}' found. types must be one of the following {valid_types_msg}", node.lineno)
-        
-        # Extract parameters
-        params = []
-        current_param = node.flist
-        while current_param:
-            param_name = current_param.iden
-            param_type = current_param.type.type_value if hasattr(current_param.type, 'type_value') else str(current_param.type)
-            
-            if param_type not in self.valid_types:
-                # Create the proper error message format
-                valid_types_msg = ', '.join(["'int'", "'string'", "'vector'"])  # Based on expected output
-                self.add_error(f"wrong type '{param_type}' found. types must be one of the following {valid_types_msg}", current_param.lineno)
-            
-            params.append((param_name, param_type))
-            current_param = getattr(current_param, 'next_param', None)
-        
-        # Define function in global scope
-        func_entry = SymbolTableEntry(
-            name=func_name,
-            symbol_type='function',
-            params=params,
-            return_type=return_type,
-            lineno=node.lineno
-        )
-        self.global_scope.define(func_entry)
+        self.current_function = node.iden
         
-        # Enter function scope
-        self.enter_scope()
-        
-        # Add parameters to function scope
-        for param_name, param_type in params:
-            param_entry = SymbolTableEntry(
-                name=param_name,
-                symbol_type='variable',
-                data_type=param_type,
-                is_initialized=True,
-                lineno=node.lineno
-            )
-            self.current_scope.define(param_entry)
+        return_type, params = self.function_signature(node, check=True)
+        self.enter_function(node, params)
         
         # Visit return expression and check type
         expr_type = self.visit(node.expr)
         if expr_type and expr_type != return_type:
-            self.add_error(f"wrong return type. expected '{return_type}' but got '{expr_type}'.", node.lineno)
+            self.add_error(f"wrong return type. expected '{type_name(return_type)}' but got '{type_name(expr_type)}'.", node.lineno)
         
         # Exit function scope
         self.exit_scope()
@@ -285,13 +301,7 @@ class SemanticAnalyzer(Visitor):
     def visit_VariableDefinitionNode(self, node):
         """Visit variable definition"""
         var_name = node.iden
-        var_type = node.type.type_value if hasattr(node.type, 'type_value') else str(node.type)
-        
-        # Check type validity
-        if var_type not in self.valid_types:
-            # Create the proper error message format
-            valid_types_msg = ', '.join(["'int'", "'string'", "'vector'"])  # Based on expected output
-            self.add_error(f"wrong type '{var_type}' found. types must be one of the following {valid_types_msg}", node.lineno)
+        var_type = self.declared_type(node.type, node.lineno, check=True)
         
         # Check if variable already defined in current scope
         if self.current_scope.lookup_current_scope(var_name):
@@ -303,7 +313,7 @@ class SemanticAnalyzer(Visitor):
         if is_initialized:
             init_type = self.visit(node.defvar_choice)
             if init_type and init_type != var_type:
-                self.add_error(f"variable '{var_name}' expected to be of type '{var_type}' but it is '{init_type}' instead.", node.lineno)
+                self.add_error(f"variable '{var_name}' expected to be of type '{type_name(var_type)}' but it is '{type_name(init_type)}' instead.", node.lineno)
         
         # Define variable
         var_entry = SymbolTableEntry(
@@ -313,7 +323,7 @@ class SemanticAnalyzer(Visitor):
             is_initialized=is_initialized,
             lineno=node.lineno
         )
-        self.current_scope.define(var_entry)
+        self.define(var_entry, node=node)
         
         return var_type
     
@@ -325,7 +335,8 @@ class SemanticAnalyzer(Visitor):
         # Handle left side assignment
         if isinstance(node.left, IdentifierNode):
             var_name = node.left.iden_value
-            var_entry = self.current_scope.lookup(var_name)
+            var_entry = self.scopes.lookup(var_name)
+            self.bind(node.left, var_entry)
             
             if not var_entry:
                 self.add_error(f"variable '{var_name}' is not defined.", node.lineno)
@@ -337,7 +348,7 @@ class SemanticAnalyzer(Visitor):
             
             # Check type compatibility
             if right_type and right_type != var_entry.data_type:
-                self.add_error(f"variable '{var_name}' expected to be of type '{var_entry.data_type}' but it is '{right_type}' instead.", node.lineno)
+                self.add_error(f"variable '{var_name}' expected to be of type '{type_name(var_entry.data_type)}' but it is '{type_name(right_type)}' instead.", node.lineno)
             
             # Mark as initialized
             var_entry.is_initialized = True
@@ -346,18 +357,19 @@ class SemanticAnalyzer(Visitor):
             array_type = self.visit(node.left.array_expr)
             index_type = self.visit(node.left.index_expr)
             
-            if array_type and array_type != 'vector':
-                self.add_error(f"expected array to be of type 'vector', but got '{array_type}' instead.", node.lineno)
+            if array_type and array_type != Type.VECTOR:
+                self.add_error(f"expected array to be of type 'vector', but got '{type_name(array_type)}' instead.", node.lineno)
             
-            if index_type and index_type != 'int':
-                self.add_error(f"array index must be of type 'int', but got '{index_type}' instead.", node.lineno)
+            if index_type and index_type != Type.INT:
+                self.add_error(f"array index must be of type 'int', but got '{type_name(index_type)}' instead.", node.lineno)
         
         return right_type
     
     def visit_IdentifierNode(self, node):
         """Visit identifier node"""
         var_name = node.iden_value
-        var_entry = self.current_scope.lookup(var_name)
+        var_entry = self.scopes.lookup(var_name)
+        self.bind(node, var_entry)
         
         if not var_entry:
             self.add_error(f"variable '{var_name}' is not defined.", node.lineno)
@@ -373,7 +385,7 @@ class SemanticAnalyzer(Visitor):
     def visit_FunctionCallNode(self, node):
         """Visit function call"""
         func_name = node.iden
-        func_entry = self.current_scope.lookup(func_name)
+        func_entry = self.scopes.lookup(func_name)
         
         if not func_entry:
             self.add_error(f"function '{func_name}' is not defined.", node.lineno)
@@ -382,6 +394,7 @@ class SemanticAnalyzer(Visitor):
         if func_entry.symbol_type != 'function':
             self.add_error(f"'{func_name}' is not a function.", node.lineno)
             return None
+        self.types.record_symbol(node, func_entry)
         
         # Count arguments and get their types
         actual_args = 0
@@ -419,9 +432,9 @@ class SemanticAnalyzer(Visitor):
         
         # Check argument types
         for i, (expected_type, actual_type) in enumerate(zip([p[1] for p in func_entry.params], arg_types)):
-            if expected_type != 'any' and actual_type and actual_type != expected_type:
+            if expected_type != Type.ANY and actual_type and actual_type != expected_type:
                 param_name = func_entry.params[i][0]
-                self.add_error(f"expected '{param_name}' to be of type '{expected_type}', but got '{actual_type}' instead.", node.lineno)
+                self.add_error(f"expected '{param_name}' to be of type '{type_name(expected_type)}', but got '{type_name(actual_type)}' instead.", node.lineno)
         
         return func_entry.return_type
     
@@ -430,13 +443,13 @@ class SemanticAnalyzer(Visitor):
         array_type = self.visit(node.array_expr)
         index_type = self.visit(node.index_expr)
         
-        if array_type and array_type != 'vector':
-            self.add_error(f"expected array to be of type 'vector', but got '{array_type}' instead.", node.lineno)
+        if array_type and array_type != Type.VECTOR:
+            self.add_error(f"expected array to be of type 'vector', but got '{type_name(array_type)}' instead.", node.lineno)
         
-        if index_type and index_type != 'int':
-            self.add_error(f"array index must be of type 'int', but got '{index_type}' instead.", node.lineno)
+        if index_type and index_type != Type.INT:
+            self.add_error(f"array index must be of type 'int', but got '{type_name(index_type)}' instead.", node.lineno)
         
-        return 'int'  # Assume vector elements are int
+        return Type.INT  # Assume vector elements are int
     
     def visit_ReturnStatementNode(self, node):
         """Visit return statement"""
@@ -450,33 +463,33 @@ class SemanticAnalyzer(Visitor):
         
         expr_type = self.visit(node.expr)
         if expr_type and expr_type != func_entry.return_type:
-            self.add_error(f"wrong return type. expected '{func_entry.return_type}' but got '{expr_type}'.", node.lineno)
+            self.add_error(f"wrong return type. expected '{type_name(func_entry.return_type)}' but got '{type_name(expr_type)}'.", node.lineno)
         
         return expr_type
     
     def visit_NumberNode(self, node):
         """Visit number literal"""
-        return 'int'
+        return Type.INT
     
     def visit_StringNode(self, node):
         """Visit string literal"""
         if hasattr(node, 'type'):
             return node.type
-        return 'str'
+        return Type.STR
     
     def visit_BooleanNode(self, node):
         """Visit boolean literal"""
-        return 'bool'
+        return Type.BOOL
     
     def visit_NullNode(self, node):
         """Visit null literal"""
-        return 'null'
+        return Type.NULL
     
     def visit_ComparisonOperationNode(self, node):
         """Visit comparison operation"""
         left_type = self.visit(node.expr1)
         right_type = self.visit(node.expr2)
-        return 'bool'
+        return Type.BOOL
     
     def visit_BinaryOperationNode(self, node):
         """Visit binary operation"""
@@ -484,16 +497,16 @@ class SemanticAnalyzer(Visitor):
         right_type = self.visit(node.expr2)
 
         if node.operator in ['&&', '||']:
-            if left_type != 'bool' or right_type != 'bool':
-                self.add_error(f"Logical operator '{node.operator}' requires boolean operands", node)
-            return 'bool'
+            if left_type != Type.BOOL or right_type != Type.BOOL:
+                self.add_error(f"Logical operator '{node.operator}' requires boolean operands", node.lineno)
+            return Type.BOOL
         
         # Return appropriate type based on operation
         if hasattr(node, 'operator'):
             if node.operator in ['==', '!=', '<', '>', '<=', '>=']:
-                return 'bool'
+                return Type.BOOL
             elif node.operator in ['+', '-', '*', '/', '%']:
-                return 'int'
+                return Type.INT
         
         return left_type  # Default to left operand type
     
@@ -501,16 +514,16 @@ class SemanticAnalyzer(Visitor):
         """Visit unary operation"""
         expr_type = self.visit(node.expr)
         if node.operator == '!':
-            return 'bool'
+            return Type.BOOL
         elif node.operator == '-':
-            return 'int'
+            return Type.INT
         return expr_type
     
     def visit_IfStatementNode(self, node):
         """Visit if statement"""
         condition_type = self.visit(node.expr)
-        if condition_type and condition_type != 'bool':
-            self.add_error(f"if condition must be boolean, got '{condition_type}'.", node.lineno)
+        if condition_type and condition_type != Type.BOOL:
+            self.add_error(f"if condition must be boolean, got '{type_name(condition_type)}'.", node.lineno)
         
         self.visit(node.stmt)
         if hasattr(node, 'else_choice') and node.else_choice:
@@ -521,8 +534,8 @@ class SemanticAnalyzer(Visitor):
     def visit_WhileStatementNode(self, node):
         """Visit while statement"""
         condition_type = self.visit(node.expr)
-        if condition_type and condition_type != 'bool':
-            self.add_error(f"while condition must be boolean, got '{condition_type}'.", node.lineno)
+        if condition_type and condition_type != Type.BOOL:
+            self.add_error(f"while condition must be boolean, got '{type_name(condition_type)}'.", node.lineno)
         
         self.visit(node.stmt)
         return None
@@ -530,27 +543,27 @@ class SemanticAnalyzer(Visitor):
     def visit_ForStatementNode(self, node):
         """Visit for statement"""
         # Enter new scope for loop variable
-        self.enter_scope()
+        self.enter_scope('for')
         
         # Define loop variable
         loop_var = SymbolTableEntry(
             name=node.iden,
             symbol_type='variable',
-            data_type='int',
+            data_type=Type.INT,
             is_initialized=True,
             lineno=node.lineno
         )
-        self.current_scope.define(loop_var)
+        self.define(loop_var, node=node)
         
         # Check range expressions
         start_type = self.visit(node.expr1)
         end_type = self.visit(node.expr2)
         
-        if start_type and start_type != 'int':
-            self.add_error(f"for loop start value must be int, got '{start_type}'.", node.lineno)
+        if start_type and start_type != Type.INT:
+            self.add_error(f"for loop start value must be int, got '{type_name(start_type)}'.", node.lineno)
         
-        if end_type and end_type != 'int':
-            self.add_error(f"for loop end value must be int, got '{end_type}'.", node.lineno)
+        if end_type and end_type != Type.INT:
+            self.add_error(f"for loop end value must be int, got '{type_name(end_type)}'.", node.lineno)
         
         # Visit loop body
         self.visit(node.stmt)
@@ -559,6 +572,10 @@ class SemanticAnalyzer(Visitor):
         self.exit_scope()
         return None
     
+    def visit_ParenthesisNode(self, node):
+        """Visit parenthesized expression"""
+        return self.visit(node.expr)
+    
     def visit_ExpressionStatementNode(self, node):
         """Visit expression statement"""
         return self.visit(node.expr)
@@ -576,17 +593,91 @@ class SemanticAnalyzer(Visitor):
                     self.visit(expr)
             else:
                 self.visit(node.expr)
-        return 'vector'
+        return Type.VECTOR
     
     def analyze(self, ast_root):
         """Main analysis method"""
-        self.visit(ast_root)
+        try:
+            if self.jobs > 1:
+                self.analyze_parallel(ast_root)
+            else:
+                self.visit(ast_root)
+        except TooManyErrors:
+            self.diagnostics.report(
+                f"too many errors ({self.diagnostics.max_errors}), analysis stopped.",
+                severity=Severity.NOTE)
+            return self.errors
+        if self.jobs <= 1 or self.executor == 'thread':
+            ast_root.resolved = True  # identifiers were bound along the way
+            ast_root.types = self.types
         return self.errors
     
-    def print_errors(self):
-        print("❌ Semantic Errors:")
-        for error in self.errors:
-            print(error)
+    def fork(self):
+        """Worker analyzer that checks bodies against this analyzer's signatures"""
+        return _worker(self.global_scope, self.diagnostics.max_errors, self.retain_scopes)
+    
+    def analyze_parallel(self, ast_root):
+        """Check function bodies in a worker pool after the signature pre-pass
+
+        Functions are split into contiguous batches, one per worker, and the
+        batches' diagnostics and scopes are merged back in source order, so
+        the result does not depend on scheduling. Thread workers annotate
+        the shared AST and their type tables are merged; process workers
+        work on a copy and only send back diagnostics and scopes.
+        """
+        functions = self.live_functions(ast_root, self.collect_signatures(ast_root))
+        if not functions:
+            return
+        size = -(-len(functions) // self.jobs)
+        batches = [functions[i:i + size] for i in range(0, len(functions), size)]
+        in_process = self.executor == 'process'
+        pool_class = ProcessPoolExecutor if in_process else ThreadPoolExecutor
+        with pool_class(max_workers=len(batches)) as pool:
+            results = list(pool.map(_analyze_batch, repeat(self.global_scope),
+                                    batches, repeat(self.diagnostics.max_errors),
+                                    repeat(not in_process), repeat(self.retain_scopes)))
+        
+        for diagnostics, scopes, types in results:
+            if types is not None:
+                self.types.merge(types)
+            for scope in scopes:
+                scope.parent = self.global_scope
+                self.global_scope.children.append(scope)
+            if any(d.severity is Severity.ERROR for d in diagnostics):
+                self.has_sem_error = True
+            self.diagnostics.merge(diagnostics)
+    
+    def print_errors(self, stream=None, fmt='text'):
+        self.diagnostics.write(stream, fmt, header="❌ Semantic Errors:")
+
+
+def _worker(global_scope, max_errors, retain_scopes='all'):
+    """Analyzer that checks function bodies against an existing global scope
+
+    The global scope is shared read-only; the worker's function scopes hang
+    off a private root (its current_scope) and its diagnostics are its own.
+    """
+    worker = SemanticAnalyzer(max_errors, retain_scopes=retain_scopes)
+    worker.global_scope = global_scope
+    worker.current_scope = SymbolTable()
+    worker.scopes = ScopeChain()
+    worker.scopes.push()
+    for entry in global_scope.symbols.values():
+        worker.scopes.define(entry)
+    return worker
 
 
+def _analyze_batch(global_scope, functions, max_errors, keep_types=True, retain_scopes='all'):
+    """Pool worker: check a batch of function bodies against shared signatures
 
+    keep_types=False drops the type table, whose nodes are copies when the
+    worker runs in another process.
+    """
+    worker = _worker(global_scope, max_errors, retain_scopes)
+    try:
+        for func in functions:
+            worker.visit(func)
+    except TooManyErrors:
+        pass
+    types = worker.types if keep_types else None
+    return worker.diagnostics.items, worker.current_scope.children, types
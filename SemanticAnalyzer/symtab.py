@@ -1,30 +1,45 @@
 from typing import List, Optional
+from Parser.typesys import Type
 
 class SymbolTableEntry:
     """Entry in symbol table containing variable/function information"""
-    def __init__(self, name: str, symbol_type: str, data_type: str = None, 
-                 is_initialized: bool = False, params: List = None, 
-                 return_type: str = None, lineno: int = None):
+    __slots__ = ('name', 'symbol_type', 'data_type', 'is_initialized', 'params',
+                 'return_type', 'lineno', 'depth', 'slot', 'binding')
+
+    def __init__(self, name: str, symbol_type: str, data_type: Type = None,
+                 is_initialized: bool = False, params: List = None,
+                 return_type: Type = None, lineno: int = None):
         self.name = name
         self.symbol_type = symbol_type  # 'variable' or 'function'
-        self.data_type = data_type      # 'int', 'vector', 'str', etc.
+        self.data_type = data_type      # Type id: Type.INT, Type.VECTOR, ...
         self.is_initialized = is_initialized
-        self.params = params or []      # For functions: [(param_name, param_type), ...]
+        self.params = params or ()      # For functions: ((param_name, param_type), ...)
         self.return_type = return_type  # For functions
         self.lineno = lineno
+        self.depth = None               # Scope depth, set by SymbolTable.define
+        self.slot = None                # Index within its scope
+        self.binding = None             # (depth, slot), shared by every use
 
 
 class SymbolTable:
     """Hierarchical symbol table implementation"""
-    def __init__(self, parent=None):
+    __slots__ = ('parent', 'name', 'depth', 'symbols', 'children')
+
+    def __init__(self, parent=None, name=None):
         self.parent = parent
+        self.name = name
+        self.depth = parent.depth + 1 if parent else 0
         self.symbols = {}
         self.children = []
-        
+
     def define(self, entry: SymbolTableEntry):
         """Define a new symbol in current scope"""
+        existing = self.symbols.get(entry.name)
+        entry.depth = self.depth
+        entry.slot = existing.slot if existing else len(self.symbols)
+        entry.binding = (entry.depth, entry.slot)
         self.symbols[entry.name] = entry
-        
+
     def lookup(self, name: str) -> Optional[SymbolTableEntry]:
         """Look up symbol in current scope and parent scopes"""
         if name in self.symbols:
@@ -32,13 +47,60 @@ class SymbolTable:
         elif self.parent:
             return self.parent.lookup(name)
         return None
-        
+
     def lookup_current_scope(self, name: str) -> Optional[SymbolTableEntry]:
         """Look up symbol only in current scope"""
         return self.symbols.get(name)
-        
-    def create_child_scope(self):
-        """Create a new child scope"""
-        child = SymbolTable(parent=self)
-        self.children.append(child)
-        return child
\ No newline at end of file
+
+    def create_child_scope(self, name=None, retain=True):
+        """Create a new child scope
+
+        With retain=False the child is not added to `children`, so it can be
+        freed as soon as nothing else refers to it.
+        """
+        child = SymbolTable(parent=self, name=name)
+        if retain:
+            self.children.append(child)
+        return child
+
+
+class ScopeChain:
+    """Flat view of the active scopes for O(1) lookups
+
+    Every visible name maps to a stack of entries ordered by scope depth,
+    innermost last, so a lookup is one dict probe no matter how deeply
+    scopes are nested. Entries must be defined in a SymbolTable first so
+    their depth is known.
+    """
+    def __init__(self):
+        self.bindings = {}  # name -> [entry, ...], innermost last
+        self.frames = []    # names defined by each active scope
+
+    def push(self):
+        """Enter a scope"""
+        self.frames.append([])
+
+    def pop(self):
+        """Leave the innermost scope, unbinding the names it defined"""
+        for name in self.frames.pop():
+            stack = self.bindings[name]
+            stack.pop()
+            if not stack:
+                del self.bindings[name]
+
+    def define(self, entry: SymbolTableEntry):
+        """Make an entry visible in the scope at its depth"""
+        stack = self.bindings.setdefault(entry.name, [])
+        i = len(stack)
+        while i and stack[i - 1].depth > entry.depth:
+            i -= 1
+        if i and stack[i - 1].depth == entry.depth:
+            stack[i - 1] = entry
+        else:
+            stack.insert(i, entry)
+            self.frames[entry.depth].append(entry.name)
+
+    def lookup(self, name: str) -> Optional[SymbolTableEntry]:
+        """Look up the innermost visible entry for a name"""
+        stack = self.bindings.get(name)
+        return stack[-1] if stack else None
@@ -0,0 +1,38 @@
+class TypeTable:
+    """Side table of what semantic analysis inferred, keyed by node identity
+
+    types maps a node to the type id (Parser.typesys) the analyzer computed
+    for it, and symbols maps a node to the SymbolTableEntry an identifier,
+    call or declaration resolved to. AST nodes hash by identity, so the
+    nodes themselves are the keys: that is as cheap as keying by id(node)
+    without allocating an int per key, and it keeps every described node
+    alive so its identity cannot be reused while the table is. Nodes
+    created after analysis (e.g. by a rewrite) are simply unknown.
+    """
+    __slots__ = ('types', 'symbols')
+
+    def __init__(self):
+        self.types = {}    # node -> type id
+        self.symbols = {}  # node -> SymbolTableEntry
+
+    def __len__(self):
+        return len(self.types.keys() | self.symbols.keys())
+
+    def record_type(self, node, type_id):
+        self.types[node] = type_id
+
+    def record_symbol(self, node, entry):
+        self.symbols[node] = entry
+
+    def type_of(self, node):
+        """Inferred type of a node, or None if analysis did not type it"""
+        return self.types.get(node)
+
+    def symbol_of(self, node):
+        """Symbol a node resolved to, or None"""
+        return self.symbols.get(node)
+
+    def merge(self, other):
+        """Add the entries of another table (e.g. from a worker)"""
+        self.types.update(other.types)
+        self.symbols.update(other.symbols)
@@ -1,9 +1,45 @@
-from abc import ABC, abstractmethod
+from abc import ABC
 
 
 class Visitor(ABC):
-    """Abstract base class for visitor pattern"""
-    
-    @abstractmethod
+    """Abstract base class for visitor pattern
+
+    Dispatch goes through a per-instance table keyed by node class. The
+    ``visit_*`` methods are bound once when the visitor is constructed and
+    each node class is resolved to its handler the first time it is seen,
+    so a visit costs one dict probe instead of building a method name and
+    calling ``getattr`` for every node.
+    """
+
+    def __init__(self):
+        # visit_<ClassName> -> bound method, resolved once per visitor
+        self._handlers = {
+            name[len('visit_'):]: getattr(self, name)
+            for name in dir(type(self))
+            if name.startswith('visit_')
+        }
+        # node class -> bound method, filled on first sight of each class
+        self._dispatch = {}
+
+    def _resolve(self, node_class):
+        """Resolve and cache the handler for a node class"""
+        handler = self._handlers.get(node_class.__name__, self.generic_visit)
+        self._dispatch[node_class] = handler
+        return handler
+
     def visit(self, node):
-        pass
+        """Main visit method that dispatches to specific visit methods"""
+        if node is None:
+            return None
+        try:
+            handler = self._dispatch[node.__class__]
+        except KeyError:
+            handler = self._resolve(node.__class__)
+        return handler(node)
+
+    def generic_visit(self, node):
+        """Generic visit for nodes without specific handlers"""
+        for child in getattr(node, 'children', ()):
+            if child:
+                self.visit(child)
+        return None
@@ -1,10 +1,17 @@
+import argparse
+import sys
+
 from Parser.parser import Parser
 from Parser.ast import *
 from Parser.grammar import Grammar
+from Parser.dump import dump_ast
 from Lexer.tokens import tokenize
 from tabulate import tabulate
 from SemanticAnalyzer.semantic_analyzer import SemanticAnalyzer
+from SemanticAnalyzer.profiling import VisitProfiler
 from IR.generator import CodeGenerator
+from IR.passes import OPTIMIZATION_LEVELS
+from IR.sink import FileSink
 
 def process_input(filename):
     with open(filename, 'r') as file:
@@ -44,8 +51,55 @@ def run_tsvm(ts_file_path, input_values=""):
     # print(stderr.decode())
 
 
-def main():
-    input_text = process_input("./tests/test_input2.tes")
+def write_profile(profiler, target):
+    """Print the profile table for target '-', else write it to the file target"""
+    if target == "-":
+        profiler.print_table()
+    elif target.endswith(".json"):
+        profiler.dump_json(target)
+    else:
+        profiler.dump_stats(target)
+        print(f"Profile written to {target}; read it with: python -m pstats {target}")
+
+
+def write_ast_dump(ast_root, target, fmt):
+    """Dump the AST to stdout for target '-', else to the file target"""
+    if target == "-":
+        dump_ast(ast_root, sys.stdout, fmt)
+        return
+    with open(target, "w") as stream:
+        count = dump_ast(ast_root, stream, fmt)
+    print(f"AST ({count} nodes) written to {target}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compile a TesLang program to tsvm code and run it")
+    parser.add_argument("source", nargs="?", default="./tests/test_input2.tes",
+                        help="TesLang source file (default: %(default)s)")
+    parser.add_argument("-o", "--output", default="output.ts",
+                        help="where to write the tsvm code (default: %(default)s)")
+    parser.add_argument("-O", dest="level", type=int, choices=sorted(OPTIMIZATION_LEVELS), default=3,
+                        help="optimization level (default: %(default)s)")
+    parser.add_argument("--verify", action="store_true",
+                        help="check the IR after every pass")
+    parser.add_argument("--stats", action="store_true",
+                        help="print the time and instruction counts of each pass, what the peephole "
+                             "passes did and the registers each function uses")
+    parser.add_argument("--profile", nargs="?", const="-", metavar="FILE",
+                        help="time the visit methods of the analyzer and the code generator "
+                             "and print a table, or write pstats data (.json: JSON) to FILE")
+    parser.add_argument("--dump-ast", nargs="?", const="-", metavar="FILE",
+                        help="write the AST to FILE, or print it when FILE is omitted")
+    parser.add_argument("--dump-format", choices=("text", "jsonl"), default="text",
+                        help="format of --dump-ast (default: %(default)s)")
+    parser.add_argument("--input", default="3\n4\n",
+                        help="what to feed tsvm on stdin, with \\n for newlines")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    input_text = process_input(args.source)
 
     tokens_list = tokenize(input_text)
     print_tokens(tokens_list)
@@ -54,29 +108,38 @@ def main():
     parser = Parser(grammar)
 
     ast_root = parser.build(input_text)
-    # print('Parser ast_root:', ast_root)
+    if args.dump_ast:
+        write_ast_dump(ast_root, args.dump_ast, args.dump_format)
     if not grammar.has_syntax_error and ast_root:
         print("✅ Parsing successful with no syntax errors.")
 
+    profiler = VisitProfiler() if args.profile else None
     analyzer = SemanticAnalyzer()
+    if profiler:
+        profiler.attach(analyzer)
     analyzer.analyze(ast_root)
     if not analyzer.has_sem_error:
         print("✅ Semantic Analysis successful with no errors.")
     else:
         analyzer.print_errors()
     
-    codegen = CodeGenerator()
-
-    code_lines = codegen.generate_code(ast_root)
-    code_str = codegen.get_code_string()
-    # codegen.print_code()
-
-    with open("output.ts", "w") as f:
-        f.write(code_str)        
-
-    run_tsvm("output.ts", input_values="3\n4\n")
+    codegen = CodeGenerator.at_level(args.level, verify=args.verify)
+    if profiler:
+        profiler.attach(codegen)
+
+    # Each proc goes to the file as soon as it is ready
+    with FileSink(args.output) as sink:
+        codegen.generate_code(ast_root, sink)
+    if args.stats:
+        codegen.print_pass_report()
+        codegen.print_peephole_report()
+        codegen.print_register_report()
+    if profiler:
+        write_profile(profiler, args.profile)
+
+    run_tsvm(args.output, input_values=args.input.replace("\\n", "\n"))
     
     
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,137 @@
+import contextlib
+import io
+import os
+
+from Parser.parser import Parser
+from Parser.grammar import Grammar
+from SemanticAnalyzer.semantic_analyzer import SemanticAnalyzer
+from IR.generator import CodeGenerator
+from IR.ir import Opcode, Instr, Label, Proc, split_procs
+from IR.isel import TSVM_FORMS
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+_parser = None
+
+
+def parse(source):
+    """AST of a TesLang source text"""
+    global _parser
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        if _parser is None:
+            _parser = Parser(Grammar())
+        return _parser.build(source)
+
+
+def analyze(source):
+    """(AST, analyzer) of a source text after semantic analysis"""
+    ast = parse(source)
+    analyzer = SemanticAnalyzer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer.analyze(ast)
+    return ast, analyzer
+
+
+def sample(name):
+    with open(os.path.join(TESTS, name)) as file:
+        return file.read()
+
+
+def compile_source(source, level=None, **options):
+    """CodeGenerator that has generated the code of source"""
+    ast, _ = analyze(source)
+    codegen = CodeGenerator() if level is None and not options else \
+        CodeGenerator.at_level(3 if level is None else level, **options)
+    codegen.generate_code(ast)
+    return codegen
+
+
+class StackOverflow(Exception):
+    pass
+
+
+class Machine:
+    """Runs IR the way tsvm does, counting the instructions executed
+
+    Every frame starts with its registers at 0, r1..rk set to the
+    arguments; `ret` hands back r0. depth is the deepest call nesting
+    reached, main included.
+    """
+
+    def __init__(self, items, inputs=(), max_depth=3000):
+        self.procs = {}
+        for proc, body in split_procs(items):
+            if proc is None:
+                continue
+            code = [item for item in body if item.__class__ is Instr]
+            labels = {}
+            position = 0
+            for item in body:
+                if item.__class__ is Label:
+                    labels[item.name] = position
+                elif item.__class__ is Instr:
+                    position += 1
+            self.procs[proc.name] = (code, labels)
+        self.inputs = list(inputs)
+        self.output = []
+        self.steps = 0
+        self.depth = 0
+        self.max_depth = max_depth
+        self.deepest = 0
+
+    def run(self):
+        self.call('main', [])
+        return self.output
+
+    def call(self, name, args):
+        if name == 'iget':
+            return self.inputs.pop(0)
+        if name == 'iput':
+            self.output.append(args[0])
+            return 0
+        if name == 'mem':
+            return [0] * args[0]
+        self.depth += 1
+        self.deepest = max(self.deepest, self.depth)
+        if self.depth > self.max_depth:
+            raise StackOverflow(name)
+        code, labels = self.procs[name]
+        registers = {f"r{i + 1}": arg for i, arg in enumerate(args)}
+
+        def value(operand):
+            if operand.__class__ is str and operand[:1] == 'r':
+                return registers.get(operand, 0)
+            return operand
+
+        pc = 0
+        while True:
+            instr = code[pc]
+            pc += 1
+            self.steps += 1
+            op = instr.op
+            args = [value(arg) for arg in instr.args]
+            if op == Opcode.RET:
+                self.depth -= 1
+                return registers.get('r0', 0)
+            if op == Opcode.JMP:
+                pc = labels[instr.target]
+            elif op == Opcode.JZ or op == Opcode.JNZ:
+                if (args[0] == 0) == (op == Opcode.JZ):
+                    pc = labels[instr.target]
+            elif op == Opcode.CALL:
+                result = self.call(instr.target, args)
+                if instr.dest is not None:
+                    registers[instr.dest] = result
+            elif op == Opcode.LOAD:
+                registers[instr.dest] = args[0][args[1]]
+            elif op == Opcode.STORE:
+                args[0][args[1]] = args[2]
+            elif op == Opcode.LEN:
+                registers[instr.dest] = len(args[0])
+            else:
+                registers[instr.dest] = TSVM_FORMS[op].evaluate(*args)
+
+
+def run(items, inputs=(), max_depth=3000):
+    """Output of a program's IR given the numbers scan() reads"""
+    return Machine(items, inputs, max_depth).run()
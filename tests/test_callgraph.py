@@ -0,0 +1,125 @@
+from SemanticAnalyzer.callgraph import BUILTINS, CallGraph, call_graph, function_calls, program_functions
+from SemanticAnalyzer.semantic_analyzer import SemanticAnalyzer
+
+from helpers import analyze, parse
+
+PROGRAM = """
+funk fact(n as int) <int>
+{
+    if [[ n < 2 ]]
+        return 1;
+    return n * fact(n - 1);
+}
+
+funk even(n as int) <int>
+{
+    if [[ n == 0 ]]
+        return 1;
+    return odd(n - 1);
+}
+
+funk odd(n as int) <int>
+{
+    if [[ n == 0 ]]
+        return 0;
+    return even(n - 1);
+}
+
+funk unused(n as int) <int>
+{
+    return n + missing;
+}
+
+funk main() <int>
+{
+    n :: int = scan();
+    print(fact(n));
+    print(even(n));
+    return 0;
+}
+"""
+
+
+def graph():
+    return CallGraph.build(parse(PROGRAM))
+
+
+def test_callees_and_callers():
+    calls = graph()
+    # print is a statement, not a call
+    assert calls.callees('main') == ['scan', 'fact', 'even']
+    assert calls.callees('fact') == ['fact']
+    assert calls.callers('even') == ['odd', 'main']
+    assert calls.callers('scan') == ['main']
+    assert calls.callers('unused') == []
+
+
+def test_builtins_are_leaves():
+    calls = graph()
+    assert list(calls.functions) == ['fact', 'even', 'odd', 'unused', 'main']
+    for name in BUILTINS:
+        assert calls.is_builtin(name)
+        assert calls.callees(name) == []
+    assert not calls.is_builtin('main')
+    # A function of a builtin's name shadows it
+    calls.add_calls('print', [])
+    assert not calls.is_builtin('print')
+
+
+def test_sccs_callees_first():
+    components = graph().sccs()
+    order = [name for component in components for name in component]
+    assert sorted(order) == sorted(BUILTINS + ('fact', 'even', 'odd', 'unused', 'main'))
+    assert sorted(next(c for c in components if 'even' in c)) == ['even', 'odd']
+    assert order.index('fact') < order.index('main')
+    assert order.index('even') < order.index('main')
+    assert components[-1] == ['main']
+
+
+def test_mutual_recursion():
+    calls = CallGraph()
+    calls.add_calls('a', ['b'])
+    calls.add_calls('b', ['a', 'c'])
+    calls.add_calls('c', [])
+    assert [sorted(component) for component in calls.sccs()] == [['c'], ['a', 'b']]
+    assert calls.is_recursive('a') and calls.is_recursive('b')
+    assert not calls.is_recursive('c')
+
+
+def test_recursion():
+    calls = graph()
+    assert calls.is_recursive('fact')
+    assert calls.is_recursive('even') and calls.is_recursive('odd')
+    assert not calls.is_recursive('main') and not calls.is_recursive('unused')
+
+
+def test_reachable():
+    calls = graph()
+    assert calls.reachable() == {'main', 'scan', 'fact', 'even', 'odd'}
+    assert calls.unreachable() == ['unused']
+    assert calls.reachable(['odd']) == {'odd', 'even'}
+    library = CallGraph()
+    library.add_calls('f', ['g'])
+    library.add_calls('g', [])
+    assert library.reachable() == {'f', 'g'}
+    assert library.unreachable() == []
+
+
+def test_recorded_calls_match_a_walk():
+    ast = parse(PROGRAM)
+    assert call_graph(ast) is call_graph(ast)
+    for func in program_functions(ast):
+        recorded = function_calls(func)
+        del func.calls
+        assert sorted(function_calls(func)) == sorted(recorded)
+
+
+def test_prune_unreachable_skips_dead_bodies():
+    _, analyzer = analyze(PROGRAM)
+    assert analyzer.has_sem_error
+    assert any('missing' in error.message for error in analyzer.diagnostics.errors)
+    ast = parse(PROGRAM)
+    pruned = SemanticAnalyzer(prune_unreachable=True)
+    pruned.analyze(ast)
+    assert not pruned.has_sem_error
+    assert pruned.global_scope.lookup('unused') is not None
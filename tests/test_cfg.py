@@ -0,0 +1,108 @@
+from IR.cfg import CFG, build_cfgs
+from IR.ir import split_procs
+from IR.tsvm import parse as parse_tsvm
+
+from helpers import run
+
+DIAMOND = """
+proc main # return value => r0
+call iget, r1
+jz r1, other
+mov r2, 10
+jmp join
+other:
+mov r2, 20
+join:
+call iput, r2
+ret
+dead:
+mov r2, 30
+ret
+"""
+
+# Two nested loops: outer counts r1 down, inner counts r2 up to r1
+NESTED = """
+proc main # return value => r0
+call iget, r1
+mov r3, 0
+outer:
+jz r1, done
+mov r2, 0
+inner:
+lt r4, r2, r1
+jz r4, next
+add r3, r3, 1
+add r2, r2, 1
+jmp inner
+next:
+sub r1, r1, 1
+jmp outer
+done:
+call iput, r3
+ret
+"""
+
+
+def cfg_of(text):
+    (proc, cfg), = build_cfgs(parse_tsvm(text))
+    return cfg
+
+
+def block(cfg, name):
+    return next(b for b in cfg.blocks if b.name == name)
+
+
+def test_blocks_and_edges():
+    cfg = cfg_of(DIAMOND)
+    assert [b.name for b in cfg.blocks] == ['B0', 'B1', 'other', 'join', 'dead']
+    entry, then, other, join, dead = cfg.blocks
+    assert entry.succs == [other, then]
+    assert then.succs == [join] and then.fallthrough is None
+    assert other.fallthrough is join
+    assert join.preds == [then, other]
+    assert join.succs == [] and dead.preds == []
+    assert cfg.reachable() == {entry, then, other, join}
+
+
+def test_dominators():
+    cfg = cfg_of(DIAMOND)
+    entry, then, other, join, dead = cfg.blocks
+    assert cfg.idom[join] is entry and cfg.idom[then] is entry
+    assert cfg.dominates(entry, join) and not cfg.dominates(then, join)
+    assert dead not in cfg.idom and not cfg.dominates(entry, dead)
+    assert sorted(b.name for b in cfg.dominator_tree()[entry]) == ['B1', 'join', 'other']
+
+
+def test_nested_loops():
+    cfg = cfg_of(NESTED)
+    outer, inner = cfg.loops
+    assert outer.header.name == 'outer' and inner.header.name == 'inner'
+    assert inner.parent is outer and outer.children == [inner]
+    assert cfg.loop_forest() == [outer]
+    assert inner.blocks < outer.blocks
+    assert cfg.loop_depth(block(cfg, 'inner')) == 2
+    assert cfg.loop_depth(block(cfg, 'next')) == 1
+    assert cfg.loop_depth(block(cfg, 'done')) == 0
+    assert cfg.loop_of(block(cfg, 'next')) is outer
+
+
+def test_preheader_keeps_dominators():
+    cfg = cfg_of(NESTED)
+    header = block(cfg, 'inner')
+    old_idom = cfg.idom[header]
+    preds = [pred for pred in header.preds if not cfg.dominates(header, pred)]
+    pre = cfg.insert_before(header, preds)
+    assert cfg.idom[header] is pre and cfg.idom[pre] is old_idom
+    assert header.preds[0] is pre
+    items = parse_tsvm(NESTED)[:1] + cfg.to_items()
+    assert run(items, [3]) == [6]
+
+
+def test_layout_adds_jumps():
+    items = parse_tsvm(DIAMOND)
+    proc, body = split_procs(items)[0]
+    cfg = CFG.build(proc, body)
+    entry, then, other, join, dead = cfg.blocks
+    relaid = [proc] + cfg.to_items([entry, then, join, other])
+    assert run(relaid, [0]) == [20]
+    assert run(relaid, [1]) == [10]
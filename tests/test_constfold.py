@@ -0,0 +1,44 @@
+from IR.constfold import fold_constants
+from IR.generator import CodeGenerator
+from IR.printer import format_program
+
+from helpers import analyze, compile_source, run, sample
+
+PROGRAM = """
+funk main() <int>
+{
+    a :: int = 6;
+    b :: int = a * 7;
+    if [[ b > 40 ]]
+        print(b - 2);
+    print((a + 1) * scan());
+    return 0;
+}
+"""
+
+
+def test_folds_constants():
+    code = compile_source(PROGRAM, 1).code
+    text = format_program(code)
+    assert 'mul' not in text.split('call iget')[0]
+    assert run(code, [3]) == [40, 21]
+
+
+def test_fold_leaves_the_tree_alone():
+    ast, _ = analyze(PROGRAM)
+    before = repr(ast)
+    types = dict(ast.types.types)
+    folded = fold_constants(ast, ast.types)
+    assert repr(ast) == before
+    assert ast.types.types == types
+    assert folded is not ast
+    assert folded.types is not ast.types
+
+
+def test_generate_twice_on_one_tree():
+    ast, _ = analyze(sample('loops.tes'))
+    fresh = compile_source(sample('loops.tes'), 0).get_code_string()
+    CodeGenerator.at_level(3).generate_code(ast)
+    again = CodeGenerator.at_level(0)
+    again.generate_code(ast)
+    assert again.get_code_string() == fresh
@@ -0,0 +1,71 @@
+from IR.cse import ValueNumbering
+from IR.ir import Opcode, split_procs, join_procs
+from IR.ssa import SSAProc
+from IR.tsvm import parse as parse_tsvm
+
+from helpers import run
+
+# A load after a store to the same place, and a load of a place just loaded
+REUSE = """
+proc main # return value => r0
+call iget, r1
+call mem, r2, r1
+call iget, r3
+mov [r2 + 0], r3
+mov r4, [r2 + 0]
+mov r5, [r2 + 1]
+mov r6, [r2 + 1]
+add r7, r4, r6
+call iput, r7
+ret
+"""
+
+# r2 and r3 may name one vector, and a call may write to either
+FORGET = """
+proc main # return value => r0
+call iget, r1
+call mem, r2, r1
+call mem, r3, r1
+mov r4, [r2 + 0]
+mov [r3 + 0], r1
+mov r5, [r2 + 0]
+call iput, r4
+call iput, r5
+mov r6, [r2 + 1]
+call iget, r7
+mov r8, [r2 + 1]
+add r9, r6, r8
+call iput, r9
+ret
+"""
+
+
+def number(text):
+    """(items, instructions reused) after value numbering main"""
+    procs = split_procs(parse_tsvm(text))
+    for i, (proc, body) in enumerate(procs):
+        if proc is not None:
+            ssa = SSAProc(proc, body)
+            ssa.to_ssa()
+            reused = ValueNumbering(ssa).run()
+            ssa.from_ssa()
+            procs[i] = (proc, ssa.to_items())
+    return join_procs(procs), reused
+
+
+def loads(items):
+    return sum(1 for item in items if getattr(item, 'op', None) == Opcode.LOAD)
+
+
+def test_loads_reused_within_a_block():
+    items, reused = number(REUSE)
+    assert reused == 2
+    assert loads(items) == 1
+    assert run(items, [3, 9]) == [9]
+
+
+def test_memory_forgotten_after_store_or_call():
+    items, reused = number(FORGET)
+    assert reused == 0
+    assert loads(items) == 4
+    assert run(items, [2, 6]) == [0, 0, 0]
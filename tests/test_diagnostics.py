@@ -0,0 +1,69 @@
+import io
+import json
+
+import pytest
+
+from SemanticAnalyzer.diagnostics import Diagnostics, Severity, TooManyErrors
+from SemanticAnalyzer.semantic_analyzer import SemanticAnalyzer
+
+from helpers import parse
+
+# Each function reads a variable it never declared
+UNDECLARED = "\n".join(f"""
+funk f{i}() <int>
+{{
+    return x{i};
+}}""" for i in range(5))
+
+
+def test_duplicates_are_dropped():
+    diagnostics = Diagnostics()
+    assert diagnostics.report("bad", 1, 'f') is not None
+    assert diagnostics.report("bad", 7, 'f') is None
+    assert diagnostics.report("bad", 7, 'g') is not None
+    assert diagnostics.report("bad", 7, 'g', Severity.WARNING) is not None
+    assert [d.lineno for d in diagnostics.items] == [1, 7, 7]
+    assert diagnostics.error_count == 2
+    assert len(diagnostics.errors) == 2
+
+
+def test_error_cap():
+    diagnostics = Diagnostics(max_errors=2)
+    diagnostics.report("one")
+    diagnostics.report("a warning", severity=Severity.WARNING)
+    with pytest.raises(TooManyErrors):
+        diagnostics.report("two")
+    assert diagnostics.error_count == 2
+
+
+def test_merge_keeps_order_and_drops_duplicates():
+    first, second = Diagnostics(), Diagnostics()
+    first.report("a", 1, 'f')
+    second.report("b", 2, 'g')
+    second.report("a", 3, 'f')
+    first.merge(second.items)
+    assert [d.message for d in first.items] == ["a", "b"]
+
+
+def test_formats():
+    diagnostics = Diagnostics()
+    assert diagnostics.format() == ''
+    diagnostics.report("bad", 4, 'f')
+    diagnostics.report("odd", severity=Severity.WARNING)
+    assert diagnostics.format(header="Errors:") == \
+        "Errors:\nError: function 'f': bad\nWarning: odd\n"
+    assert json.loads(diagnostics.format('json'))[0] == \
+        {'severity': 'error', 'message': 'bad', 'lineno': 4, 'function': 'f'}
+    stream = io.StringIO()
+    diagnostics.write(stream)
+    assert stream.getvalue() == diagnostics.format()
+    with pytest.raises(ValueError):
+        diagnostics.format('xml')
+
+
+def test_analysis_stops_at_the_cap():
+    analyzer = SemanticAnalyzer(max_errors=3)
+    errors = analyzer.analyze(parse(UNDECLARED))
+    assert len(errors) == 3
+    assert analyzer.diagnostics.items[-1].severity is Severity.NOTE
+    assert len(SemanticAnalyzer().analyze(parse(UNDECLARED))) >= 5
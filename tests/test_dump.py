@@ -0,0 +1,92 @@
+import io
+import json
+import sys
+
+import pytest
+
+from Parser.dump import dump_ast
+
+from helpers import parse, sample
+
+
+class Link:
+    """Minimal node: a value and the next node"""
+
+    def __init__(self, value, next=None):
+        self.value = value
+        self.next = next
+
+
+def dump(root, **options):
+    stream = io.StringIO()
+    count = dump_ast(root, stream, **options)
+    return count, stream.getvalue()
+
+
+def records(root, **options):
+    count, text = dump(root, fmt='jsonl', **options)
+    lines = [json.loads(line) for line in text.splitlines()]
+    assert len(lines) == count
+    return lines
+
+
+def test_text_outline():
+    count, text = dump(Link(1, Link(2, Link(3))))
+    assert text == "Link(value=1)\n  next: Link(value=2)\n    next: Link(value=3, next=None)\n"
+    assert count == 3
+
+
+def test_jsonl_records():
+    lines = records(Link(1, Link(2)))
+    assert lines == [
+        {'id': 0, 'parent': None, 'depth': 0, 'field': None, 'node': 'Link', 'attrs': {'value': 1}},
+        {'id': 1, 'parent': 0, 'depth': 1, 'field': 'next', 'node': 'Link', 'attrs': {'value': 2, 'next': None}},
+    ]
+
+
+def test_max_depth_truncates():
+    chain = Link(1, Link(2, Link(3)))
+    count, text = dump(chain, max_depth=1)
+    assert text == "Link(value=1)\n  next: Link(value=2) ...\n"
+    assert count == 2
+    lines = records(chain, max_depth=1)
+    assert lines[-1]['truncated'] is True and 'truncated' not in lines[0]
+
+
+def test_filters_by_class_name_keep_parents_written():
+    ast = parse(sample('test_input2.tes'))
+    lines = records(ast, node_filter={'FunctionNode', 'FunctionCallNode'})
+    ids = {line['id'] for line in lines}
+    assert {line['node'] for line in lines} == {'FunctionNode', 'FunctionCallNode'}
+    assert all(line['parent'] is None or line['parent'] in ids for line in lines)
+    calls = [line for line in lines if line['node'] == 'FunctionCallNode']
+    main = next(line for line in lines if line['attrs'].get('iden') == 'main')
+    assert calls and all(line['parent'] == main['id'] for line in calls)
+
+    _, text = dump(ast, node_filter={'FunctionNode', 'FunctionCallNode'})
+    for line in text.splitlines():
+        assert line.startswith('func') == (not line.startswith('  '))
+        assert not line.startswith('    ')
+
+
+def test_filter_predicate():
+    chain = Link(1, Link(2, Link(3)))
+    count, text = dump(chain, node_filter=lambda node: node.value != 2)
+    assert text == "Link(value=1)\n  next: Link(value=3, next=None)\n"
+    lines = records(chain, node_filter=lambda node: node.value != 2)
+    assert lines[1]['parent'] == lines[0]['id'] and lines[1]['depth'] == 2
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        dump_ast(Link(1), io.StringIO(), fmt='xml')
+
+
+def test_deep_tree():
+    depth = sys.getrecursionlimit() * 3
+    chain = None
+    for value in range(depth):
+        chain = Link(value, chain)
+    count, text = dump(chain, indent='')
+    assert count == depth
+    assert text.splitlines()[-1] == 'next: Link(value=0, next=None)'
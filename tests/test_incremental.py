@@ -0,0 +1,97 @@
+from IR.generator import CodeGenerator
+from SemanticAnalyzer.incremental import IncrementalAnalyzer, function_nodes
+from SemanticAnalyzer.callgraph import program_functions
+
+from helpers import analyze, parse
+
+SOURCE = """
+funk add(a as int, b as int) <int>
+{
+    s :: int = a + b;
+    return s;
+}
+
+funk scale(v as int) <int>
+{
+    return v * K;
+}
+
+funk main() <int>
+{
+    x :: int = scan();
+    print(add(x, 2));
+    print(scale(x));
+    return 0;
+}
+"""
+
+EDITED = SOURCE.replace("return v * K;", "k :: int = 3;\n    return v * k;")
+
+
+def annotations(ast):
+    """Type, symbol and binding of every node, comparable across parses"""
+    result = []
+    for func in program_functions(ast):
+        for node in function_nodes(func):
+            symbol = ast.types.symbol_of(node)
+            result.append((ast.types.type_of(node),
+                           symbol and (symbol.name, symbol.data_type, symbol.binding),
+                           getattr(node, 'binding', None)))
+    return result
+
+
+def test_only_edited_functions_are_checked():
+    incremental = IncrementalAnalyzer()
+    incremental.analyze(parse(SOURCE))
+    assert incremental.reanalyzed == ['add', 'scale', 'main']
+    assert incremental.analyzer.has_sem_error
+    incremental.analyze(parse(EDITED))
+    assert incremental.reanalyzed == ['scale']
+    assert not incremental.analyzer.has_sem_error
+
+
+def test_reused_functions_keep_their_types():
+    incremental = IncrementalAnalyzer()
+    incremental.analyze(parse(SOURCE))
+    ast = parse(EDITED)
+    incremental.analyze(ast)
+    fresh, _ = analyze(EDITED)
+    assert ast.resolved
+    assert annotations(ast) == annotations(fresh)
+    assert len(ast.types) == len(fresh.types)
+
+    codegen = CodeGenerator()
+    codegen.generate_code(ast)
+    expected = CodeGenerator()
+    expected.generate_code(fresh)
+    assert codegen.get_code_string() == expected.get_code_string()
+
+
+def linenos(analyzer):
+    return [(d.message, d.lineno) for d in analyzer.diagnostics.items]
+
+
+def test_signature_change_rechecks_callers():
+    incremental = IncrementalAnalyzer()
+    incremental.analyze(parse(EDITED))
+    assert not incremental.analyzer.has_sem_error
+    changed = EDITED.replace("funk scale(v as int)", "funk scale(v as vector)")
+    incremental.analyze(parse(changed))
+    assert incremental.reanalyzed == ['scale', 'main']
+    _, fresh = analyze(changed)
+    assert fresh.has_sem_error
+    assert any(d.function_name == 'main' for d in fresh.diagnostics.items)
+    assert linenos(incremental.analyzer) == linenos(fresh)
+
+
+def test_source_mode_shifts_line_numbers():
+    incremental = IncrementalAnalyzer()
+    incremental.analyze(parse(SOURCE), SOURCE)
+    before = linenos(incremental.analyzer)
+    assert before
+    shifted = "\n\n\n" + SOURCE
+    incremental.analyze(parse(shifted), shifted)
+    assert 'scale' not in incremental.reanalyzed
+    _, fresh = analyze(shifted)
+    assert linenos(incremental.analyzer) == linenos(fresh)
+    assert linenos(incremental.analyzer) == [(message, lineno + 3) for message, lineno in before]
@@ -0,0 +1,118 @@
+import pytest
+
+from IR.inline import Inliner
+from IR.ir import Opcode, Instr, Proc
+from IR.tsvm import parse as parse_tsvm
+
+from helpers import compile_source, run
+
+CONDITIONAL_LOCAL = """
+funk f(c as int) <int>
+{
+    x :: int;
+    if [[ c == 1 ]]
+        x = 5;
+    return x;
+}
+
+funk main() <int>
+{
+    for (i = 0 to 3)
+    begin
+        print(f(1 - i));
+    end
+    return 0;
+}
+"""
+
+PROGRAM = """
+proc twice # a => r1 & return value => r0
+add r0, r1, r1
+ret
+proc fact # n => r1 & return value => r0
+jz r1, done
+sub r2, r1, 1
+call fact, r3, r2
+mul r0, r1, r3
+ret
+done:
+mov r0, 1
+ret
+proc main # return value => r0
+call iget, r1
+call twice, r2, r1
+call iput, r2
+call fact, r3, r1
+call iput, r3
+mov r0, 0
+ret
+"""
+
+
+def calls(items, proc_name):
+    inside = False
+    targets = []
+    for item in items:
+        if item.__class__ is Proc:
+            inside = item.name == proc_name
+        elif inside and item.__class__ is Instr and item.op == Opcode.CALL:
+            targets.append(item.target)
+    return targets
+
+
+def test_small_procs_are_inlined_and_recursive_ones_kept():
+    items = parse_tsvm(PROGRAM)
+    inliner = Inliner()
+    inliner.inline(items)
+    assert calls(items, 'main') == ['iget', 'iput', 'fact', 'iput']
+    assert inliner.inlined == 1
+    assert run(items, [5]) == [10, 120]
+
+
+def test_limit():
+    items = parse_tsvm(PROGRAM)
+    Inliner(limit=1).inline(items)
+    assert 'twice' in calls(items, 'main')
+
+
+def test_prune_drops_procs_nothing_calls():
+    items = parse_tsvm(PROGRAM)
+    Inliner(prune=True).inline(items)
+    assert 'twice' not in {item.name for item in items if item.__class__ is Proc}
+    assert run(items, [3]) == [6, 6]
+
+
+def test_inlined_copy_starts_with_unset_locals_at_zero():
+    items = parse_tsvm("""
+proc f # c => r1 & return value => r0
+jz r1, skip
+mov r2, 5
+skip:
+mov r0, r2
+ret
+proc main # return value => r0
+mov r2, 1
+mov r3, 2
+loop:
+call f, r1, r2
+call iput, r1
+sub r2, r2, 1
+sub r3, r3, 1
+jnz r3, loop
+mov r0, 0
+ret
+""")
+    Inliner().inline(items)
+    assert calls(items, 'main') == ['iput']
+    assert run(items) == [5, 0]
+
+
+@pytest.mark.parametrize('level', [0, 1, 2, 3])
+def test_conditionally_set_local_in_a_loop(level):
+    assert run(compile_source(CONDITIONAL_LOCAL, level).code) == [5, 0, 0]
+
+
+def test_inlining_does_not_change_output():
+    with_inlining = compile_source(CONDITIONAL_LOCAL, inlining=True)
+    assert with_inlining.inline_report['inlined'] == 1
+    assert run(with_inlining.code) == run(compile_source(CONDITIONAL_LOCAL, inlining=False).code)
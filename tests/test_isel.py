@@ -0,0 +1,85 @@
+import pytest
+
+from IR.cfg import CFG
+from IR.ir import Opcode, count_instructions, split_procs
+from IR.isel import InstructionSelector, Form, TSVM_FORMS, reg_is_read, select_instructions
+from IR.printer import format_program
+from IR.tsvm import parse as parse_tsvm
+
+from helpers import compile_source, run, sample
+
+HEADER = "proc main # return value => r0\n"
+
+
+def select(body, inputs=()):
+    items = parse_tsvm(HEADER + body)
+    expected = run(items, inputs)
+    items, selector = select_instructions(items)
+    assert run(items, inputs) == expected
+    return format_program(items).split('\n')[1:], selector
+
+
+def test_literal_becomes_right_immediate():
+    lines, selector = select("call iget, r1\nmov r2, 5\nadd r3, r1, r2\ncall iput, r3\nret", [3])
+    assert lines == ['call iget, r1', 'add r3, r1, 5', 'call iput, r3', 'ret']
+    assert selector.immediates == 1
+
+
+def test_commutable_operands_are_swapped():
+    lines, _ = select("call iget, r1\nmov r2, 5\nlt r3, r2, r1\ncall iput, r3\nret", [7])
+    assert lines[1] == 'gt r3, r1, 5'
+    lines, _ = select("call iget, r1\nmov r2, 5\nsub r3, r2, r1\ncall iput, r3\nret", [7])
+    assert lines[2] == 'sub r3, r2, r1'
+
+
+def test_known_operands_are_evaluated():
+    lines, selector = select("mov r1, 6\nmov r2, 7\nmul r3, r1, r2\ncall iput, r3\nret")
+    assert lines == ['mov r3, 42', 'call iput, r3', 'ret']
+    assert selector.folded == 1
+    items, _ = select_instructions(parse_tsvm(HEADER + "mov r1, 6\nmov r2, 0\ndiv r3, r1, r2\nret"))
+    assert 'div r3, r1, 0' in format_program(items)
+
+
+def test_identities_become_moves():
+    lines, _ = select("call iget, r1\nmov r2, 1\nmul r3, r1, r2\ncall iput, r3\nret", [4])
+    assert lines[1] == 'mov r3, r1'
+
+
+def test_zero_test_folds_into_the_jump():
+    body = "call iget, r1\nmov r2, 0\neq r3, r1, r2\njz r3, yes\ncall iput, r1\nyes:\nret"
+    lines, selector = select(body, [0])
+    assert 'jnz r1, yes' in lines and not any(line.startswith('eq') for line in lines)
+    assert selector.branches == 1
+
+
+def test_constant_defined_on_one_path_is_not_used():
+    body = ("call iget, r1\njz r1, skip\nmov r2, 5\nskip:\nadd r3, r1, r2\n"
+            "call iput, r3\nret")
+    lines, _ = select(body, [0])
+    assert 'add r3, r1, r2' in lines
+
+
+def test_reg_is_read():
+    proc, body = split_procs(parse_tsvm(HEADER + "jz r1, a\nmov r2, 1\na:\nadd r3, r2, 1\nret"))[0]
+    cfg = CFG.build(proc, body)
+    assert reg_is_read(cfg.entry, 'r2')
+    assert not reg_is_read(cfg.blocks[1], 'r3')
+
+
+def test_new_forms_are_table_driven():
+    forms = dict(TSVM_FORMS)
+    forms[Opcode.SUB] = Form(immediates=(0, 1), evaluate=lambda a, b: a - b, identity=0)
+    items = parse_tsvm(HEADER + "call iget, r1\nmov r2, 9\nsub r3, r2, r1\ncall iput, r3\nret")
+    InstructionSelector(forms=forms).select(items)
+    assert 'sub r3, 9, r1' in format_program(items)
+
+
+@pytest.mark.parametrize('name,inputs', [('loops.tes', [6]), ('cse.tes', [5]),
+                                         ('tailcall.tes', [40]), ('test_input2.tes', [3, 4])])
+def test_samples(name, inputs):
+    code = compile_source(sample(name), 0).code
+    expected = run(code, inputs)
+    before = count_instructions(code)
+    selected, _ = select_instructions(code)
+    assert run(selected, inputs) == expected
+    assert count_instructions(selected) <= before
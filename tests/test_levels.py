@@ -0,0 +1,80 @@
+import pytest
+
+from IR.generator import CodeGenerator
+from IR.peephole import PEEPHOLE_PASSES
+from IR.passes import OPTIMIZATION_LEVELS, PassManager, format_pass_report
+from IR.verify import IRError
+
+from helpers import analyze, compile_source, run, sample
+
+# Sample programs without semantic errors and what they read
+SAMPLES = [
+    ('test_input2.tes', [[3, 4], [-5, 2]]),
+    ('loops.tes', [[0], [1], [6]]),
+    ('tailcall.tes', [[0], [1], [40]]),
+    ('cse.tes', [[3], [5], [9]]),
+    ('branches.tes', [[0], [1], [6]]),
+]
+
+# Every pass that can be switched off on its own
+PASSES = ['constant_folding', 'jumping_code', 'tail_calls', 'inlining', 'ssa', 'cse',
+          'loop_optimization', 'instruction_selection', 'register_allocation']
+
+
+@pytest.mark.parametrize('name,inputs', SAMPLES)
+def test_every_level_gives_the_same_output(name, inputs):
+    source = sample(name)
+    _, analyzer = analyze(source)
+    assert not analyzer.has_sem_error
+    programs = [compile_source(source, level, verify=True).code for level in OPTIMIZATION_LEVELS]
+    for values in inputs:
+        outputs = [run(code, values) for code in programs]
+        assert outputs[0]
+        assert outputs.count(outputs[0]) == len(outputs), (values, outputs)
+
+
+@pytest.mark.parametrize('option', PASSES + ['peephole', 'prune_unreachable'])
+@pytest.mark.parametrize('name,inputs', SAMPLES)
+def test_each_pass_keeps_the_output(name, inputs, option):
+    source = sample(name)
+    on = PEEPHOLE_PASSES if option == 'peephole' else True
+    off = () if option == 'peephole' else False
+    expected = compile_source(source, 0).code
+    only = compile_source(source, 0, verify=True, **{option: on}).code
+    all_but = compile_source(source, 3, verify=True, **{option: off}).code
+    for values in inputs:
+        assert run(only, values) == run(expected, values)
+        assert run(all_but, values) == run(expected, values)
+
+
+def test_levels_add_passes():
+    names = []
+    for level in OPTIMIZATION_LEVELS:
+        codegen = compile_source(sample('loops.tes'), level)
+        names.append([stats.name for stats in codegen.pass_report])
+    assert names[0] == ['codegen']
+    for lower, higher in zip(names, names[1:]):
+        assert set(lower) <= set(higher)
+    assert 'inlining' in names[3] and 'inlining' not in names[2]
+    with pytest.raises(ValueError):
+        CodeGenerator.at_level(4)
+
+
+def test_pass_report():
+    codegen = compile_source(sample('cse.tes'), 3)
+    report = {stats.name: stats for stats in codegen.pass_report}
+    assert report['folding'].before is None
+    assert report['codegen'].before == 0
+    assert report['regalloc'].after <= report['codegen'].after
+    lines = format_pass_report(codegen.pass_report)
+    assert lines[-1].startswith('total') and len(lines) == len(report) + 1
+
+
+def test_verify_names_the_broken_pass():
+    manager = PassManager(verify=True)
+    manager.add('ok', lambda items: items)
+    manager.add('breaks', lambda items: items[1:])
+    code = compile_source(sample('test_input2.tes'), 0).code
+    with pytest.raises(IRError, match='after breaks'):
+        manager.run(list(code))
+    assert [stats.name for stats in manager.stats] == ['ok', 'breaks']
@@ -0,0 +1,128 @@
+from IR.ir import Opcode, Instr, split_procs, join_procs
+from IR.loops import LoopOptimizer
+from IR.ssa import SSAProc
+from IR.tsvm import parse as parse_tsvm
+from IR.verify import verify
+
+from helpers import run
+
+# A[i] = i * k + 7 * 3 for every i, as tests/loops.tes's fill compiles at -O0
+FILL = """
+proc fill # A => r1, k => r2 & return value => r0
+mov r3, 0
+top:
+len r4, r1
+lt r5, r3, r4
+jz r5, done
+mul r6, r3, r2
+mov r7, 21
+add r8, r6, r7
+mov [r1 + r3], r8
+add r3, r3, 1
+jmp top
+done:
+mov r0, 0
+ret
+proc main # return value => r0
+call iget, r1
+call mem, r2, r1
+mov r3, 5
+call fill, r4, r2, r3
+mov r5, [r2 + 0]
+call iput, r5
+mov r5, [r2 + 2]
+call iput, r5
+ret
+"""
+
+# The loop is entered from two places with different starting values
+TWO_ENTRIES = """
+proc main # return value => r0
+call iget, r1
+mov r3, 0
+mov r6, 0
+jz r1, top
+mov r3, 2
+top:
+lt r4, r3, 5
+jz r4, done
+mov r5, 10
+add r6, r6, r5
+add r3, r3, 1
+jmp top
+done:
+call iput, r6
+ret
+"""
+
+
+def optimize(text, name):
+    """(SSAProc, LoopOptimizer) after the loop passes ran on proc name"""
+    for proc, body in split_procs(parse_tsvm(text)):
+        if proc is not None and proc.name == name:
+            ssa = SSAProc(proc, body)
+            ssa.to_ssa()
+            loops = LoopOptimizer(ssa)
+            loops.optimize()
+            return ssa, loops
+
+
+def rebuild(text, name, ssa):
+    ssa.from_ssa()
+    items = join_procs([(proc, ssa.to_items() if proc is not None and proc.name == name else body)
+                        for proc, body in split_procs(parse_tsvm(text))])
+    verify(items)
+    return items
+
+
+def preheader_of(ssa):
+    loop, = ssa.cfg.loops
+    outside, = [pred for pred in loop.header.preds if pred not in loop.blocks]
+    return loop, outside
+
+
+def test_invariants_are_hoisted():
+    ssa, loops = optimize(FILL, 'fill')
+    assert loops.hoisted == 2
+    loop, preheader = preheader_of(ssa)
+    moved = [instr for instr in preheader.instrs if instr.op in (Opcode.LEN, Opcode.MOV)]
+    assert any(instr.op == Opcode.LEN for instr in moved)
+    assert any(instr.op == Opcode.MOV and instr.args == (21,) for instr in moved)
+    assert not any(instr.op == Opcode.LEN or instr.args == (21,)
+                   for block in loop.blocks for instr in block.instrs)
+    assert run(rebuild(FILL, 'fill', ssa), [3]) == [21, 31]
+
+
+def test_multiplication_becomes_induction_variable():
+    ssa, loops = optimize(FILL, 'fill')
+    assert loops.reduced == 1
+    loop, preheader = preheader_of(ssa)
+    instrs = [instr for block in loop.blocks for instr in block.instrs]
+    assert not any(instr.op == Opcode.MUL for instr in instrs)
+    # j = phi(0, j') in the header and j' = j + k next to i' = i + 1
+    (k,) = ssa.proc.param_registers()[1:]
+    step, = [instr for instr in instrs if instr.op == Opcode.ADD and k in instr.args]
+    phi = next(phi for phi in loop.header.phis if step.dest in phi.args)
+    assert step.args == (phi.dest, k)
+    start = phi.args[loop.header.preds.index(preheader)]
+    assert any(instr.op == Opcode.MOV and instr.dest == start and instr.args == (0,)
+               for instr in preheader.instrs)
+    assert run(rebuild(FILL, 'fill', ssa), [3]) == [21, 31]
+
+
+def test_preheader_inserted_for_several_entries():
+    before = SSAProc(*split_procs(parse_tsvm(TWO_ENTRIES))[0])
+    header = next(block for block in before.cfg.blocks if block.name == 'top')
+    assert len([pred for pred in header.preds if pred not in before.cfg.loops[0].blocks]) == 2
+
+    ssa, loops = optimize(TWO_ENTRIES, 'main')
+    loop, preheader = preheader_of(ssa)
+    assert preheader.name not in ('B0', 'B1') and preheader.succs == [loop.header]
+    assert len(preheader.preds) == 2
+    # The two starting values of r3 meet in the preheader
+    assert any(item.__class__ is Instr and item.op == Opcode.PHI for item in preheader.items)
+    assert loops.hoisted == 1
+    assert any(instr.op == Opcode.MOV and instr.args == (10,) for instr in preheader.instrs)
+    items = rebuild(TWO_ENTRIES, 'main', ssa)
+    assert run(items, [0]) == [50]
+    assert run(items, [1]) == [30]
@@ -0,0 +1,72 @@
+import pytest
+
+from SemanticAnalyzer.semantic_analyzer import SemanticAnalyzer
+from IR.generator import CodeGenerator
+
+from helpers import parse, sample
+
+# Errors in three of five functions, one of them with two
+PROGRAM = """
+funk one(a as int) <int>
+{
+    return a + missing;
+}
+
+funk two(a as int) <int>
+{
+    b :: int = 2;
+    return a * b;
+}
+
+funk three(v as vector) <int>
+{
+    x :: int = v;
+    return length(v) + y;
+}
+
+funk four(a as int) <vector>
+{
+    return a;
+}
+
+funk main() <int>
+{
+    n :: int = scan();
+    print(one(n) + two(n));
+    return 0;
+}
+"""
+
+
+def analyze(source, jobs=1, executor='thread'):
+    ast = parse(source)
+    analyzer = SemanticAnalyzer(jobs=jobs, executor=executor)
+    analyzer.analyze(ast)
+    return ast, analyzer
+
+
+def diagnostics(analyzer):
+    return [d.to_dict() for d in analyzer.diagnostics.items]
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_diagnostics_match_serial(executor):
+    _, serial = analyze(PROGRAM)
+    assert serial.has_sem_error
+    assert len({d['function'] for d in diagnostics(serial)}) == 3
+    _, parallel = analyze(PROGRAM, 2, executor)
+    assert diagnostics(parallel) == diagnostics(serial)
+    assert parallel.has_sem_error == serial.has_sem_error
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+@pytest.mark.parametrize('name', ['loops.tes', 'tailcall.tes'])
+def test_code_matches_serial(name, executor):
+    code = []
+    for jobs in (1, 2):
+        ast, analyzer = analyze(sample(name), jobs, executor)
+        assert not analyzer.has_sem_error
+        codegen = CodeGenerator()
+        codegen.generate_code(ast)
+        code.append(codegen.get_code_string())
+    assert code[0] == code[1]
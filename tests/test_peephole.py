@@ -0,0 +1,126 @@
+import pytest
+
+from IR.ir import Opcode, Instr
+from IR.peephole import Peephole
+from IR.printer import format_program
+from IR.tsvm import parse as parse_tsvm
+
+from helpers import run
+
+MOVES = """
+proc main # return value => r0
+call iget, r1
+add r2, r1, 1
+mov r3, r2
+mov r3, r3
+call iput, r3
+ret
+"""
+
+JUMP_TO_NEXT = """
+proc main # return value => r0
+call iget, r1
+jz r1, skip
+call iput, r1
+skip:
+jmp end
+end:
+ret
+"""
+
+CHAIN = """
+proc main # return value => r0
+call iget, r1
+jz r1, first
+call iput, r1
+first:
+jmp second
+second:
+jmp out
+out:
+ret
+"""
+
+CYCLE = """
+proc main # return value => r0
+call iget, r1
+jz r1, a
+jmp out
+a:
+jmp b
+b:
+jmp a
+out:
+call iput, r1
+ret
+"""
+
+AFTER_RET = """
+proc main # return value => r0
+call iget, r1
+jz r1, live
+ret
+mov r1, 2
+dead:
+call iput, r1
+live:
+call iput, r1
+ret
+"""
+
+
+def optimize(text, *passes):
+    peephole = Peephole(passes)
+    items = peephole.optimize(parse_tsvm(text))
+    return items, peephole
+
+
+def jumps(items):
+    return [(item.op, item.target) for item in items
+            if item.__class__ is Instr and item.op in (Opcode.JMP, Opcode.JZ)]
+
+
+def test_moves_are_coalesced():
+    items, peephole = optimize(MOVES, 'moves')
+    assert peephole.counts['moves'] == 2
+    assert (peephole.before, peephole.after) == (6, 4)
+    assert 'add r3, r1, 1' in format_program(items)
+    assert run(items, [4]) == [5]
+
+
+def test_jump_to_next_label_is_dropped():
+    items, peephole = optimize(JUMP_TO_NEXT, 'jumps')
+    assert peephole.counts['jumps'] == 1
+    assert (peephole.before, peephole.after) == (5, 4)
+    assert jumps(items) == [(Opcode.JZ, 'skip')]
+    assert run(items, [0]) == [] and run(items, [2]) == [2]
+
+
+def test_jumps_are_threaded():
+    items, peephole = optimize(CHAIN, 'threading')
+    assert peephole.counts['threading'] == 2
+    assert peephole.before == peephole.after == 6
+    assert jumps(items) == [(Opcode.JZ, 'out'), (Opcode.JMP, 'out'), (Opcode.JMP, 'out')]
+    assert run(items, [0]) == [] and run(items, [2]) == [2]
+
+
+def test_threading_stops_on_a_jump_cycle():
+    items, peephole = optimize(CYCLE, 'threading')
+    assert peephole.counts['threading'] == 3
+    # a and b end up jumping to a, which jumps to itself
+    assert jumps(items) == [(Opcode.JZ, 'a'), (Opcode.JMP, 'out'), (Opcode.JMP, 'a'), (Opcode.JMP, 'a')]
+    assert run(items, [2]) == [2]
+
+
+def test_code_after_ret_is_dropped():
+    items, peephole = optimize(AFTER_RET, 'unreachable')
+    assert peephole.counts['unreachable'] == 2
+    assert (peephole.before, peephole.after) == (7, 5)
+    text = format_program(items)
+    assert 'dead:' not in text and 'mov r1, 2' not in text and 'live:' in text
+    assert run(items, [0]) == [0] and run(items, [3]) == []
+
+
+def test_unknown_pass():
+    with pytest.raises(ValueError):
+        Peephole(('moves', 'fusion'))
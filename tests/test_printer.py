@@ -0,0 +1,36 @@
+import pytest
+
+from IR.ir import Opcode, Instr, Label, Comment, Proc
+from IR.printer import format_item, format_program
+from IR.tsvm import parse as parse_tsvm
+
+from helpers import compile_source, run, sample
+
+SAMPLES = [('test_input2.tes', [3, 4]), ('loops.tes', [6]), ('tailcall.tes', [40]), ('cse.tes', [5])]
+
+
+def test_format_instructions():
+    assert format_item(Instr(Opcode.ADD, 'r1', ['r2', 3])) == 'add r1, r2, 3'
+    assert format_item(Instr(Opcode.LOAD, 'r1', ['r2', 'r3'])) == 'mov r1, [r2 + r3]'
+    assert format_item(Instr(Opcode.STORE, args=['r2', 'r3', 'r4'])) == 'mov [r2 + r3], r4'
+    assert format_item(Instr(Opcode.CALL, 'r1', ['r2'], 'f')) == 'call f, r1, r2'
+    assert format_item(Instr(Opcode.JZ, args=['r1'], target='L0')) == 'jz r1, L0'
+    assert format_item(Instr(Opcode.RET)) == 'ret'
+    assert format_item(Label('L0')) == 'L0:'
+    assert format_item(Comment('note')) == '# note'
+    assert format_item(Proc('f', [('a', 'r1')])) == 'proc f # a => r1 & return value => r0'
+
+
+def test_string_literal_round_trip():
+    text = 'proc main # return value => r0\nmov r1, "a, b"\nret'
+    assert format_program(parse_tsvm(text)) == text
+
+
+@pytest.mark.parametrize('level', [0, 3])
+@pytest.mark.parametrize('name,inputs', SAMPLES)
+def test_round_trip(name, inputs, level):
+    code = compile_source(sample(name), level).code
+    text = format_program(code)
+    parsed = parse_tsvm(text)
+    assert format_program(parsed) == text
+    assert run(parsed, inputs) == run(code, inputs)
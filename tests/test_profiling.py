@@ -0,0 +1,31 @@
+import pstats
+
+from IR.generator import CodeGenerator
+from SemanticAnalyzer.profiling import VisitProfiler
+from SemanticAnalyzer.semantic_analyzer import SemanticAnalyzer
+from main import parse_args, write_profile
+
+from helpers import parse, sample
+
+
+def test_profile_flag():
+    assert parse_args([]).profile is None
+    assert parse_args(['--profile']).profile == '-'
+    assert parse_args(['--profile', 'out.prof']).profile == 'out.prof'
+
+
+def test_profile_of_analysis_and_codegen(tmp_path, capsys):
+    ast = parse(sample('loops.tes'))
+    profiler = VisitProfiler()
+    analyzer = profiler.attach(SemanticAnalyzer())
+    analyzer.analyze(ast)
+    profiler.attach(CodeGenerator()).generate_code(ast)
+    methods = {row.key[2] for row in profiler.rows()}
+    assert 'SemanticAnalyzer.visit_FunctionNode' in methods
+    assert 'CodeGenerator.visit_FunctionNode' in methods
+
+    write_profile(profiler, '-')
+    assert 'CodeGenerator:matsum' in capsys.readouterr().out
+    path = str(tmp_path / 'out.prof')
+    write_profile(profiler, path)
+    assert pstats.Stats(path).total_calls > 0
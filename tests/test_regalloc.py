@@ -0,0 +1,78 @@
+import pytest
+
+from IR.printer import format_program
+from IR.regalloc import allocate_registers, frame_size
+from IR.tsvm import parse as parse_tsvm
+
+from helpers import compile_source, run, sample
+
+STRAIGHT = """
+proc add3 # a => r1, b => r2, c => r3 & return value => r0
+add r4, r1, r2
+add r5, r4, r3
+mov r6, r5
+mul r7, r6, 2
+mov r0, r7
+ret
+proc main # return value => r0
+call iget, r8
+call iget, r9
+call iget, r10
+call add3, r11, r8, r9, r10
+call iput, r11
+ret
+"""
+
+# r2 stays live across the loop, r4 only inside it
+LOOP = """
+proc main # return value => r0
+call iget, r1
+mov r2, 100
+mov r3, 0
+top:
+jz r1, done
+mul r4, r1, 2
+add r3, r3, r4
+sub r1, r1, 1
+jmp top
+done:
+add r5, r3, r2
+call iput, r5
+ret
+"""
+
+
+def test_frame_size():
+    assert frame_size(['r0']) == 1
+    assert frame_size(['r3', 'r1']) == 4
+    assert frame_size([]) == 1
+
+
+def test_registers_are_reused():
+    items = parse_tsvm(STRAIGHT)
+    expected = run(items, [1, 2, 3])
+    items, report = allocate_registers(items)
+    assert run(items, [1, 2, 3]) == expected == [12]
+    assert report == [('add3', 8, 4), ('main', 12, 4)]
+    text = format_program(items)
+    assert text.startswith(STRAIGHT.split('\n')[1])
+    # The copy of a dying value is coalesced away
+    assert 'mov r6' not in text and len(text.splitlines()) < len(STRAIGHT.strip().splitlines())
+
+
+def test_values_live_across_a_loop_keep_their_register():
+    items = parse_tsvm(LOOP)
+    items, report = allocate_registers(items)
+    assert run(items, [4]) == [120]
+    assert report[0][2] <= report[0][1]
+
+
+@pytest.mark.parametrize('name,inputs', [('loops.tes', [6]), ('cse.tes', [5]),
+                                         ('tailcall.tes', [40])])
+def test_samples(name, inputs):
+    code = compile_source(sample(name), 0).code
+    expected = run(code, inputs)
+    allocated, report = allocate_registers(code)
+    assert run(allocated, inputs) == expected
+    assert all(after <= before for _, before, after in report)
+    assert sum(after for _, _, after in report) < sum(before for _, before, _ in report)
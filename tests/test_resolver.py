@@ -0,0 +1,54 @@
+from SemanticAnalyzer.callgraph import program_functions
+from SemanticAnalyzer.resolver import Resolver
+
+from helpers import analyze, compile_source, parse, run
+
+# a and b are in sibling scopes, so they get the same (depth, slot)
+SIBLINGS = """
+funk main() <int>
+{
+    for (i = 0 to 3)
+    begin
+        a :: int = i * 10;
+        print(a);
+    end
+    for (j = 0 to 2)
+    begin
+        b :: int = 1;
+        b = b + j;
+        print(b);
+    end
+    return 0;
+}
+"""
+
+
+def declarations(ast):
+    found = {}
+    stack = list(program_functions(ast))
+    while stack:
+        node = stack.pop()
+        if node.__class__ is list:
+            stack.extend(node)
+        elif node is not None and hasattr(node, '__dict__'):
+            if node.__class__.__name__ in ('VariableDefinitionNode', 'ForStatementNode'):
+                found[node.iden] = node.binding
+            stack.extend(value for name, value in vars(node).items()
+                         if name not in ('children', 'binding') and hasattr(value, '__dict__')
+                         or value.__class__ is list)
+    return found
+
+
+def test_sibling_scopes_share_bindings():
+    ast = Resolver().resolve(parse(SIBLINGS))
+    bindings = declarations(ast)
+    assert bindings['a'] == bindings['b']
+    assert bindings['i'] == bindings['j']
+
+
+def test_sibling_declarations_get_their_own_registers():
+    _, analyzer = analyze(SIBLINGS)
+    assert not analyzer.has_sem_error
+    for level in range(4):
+        code = compile_source(SIBLINGS, level).code
+        assert run(code) == [0, 10, 20, 1, 2], level
@@ -0,0 +1,46 @@
+import pytest
+
+from SemanticAnalyzer.semantic_analyzer import SemanticAnalyzer, RETAIN_SCOPES
+from IR.generator import CodeGenerator
+
+from helpers import parse, sample
+
+
+def count_scopes(table):
+    count = 0
+    stack = [table]
+    while stack:
+        scope = stack.pop()
+        count += 1
+        stack.extend(scope.children)
+    return count
+
+
+def analyze(source, policy):
+    ast = parse(source)
+    analyzer = SemanticAnalyzer(retain_scopes=policy)
+    analyzer.analyze(ast)
+    return ast, analyzer
+
+
+@pytest.mark.parametrize('policy, scopes', [('all', 13), ('functions', 6), ('none', 1)])
+def test_scopes_kept(policy, scopes):
+    _, analyzer = analyze(sample('loops.tes'), policy)
+    assert not analyzer.has_sem_error
+    assert count_scopes(analyzer.global_scope) == scopes
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        SemanticAnalyzer(retain_scopes='blocks')
+
+
+@pytest.mark.parametrize('name', ['loops.tes', 'test_input2.tes', 'tailcall.tes'])
+def test_code_does_not_depend_on_policy(name):
+    code = set()
+    for policy in RETAIN_SCOPES:
+        ast, _ = analyze(sample(name), policy)
+        codegen = CodeGenerator()
+        codegen.generate_code(ast)
+        code.add(codegen.get_code_string())
+    assert len(code) == 1
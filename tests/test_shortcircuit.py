@@ -0,0 +1,42 @@
+import pytest
+
+from helpers import compile_source, run
+
+# check prints its argument, so the output shows which operands ran
+PROGRAM = """
+funk check(x as int) <int>
+{
+    print(x);
+    return x;
+}
+
+funk main() <int>
+{
+    a :: int = scan();
+    b :: int = scan();
+    if [[ check(a) > 0 && check(b) > 0 ]]
+        print(100);
+    if [[ check(a) > 0 || check(b) > 0 ]]
+        print(200);
+    both :: bool = check(a) > 0 && check(b) > 0;
+    either :: bool = check(a) > 0 || check(b) > 0;
+    if [[ both ]]
+        print(300);
+    if [[ either ]]
+        print(400);
+    return 0;
+}
+"""
+
+
+@pytest.mark.parametrize('jumping_code', [True, False])
+@pytest.mark.parametrize('level', [0, 1, 2, 3])
+@pytest.mark.parametrize('inputs, output', [
+    # && skips check(b) when check(a) fails, || when it succeeds
+    ([0, 5], [0, 0, 5, 200, 0, 0, 5, 400]),
+    ([4, 0], [4, 0, 4, 200, 4, 0, 4, 400]),
+    ([4, 5], [4, 5, 100, 4, 200, 4, 5, 4, 300, 400]),
+])
+def test_right_operand_runs_only_when_needed(level, jumping_code, inputs, output):
+    code = compile_source(PROGRAM, level, jumping_code=jumping_code).code
+    assert run(code, inputs) == output
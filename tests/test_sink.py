@@ -0,0 +1,100 @@
+import pytest
+
+from IR.generator import CodeGenerator
+from IR.ir import Proc
+from IR.sink import CodeSink, ListSink, StringSink, FileSink
+
+from helpers import analyze, compile_source, sample
+
+# main is written in source order first, but calls main's callees
+PROGRAM = """
+funk main() <int>
+{
+    n :: int = scan();
+    print(twice(n));
+    print(count(n));
+    return 0;
+}
+
+funk twice(n as int) <int>
+{
+    return n + n;
+}
+
+funk count(n as int) <int>
+{
+    i :: int = 0;
+    while (i < n)
+        i = i + 1;
+    return i;
+}
+
+funk unused(n as int) <int>
+{
+    return n;
+}
+"""
+
+
+class ProcSink(ListSink):
+    """Remembers the procs of every write() call"""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def write(self, items):
+        self.writes.append([item.name for item in items if item.__class__ is Proc])
+        super().write(items)
+
+
+def generate(source, sink, level=3, **options):
+    ast, _ = analyze(source)
+    codegen = CodeGenerator.at_level(level, **options)
+    codegen.generate_code(ast, sink)
+    return codegen
+
+
+def test_code_sink_is_abstract():
+    with pytest.raises(TypeError):
+        CodeSink()
+
+
+@pytest.mark.parametrize('level', [0, 1, 2, 3])
+@pytest.mark.parametrize('name', ['test_input2.tes', 'loops.tes', 'tailcall.tes', 'cse.tes'])
+def test_sinks_match_get_code_string(name, level, tmp_path):
+    expected = compile_source(sample(name), level).get_code_string()
+    for sink in (ListSink(), StringSink()):
+        generate(sample(name), sink, level)
+        assert sink.getvalue() == expected
+    path = tmp_path / 'out.ts'
+    with FileSink(str(path), buffer_size=64) as sink:
+        generate(sample(name), sink, level)
+    assert path.read_text() == expected
+
+
+@pytest.mark.parametrize('level', [0, 3])
+def test_procs_written_one_at_a_time(level):
+    sink = ProcSink()
+    codegen = generate(PROGRAM, sink, level)
+    assert codegen.code == []
+    assert all(len(procs) == 1 for procs in sink.writes)
+    assert sorted(procs[0] for procs in sink.writes) == ['count', 'main', 'twice', 'unused']
+
+
+def test_callees_written_first_with_inlining():
+    sink = ProcSink()
+    codegen = generate(PROGRAM, sink, 3)
+    order = [procs[0] for procs in sink.writes]
+    assert order.index('twice') < order.index('main')
+    assert order.index('count') < order.index('main')
+    assert codegen.inline_report['inlined'] >= 1
+
+
+def test_pruned_procs_written_only_when_called():
+    sink = ProcSink()
+    generate(PROGRAM, sink, 3, prune_unreachable=True)
+    names = [procs[0] for procs in sink.writes]
+    assert 'unused' not in names
+    assert 'twice' not in names
+    assert 'call twice' not in sink.getvalue()
@@ -0,0 +1,121 @@
+import pytest
+
+from IR.cse import ValueNumbering
+from IR.ir import Opcode, Instr, RETURN_REGISTER, count_instructions, split_procs, join_procs
+from IR.ssa import SSAProc, SSAOptimizer
+from IR.tsvm import parse as parse_tsvm
+from IR.verify import verify
+
+from helpers import compile_source, run, sample
+
+LOOP = """
+proc main # return value => r0
+call iget, r1
+mov r2, 0
+mov r3, 0
+top:
+lt r4, r3, r1
+jz r4, done
+add r2, r2, r3
+add r3, r3, 1
+jmp top
+done:
+call iput, r2
+ret
+"""
+
+REDUNDANT = """
+proc f # a => r1, b => r2 & return value => r0
+add r3, r1, r2
+mul r4, r1, 7
+mov r5, r3
+add r6, r2, r1
+mul r7, r5, r6
+mov r0, r7
+ret
+proc main # return value => r0
+call iget, r1
+call iget, r2
+call f, r3, r1, r2
+call iput, r3
+ret
+"""
+
+
+def ssa_of(text, name='main'):
+    for proc, body in split_procs(parse_tsvm(text)):
+        if proc is not None and proc.name == name:
+            return SSAProc(proc, body)
+
+
+def definitions(ssa):
+    return [reg for block in ssa.cfg.blocks for item in block.instrs
+            for reg in item.defs() if reg != RETURN_REGISTER]
+
+
+def rebuild(text, name, ssa):
+    procs = split_procs(parse_tsvm(text))
+    return join_procs([(proc, ssa.to_items() if proc is not None and proc.name == name else body)
+                       for proc, body in procs])
+
+
+def test_every_register_is_defined_once():
+    ssa = ssa_of(LOOP)
+    ssa.to_ssa()
+    regs = definitions(ssa)
+    assert len(regs) == len(set(regs))
+    header = next(block for block in ssa.cfg.blocks if block.name == 'top')
+    assert len(header.phis) == 2
+    assert all(len(phi.args) == len(header.preds) for phi in header.phis)
+
+
+def test_round_trip_without_changes():
+    ssa = ssa_of(LOOP)
+    ssa.to_ssa()
+    ssa.from_ssa()
+    items = rebuild(LOOP, 'main', ssa)
+    verify(items)
+    assert not any(item.__class__ is Instr and item.op == Opcode.PHI for item in items)
+    assert run(items, [5]) == [10]
+    assert count_instructions(items) <= count_instructions(parse_tsvm(LOOP))
+
+
+def test_copies_and_dead_code_go():
+    ssa = ssa_of(REDUNDANT, 'f')
+    ssa.to_ssa()
+    while ssa.propagate_copies() + ssa.eliminate_dead_code():
+        pass
+    assert ssa.copies >= 1
+    assert ssa.removed >= 1
+    ssa.from_ssa()
+    items = rebuild(REDUNDANT, 'f', ssa)
+    assert run(items, [2, 3]) == [25]
+    assert not any(item.op == Opcode.MUL and 7 in item.args
+                   for item in items if item.__class__ is Instr)
+
+
+def test_value_numbering_reuses_commutative_sums():
+    ssa = ssa_of(REDUNDANT, 'f')
+    ssa.to_ssa()
+    assert ValueNumbering(ssa).run() == 1
+    while ssa.propagate_copies() + ssa.eliminate_dead_code():
+        pass
+    ssa.from_ssa()
+    items = rebuild(REDUNDANT, 'f', ssa)
+    assert run(items, [2, 3]) == [25]
+    assert sum(1 for item in items if item.__class__ is Instr and item.op == Opcode.ADD) == 1
+
+
+@pytest.mark.parametrize('name,inputs', [('loops.tes', [6]), ('cse.tes', [5]),
+                                         ('tailcall.tes', [40]), ('test_input2.tes', [3, 4])])
+@pytest.mark.parametrize('loops,cse', [(False, False), (True, True)])
+def test_samples(name, inputs, loops, cse):
+    code = compile_source(sample(name), 1, register_allocation=False).code
+    expected = run(code, inputs)
+    before = count_instructions(code)
+    optimized = SSAOptimizer(loops=loops, cse=cse).optimize(code)
+    verify(optimized)
+    assert run(optimized, inputs) == expected
+    if not loops:
+        # Strength reduction may add instructions outside the loop
+        assert count_instructions(optimized) <= before
@@ -0,0 +1,84 @@
+import pytest
+
+from IR.ir import Opcode, Instr
+from IR.tailcall import TailCallEliminator
+from IR.printer import format_program
+from IR.tsvm import parse as parse_tsvm
+
+from helpers import Machine, StackOverflow, compile_source, run, sample
+
+SWAP = """
+proc swap # n => r1, a => r2, b => r3 & return value => r0
+jz r1, done
+sub r4, r1, 1
+call swap, r5, r4, r3, r2
+mov r0, r5
+ret
+done:
+mul r6, r2, 10
+add r0, r6, r3
+ret
+proc main # return value => r0
+call iget, r1
+call swap, r2, r1, 1, 2
+call iput, r2
+ret
+"""
+
+# r3 is read before it is set, so each round must start it at 0 again
+UNSET = """
+proc count # n => r1 & return value => r0
+jz r1, done
+add r3, r3, 1
+sub r2, r1, 1
+call count, r4, r2
+mov r0, r4
+ret
+done:
+mov r0, r3
+ret
+proc main # return value => r0
+call count, r1, 3
+call iput, r1
+ret
+"""
+
+
+def calls(items, name):
+    return [item for item in items if item.__class__ is Instr and item.op == Opcode.CALL
+            and item.target == name]
+
+
+def test_arguments_are_swapped_through_a_spare_register():
+    items = parse_tsvm(SWAP)
+    eliminator = TailCallEliminator()
+    eliminator.eliminate(items)
+    assert eliminator.eliminated == 1
+    assert len(calls(items, 'swap')) == 1
+    assert 'jmp swap_start' in format_program(items)
+    for n, expected in [(0, 12), (1, 21), (4, 12), (7, 21)]:
+        assert run(items, [n]) == [expected]
+
+
+def test_locals_read_before_set_are_zeroed():
+    items = parse_tsvm(UNSET)
+    TailCallEliminator().eliminate(items)
+    assert 'mov r3, 0' in format_program(items)
+    assert run(items) == [0]
+
+
+def test_only_tail_calls_are_replaced():
+    code = compile_source(sample('tailcall.tes'), 2).code
+    # main's calls stay; only fact still calls itself
+    assert len(calls(code, 'sum')) == len(calls(code, 'swap')) == 1
+    assert len(calls(code, 'fact')) == 2
+
+
+def test_recursion_runs_in_one_frame():
+    source = sample('tailcall.tes')
+    inputs = [1000]
+    with pytest.raises(StackOverflow):
+        run(compile_source(source, 2, tail_calls=False).code, inputs, max_depth=200)
+    machine = Machine(compile_source(source, 2).code, inputs, max_depth=200)
+    assert machine.run() == [500500, 12, 3628800]
+    assert machine.deepest <= 11